@@ -0,0 +1,218 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import threading
+    from collections import OrderedDict
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import ImageFont
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+
+'''
+@date: 18/10/2026
+
+Loaded FreeType fonts shared by every SloganMaker in the process, including the
+ImageThreadMaker's thread workers, so each (font file, size, face index) is parsed once per
+run rather than several times per image. Text measurements are cached alongside, and
+FitFontSize finds the largest size at which a string fits a box.
+'''
+
+DEFAULT_FONT_CACHE_SIZE = 256 #Loaded font objects kept.
+DEFAULT_MEASURE_CACHE_SIZE = 8192 #(font, text) measurements kept.
+MIN_FONT_SIZE = 8 #Smallest size FitFontSize will go to.
+
+def _TextSize(
+        Font,
+        Text
+        ):
+    if hasattr(Font,"getbbox"):
+        Left,Top,Right,Bottom = Font.getbbox(Text)
+        return Right,Bottom
+    return Font.getsize(Text)
+
+def _TextAdvance(
+        Font,
+        Text
+        ):
+    if hasattr(Font,"getlength"):
+        return Font.getlength(Text)
+    return Font.getsize(Text)[0]
+
+class FontCache():
+    def __init__(
+            self,
+            MaxEntries = DEFAULT_FONT_CACHE_SIZE,
+            MaxMeasurements = DEFAULT_MEASURE_CACHE_SIZE
+            ):
+        '''
+        Least recently used cache of ImageFont.FreeTypeFont objects keyed by
+        (font path, size, index), and of text sizes measured with them, safe to share
+        between threads.
+        '''
+        self.MaxEntries = MaxEntries
+        self.MaxMeasurements = MaxMeasurements
+        self.Entries = OrderedDict()
+        self.Measurements = OrderedDict()
+        self.Hits = 0
+        self.Misses = 0
+        self.Evictions = 0
+        self.Lock = threading.Lock()
+
+    def Get(
+            self,
+            FontPath,
+            Size,
+            Index = 0
+            ):
+        '''
+        Return the loaded font, loading it on a miss. Raises as ImageFont.truetype does
+        for a missing or unreadable font.
+        '''
+        Key = (os.path.abspath(FontPath),Size,Index)
+        with self.Lock:
+            Font = self.Entries.get(Key)
+            if Font is not None:
+                self.Entries.move_to_end(Key)
+                self.Hits += 1
+                return Font
+            self.Misses += 1
+            Font = ImageFont.truetype(Key[0],Key[1],index=Index)
+            self.Entries[Key] = Font
+            while len(self.Entries) > self.MaxEntries:
+                self.Entries.popitem(last=False)
+                self.Evictions += 1
+            return Font
+
+    def Measure(
+            self,
+            FontPath,
+            Size,
+            Text,
+            Index = 0
+            ):
+        '''
+        (Width,Height) of Text drawn from the origin in the given font.
+        '''
+        return self._Measured("Size",FontPath,Size,Text,Index,_TextSize)
+
+    def Advance(
+            self,
+            FontPath,
+            Size,
+            Text,
+            Index = 0
+            ):
+        '''
+        Horizontal advance of Text, which unlike its drawn width includes trailing spaces
+        and adds up across words.
+        '''
+        return self._Measured("Advance",FontPath,Size,Text,Index,_TextAdvance)
+
+    def _Measured(
+            self,
+            Kind,
+            FontPath,
+            Size,
+            Text,
+            Index,
+            Measurer
+            ):
+        Key = (Kind,os.path.abspath(FontPath),Size,Index,Text)
+        with self.Lock:
+            Measured = self.Measurements.get(Key)
+            if Measured is not None:
+                self.Measurements.move_to_end(Key)
+                return Measured
+        Measured = Measurer(self.Get(FontPath,Size,Index),Text)
+        with self.Lock:
+            self.Measurements[Key] = Measured
+            while len(self.Measurements) > self.MaxMeasurements:
+                self.Measurements.popitem(last=False)
+        return Measured
+
+    def Clear(self):
+        with self.Lock:
+            self.Entries.clear()
+            self.Measurements.clear()
+
+    def Stats(self):
+        return {
+            "Entries":len(self.Entries),
+            "Hits":self.Hits,
+            "Misses":self.Misses,
+            "Evictions":self.Evictions
+            }
+
+    def Report(self):
+        Stats = self.Stats()
+        print("Font cache: %s hits, %s misses, %s fonts loaded, %s evicted"%(
+            Stats["Hits"],
+            Stats["Misses"],
+            Stats["Entries"],
+            Stats["Evictions"]
+            )
+        )
+        return
+
+#One cache per process, shared by every SloganMaker constructed in it.
+SharedFontCache = FontCache()
+
+def GetFont(
+        FontPath,
+        Size,
+        Index = 0
+        ):
+    return SharedFontCache.Get(FontPath,Size,Index)
+
+def FitFontSize(
+        FontPath,
+        Text,
+        MaxWidth,
+        MaxSize,
+        MinSize = MIN_FONT_SIZE,
+        MaxHeight = None,
+        Index = 0,
+        Cache = None
+        ):
+    '''
+    Largest whole size from MinSize to MaxSize at which Text fits within MaxWidth (and
+    MaxHeight when given), found by binary search. MinSize is returned when even that does
+    not fit, so callers always get a usable size. A MaxSize under MinSize is used as is.
+    '''
+    if Cache is None:
+        Cache = SharedFontCache
+    def Fits(Size):
+        Width,Height = Cache.Measure(FontPath,Size,Text,Index)
+        return Width <= MaxWidth and (MaxHeight is None or Height <= MaxHeight)
+    Low,High = int(MinSize),int(MaxSize)
+    if High <= Low or Fits(High):
+        return High
+    #Invariant: Low fits or is the floor, High does not fit.
+    while High - Low > 1:
+        Middle = (Low + High)//2
+        if Fits(Middle):
+            Low = Middle
+        else:
+            High = Middle
+    return Low
@@ -0,0 +1,227 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import json
+    import tempfile
+    import threading
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import ImageFont
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+
+'''
+@date: 18/10/2026
+
+Persistent index of the fonts in a folder, replacing a listing of the folder for every
+SloganMaker. The index is built once, saved beside the folder ("Fonts.fontindex.json"
+for "Fonts", as a file inside would change the mtime it is checked against) and reused
+by every instance and process for as long as the folder's mtime is unchanged (fonts
+added, removed or renamed). It is only read or built on the first lookup.
+
+Besides the file name without extension ("gothamcondensed-bold"), each font is indexed
+by the family and style in its name table ("gotham condensed bold"), and by family alone
+for its regular style, so configurations may name fonts either way. Names are matched
+case insensitively and resolving one is a dict lookup.
+'''
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".fontindex.json"
+FONT_EXTENSIONS = [".otf",".ttf"]
+REGULAR_STYLES = ["regular","book","normal","roman","medium"] #Preferred for a bare family name, in order.
+
+def DefaultIndexPath(Folder):
+    return os.path.normpath(os.path.abspath(Folder)) + INDEX_SUFFIX
+
+def _FolderStamp(Folder):
+    return os.stat(Folder).st_mtime_ns
+
+def _ReadNames(Path):
+    '''
+    (Family,Style) from the font's name table, None when FreeType cannot read it.
+    '''
+    try:
+        return ImageFont.truetype(Path,10).getname()
+    except (OSError,ValueError):
+        return None
+
+def BuildEntries(Folder):
+    '''
+    One {"Path","Name","Family","Style"} entry per font file in Folder, sorted by name.
+    '''
+    Entries = []
+    for FileName in sorted(os.listdir(Folder)):
+        Name,Extension = os.path.splitext(FileName.lower())
+        if Extension not in FONT_EXTENSIONS:
+            continue
+        Path = os.path.join(Folder,FileName)
+        Names = _ReadNames(Path)
+        Family,Style = Names if Names else (None,None)
+        Entries.append({
+            "Path":Path,
+            "Name":Name,
+            "Family":Family,
+            "Style":Style
+            })
+    return Entries
+
+def _Lookup(Entries):
+    '''
+    Lower case name to path. File names win over family names, which only fill gaps.
+    '''
+    Lookup = {}
+    Families = {}
+    for Entry in Entries:
+        if not Entry["Family"]:
+            continue
+        Family = Entry["Family"].strip().lower()
+        Style = (Entry["Style"] or "").strip().lower()
+        for Key in [f"{Family} {Style}",f"{Family}-{Style}",f"{Family.replace(' ','')}-{Style.replace(' ','')}"]:
+            Lookup.setdefault(Key,Entry["Path"])
+        Families.setdefault(Family,[]).append((Style,Entry["Path"]))
+    for Family,Styles in Families.items():
+        Ranked = sorted(
+            Styles,
+            key=lambda Candidate: REGULAR_STYLES.index(Candidate[0]) if Candidate[0] in REGULAR_STYLES else len(REGULAR_STYLES)
+            )
+        Lookup.setdefault(Family,Ranked[0][1])
+    for Entry in Entries:
+        Lookup[Entry["Name"]] = Entry["Path"]
+    return Lookup
+
+class FontIndex():
+    def __init__(
+            self,
+            Folder,
+            IndexPath = None
+            ):
+        '''
+        Index of Folder, stored at IndexPath, beside Folder by default. Looked up as a read
+        only dict of font name to path, loaded on first use.
+        '''
+        self.Folder = os.path.abspath(Folder)
+        self.IndexPath = IndexPath or DefaultIndexPath(Folder)
+        self.Entries = None
+        self.Lookup = None
+        self.Built = False
+        self.Lock = threading.Lock()
+
+    def Load(self):
+        '''
+        Use the stored index while the folder is unchanged, otherwise rebuild and store it.
+        '''
+        with self.Lock:
+            if self.Lookup is not None:
+                return
+            Stamp = _FolderStamp(self.Folder)
+            Stored = None
+            try:
+                with open(self.IndexPath,"r") as r_file:
+                    Stored = json.loads(r_file.read())
+            except (OSError,ValueError):
+                pass
+            if Stored and Stored.get("Version") == INDEX_VERSION and Stored.get("FolderMTime") == Stamp and Stored.get("Folder") == self.Folder:
+                self.Entries = Stored["Entries"]
+            else:
+                self.Entries = BuildEntries(self.Folder)
+                self.Built = True
+                self.Save(Stamp)
+            self.Lookup = _Lookup(self.Entries)
+        return
+
+    def Save(
+            self,
+            Stamp
+            ):
+        '''
+        Write atomically, so concurrent builders never leave a partial index. An index that
+        cannot be written is only kept in memory.
+        '''
+        try:
+            Handle,TempPath = tempfile.mkstemp(
+                dir=os.path.dirname(self.IndexPath),
+                prefix=os.path.basename(self.IndexPath),
+                suffix=".tmp"
+                )
+            with os.fdopen(Handle,"w") as o_file:
+                o_file.write(json.dumps({
+                    "Version":INDEX_VERSION,
+                    "Folder":self.Folder,
+                    "FolderMTime":Stamp,
+                    "Entries":self.Entries
+                    },indent=1))
+            os.replace(TempPath,self.IndexPath)
+        except OSError as Error:
+            print(f"Unable to store font index {self.IndexPath}: {Error}")
+        return
+
+    def __getitem__(
+            self,
+            Name
+            ):
+        '''
+        Path of the font called Name, by file name or by family and style.
+        '''
+        if self.Lookup is None:
+            self.Load()
+        return self.Lookup[Name.lower()]
+
+    def __contains__(
+            self,
+            Name
+            ):
+        if self.Lookup is None:
+            self.Load()
+        return Name.lower() in self.Lookup
+
+    def __len__(self):
+        if self.Lookup is None:
+            self.Load()
+        return len(self.Entries)
+
+    def Families(self):
+        '''
+        {Family:[Style,...]} of every indexed font.
+        '''
+        if self.Lookup is None:
+            self.Load()
+        Families = {}
+        for Entry in self.Entries:
+            if Entry["Family"]:
+                Families.setdefault(Entry["Family"],[]).append(Entry["Style"])
+        return Families
+
+#One index per folder per process, shared by every SloganMaker constructed in it.
+SharedIndexes = {}
+SharedIndexLock = threading.Lock()
+
+def GetFontIndex(Folder):
+    '''
+    The shared, lazily loaded index of Folder.
+    '''
+    Folder = os.path.abspath(Folder)
+    with SharedIndexLock:
+        Index = SharedIndexes.get(Folder)
+        if Index is None:
+            Index = SharedIndexes[Folder] = FontIndex(Folder)
+        return Index
@@ -31,6 +31,11 @@ from PIL import ImageDraw
 import threading
 import time
 import copy
+from collections import OrderedDict
+import StageTrace
+import BrandedFontCache
+import BrandedTextLayout
+import BrandedFontIndex
 '''
 @date : 22/08/2020
 @author: George Linsdell
@@ -46,6 +51,11 @@ DEFAULT_COLOUR = (255,125,255)
 DEFAULT_IMAGE_TYPE = "RGBA"
 DEFAULT_OUTPUT_FILENAME = "test.png"
 DEFAULT_FONT = "arialbd"
+MAX_STATIC_LAYERS = 8 #Configurations whose background, header and logo are kept.
+
+#Static layers shared by every SloganMaker in the process, see SloganMaker.StaticLayer.
+StaticLayers = OrderedDict()
+StaticLayerLock = threading.Lock()
 
 if os.getenv("SO_AUTO_HOME") != None:
     currentDirectory = os.getenv("SO_AUTO_HOME")
@@ -77,8 +87,16 @@ class SloganMaker():
             FileName = DEFAULT_OUTPUT_FILENAME,
             TargetFont = DEFAULT_FONT,
             ConfigurationFile = DEFAULT_CONFIGURATION_FILE,
-            FontFolder=DEFAULT_FONTS_FOLDER
+            FontFolder=DEFAULT_FONTS_FOLDER,
+            Tracer = None
             ):
+        '''
+        Tracer times the stages of run and WriteFile inside a caller's Tracer.Image,
+        see StageTrace. Off by default.
+        '''
+        if Tracer is None:
+            Tracer = StageTrace.NullTracer
+        self.Tracer = Tracer
         self.Errors = False
         self.ImageSize = ImageSize
         self.ImageWidth = ImageSize[0]
@@ -120,7 +138,6 @@ class SloganMaker():
         '''
         if ConfigurationFile == "DEFAULT":
             ConfigurationFile = self.ConfigurationFile
-        print(f"Attempting to open configuration file at '{ConfigurationFile}'")
         with open (ConfigurationFile,"r") as r_file:
             try:
                 self.Configuration = json.loads(r_file.read())
@@ -267,31 +284,12 @@ class SloganMaker():
     
     def DiscoverFonts(self):
         '''
-        Assume this is a windows machine for this minute:
-        Support Linux font selection or embed specific ones.
+        Fonts come from the persistent index of FontFolder shared by every SloganMaker, see
+        BrandedFontIndex. self.Fonts maps a font's file name, or its family and style, to
+        its path, and is only read or built on the first lookup.
         '''
         if not self.FontsReady:
-            self.Fonts = {}
-            for path in [
-                #"C:\\Windows\\Fonts",
-                self.FontFolder
-                ]:
-                for font in os.listdir(path):
-                    try:
-                        FontName,FontExt = os.path.splitext(font.lower())
-                    except:
-                        traceback.print_exc()
-                        continue
-                    if FontExt == ".otf":
-                        self.Fonts[FontName] = os.path.join(path,font)
-                    elif FontExt == ".ttf":
-                        self.Fonts[FontName] = os.path.join(path,font)
-                    else:
-                        #print ("%s is not a font."%font)
-                        pass
-            #print("Discovered %s Fonts"%len(self.Fonts))
-            with open ("font.json","w") as o_file:
-                o_file.write(json.dumps(self.Fonts, sort_keys=True))
+            self.Fonts = BrandedFontIndex.GetFontIndex(self.FontFolder)
             self.FontsReady = True
         return
         
@@ -301,33 +299,71 @@ class SloganMaker():
             Author = None
             ):
         '''
-        Run will create a image dependent on the configuration
+        Run will create a image dependent on the configuration. Returns False when the
+        canvas or the quote could not be drawn, the canvas then must not be written.
         '''
-        #print("Creating Base Image")
-        if not self.CreateImageBase():
-            print("failed to create Image Canvas")
-            return
-        #print("Drawing Background Image")
-        self.DrawBackGround()
+        with self.Tracer.Span("base"):
+            if not self.CreateImageBase():
+                print("failed to create Image Canvas")
+                return False
         try:
-            #print("Drawing Text")
-            self.DrawText(TextString)
+            with self.Tracer.Span("text"):
+                if not self.DrawText(TextString):
+                    return False
         except:
             traceback.print_exc()
-        #print("Drawing Header")
-        self.DrawHeader(self.Configuration["Header"]["Text"])
+            return False
         if Author != None:
-            #print("draw Author")
-            if not self.DrawAuthor(Author):
-                print("Failed to generate Authors name")
-        #print("Drawing Branded Image")
-        if not self.LoadBrandedImage():
-            print("Failed to Draw Branded Image, Check Configuration")
-        
-        #print("PLacing Resized Logo")
-        if not self.PlaceResizedLogo():
-            print("Failed to Place Resized Logo")
-        return
+            with self.Tracer.Span("author"):
+                if not self.DrawAuthor(Author):
+                    print("Failed to generate Authors name")
+        with self.Tracer.Span("logo"):
+            if self.ResizedLogo is None:
+                print("Failed to Draw Branded Image, Check Configuration")
+            elif not self.PlaceResizedLogo():
+                print("Failed to Place Resized Logo")
+        return True
+    
+    def StaticLayer(self):
+        '''
+        (Canvas,ResizedLogo) for this configuration: the background with the header drawn,
+        and the logo resized for the image (None when it could not be loaded). Rendered
+        once and shared by every SloganMaker in the process, the logo is still pasted last
+        by run so it stays above the quote. An edited logo file is picked up.
+        '''
+        LogoPath = self.Configuration.get("logo",{}).get("path")
+        try:
+            Stat = os.stat(LogoPath)
+            LogoStamp = (Stat.st_mtime_ns,Stat.st_size)
+        except (OSError,TypeError):
+            LogoStamp = None
+        Key = (
+            json.dumps(self.Configuration,sort_keys=True),
+            tuple(self.ImageSize),
+            self.ImageType,
+            self.StartingColour,
+            self.FontColour,
+            LogoStamp
+            )
+        with StaticLayerLock:
+            Layer = StaticLayers.get(Key)
+            if Layer is not None:
+                StaticLayers.move_to_end(Key)
+            else:
+                self.Canvas = Image.new(
+                    self.ImageType,
+                    self.ImageSize,
+                    self.StartingColour
+                    )
+                self.DrawBackGround()
+                self.DrawHeader(self.Configuration["Header"]["Text"])
+                self.ResizedLogo = None
+                self.LoadBrandedImage()
+                Layer = (self.Canvas,self.ResizedLogo)
+                StaticLayers[Key] = Layer
+                while len(StaticLayers) > MAX_STATIC_LAYERS:
+                    StaticLayers.popitem(last=False)
+        return Layer
         
     def DrawBackGround(self):
         '''
@@ -342,8 +378,11 @@ class SloganMaker():
             ):
         '''
         Draw Text on the document from the quote input file.
+        The quote is wrapped within the "Borders" box at the configured font size, shrunk
+        where it would not fit, down to "Font":"MinSize". "Font":"MaxLines" optionally
+        limits the number of lines. The layout used is kept in self.TextLayout.
+        Returns False when the quote could not be drawn.
         '''
-        self.font = ImageFont.truetype(self.Fonts[self.Configuration["Font"]["Name"]], self.Configuration["Font"]["Size"])
         YMin = self.ImageHeight * (self.Configuration["Borders"][2] /100)
         YMax = self.ImageHeight * (self.Configuration["Borders"][3] /100)
         XMin = self.ImageHeight * (self.Configuration["Borders"][0] /100)
@@ -351,60 +390,33 @@ class SloganMaker():
         
         MaxWidth = XMax-XMin
         MaxHeight = YMax - YMin
-        ProcessComplete = False
-        Words = InputText.split(" ")
-        TotalWords = len(Words)
-        WordsDeployed = 0   
-        Lines = []
-        while not ProcessComplete:
-            Joinlist = []
-            ExitLoop = False
-            while not ExitLoop:
-                NewString = ""
-                Joinlist.append(WordsDeployed)
-                WordsDeployed +=1
-                for i in Joinlist:
-                    NewString = NewString + Words[i] + " "
-                try:
-                    if self.font.getsize(NewString)[0] > MaxWidth:
-                        if len(Joinlist)>1:
-                            Joinlist.pop(-1)
-                            WordsDeployed -= 1
-                            NewString = ""
-                            for i in Joinlist:
-                                NewString = NewString + Words[i] + " "
-                            ExitLoop = True
-                        else:
-                            ExitLoop = True
-                except OSError:
-                    print("Failed to process font.")
-                    ExitLoop = True
-                    self.Errors = True
-                    traceback.print_exc()
-                except:
-                    traceback.print_exc()
-                if WordsDeployed == TotalWords:
-                    ExitLoop = True
-            Lines.append(NewString)
-            if WordsDeployed == TotalWords:
-                ProcessComplete = True
-        self.TextRows = len(Lines)
-        if self.TextRows > 8:
-            print("Skipping as more than 8 lines")
-            return 
-        RowHeight = (MaxHeight/self.TextRows)
-        textheight = self.font.getsize("test")[1]
-        for i in range(self.TextRows):
-            if i == 0:
-                Lines[i] = '"'+Lines[i]
-            elif i == self.TextRows -1:
-                Lines[i] = Lines[i]+'"'
-            YPosition = YMin + (textheight*i)
-            self.DrawTextLine(
-                Lines[i],
-                YPosition
+        FontPath = self.Fonts[self.Configuration["Font"]["Name"]]
+        try:
+            self.TextLayout = BrandedTextLayout.FitText(
+                FontPath,
+                InputText,
+                MaxWidth,
+                MaxHeight,
+                self.Configuration["Font"]["Size"],
+                self.Configuration["Font"].get("MinSize",BrandedFontCache.MIN_FONT_SIZE),
+                self.Configuration["Font"].get("MaxLines",BrandedTextLayout.DEFAULT_MAX_LINES)
                 )
-        return
+        except OSError:
+            print("Failed to process font.")
+            self.Errors = True
+            traceback.print_exc()
+            return False
+        self.font = BrandedFontCache.GetFont(FontPath,self.TextLayout.Size)
+        self.TextRows = len(self.TextLayout.Lines)
+        if not self.TextLayout.Fits:
+            print(f"Quote does not fit at the minimum font size {self.TextLayout.Size}, drawing anyway.")
+        self.TextLayout.Quoted().Render(
+            self.ActiveCanvas,
+            self.ImageSize[0]/2,
+            YMin,
+            self.FontColour
+            )
+        return True
         
     def DrawAuthor(
             self,
@@ -412,41 +424,33 @@ class SloganMaker():
             ):
         '''
         Try to clean up the formatting of the author string.
+        The author is drawn in the body font, shrunk until it fits "Author":"WidthPercent"
+        of the image but no smaller than "Author":"MinSize".
         '''
         try:
-            CurrentFontSize = self.Configuration["Font"]["Size"]
-            self.Authorfont = ImageFont.truetype(
-                self.Fonts[self.Configuration["Font"]["Name"]],
-                CurrentFontSize
-                )
             if TargetText == '""':
                 TargetText = "Unknown"
             
-            self.HeaderFont = ImageFont.truetype(self.Fonts[self.Configuration["Header"]["Font"]], round(self.Configuration["Header"]["Size"]))
             MaxAuthorWidth = 0.5* self.ImageWidth
             try:
                 MaxAuthorWidth = self.Configuration["Author"]["WidthPercent"]*(self.ImageWidth*0.01)
             except:
                 print("Author,WidthPercent not set, defaulting to 50%")
-            
-            TooBig = True
-            while TooBig:
-                if self.Authorfont.getsize(TargetText)[0] > MaxAuthorWidth:
-                    CurrentFontSize -= 2
-                    self.Authorfont = ImageFont.truetype(
-                    self.Fonts[self.Configuration["Font"]["Name"]],
-                        CurrentFontSize
-                        )
-                    #print( f"{self.Authorfont.size} - {self.Authorfont.getsize(TargetText)[0]}")
-                elif CurrentFontSize < 0 :
-                    print("Unable to auto scale, using original size.")
-                else:
-                    TooBig = False
+            self.Authorfont = self.FitFont(
+                self.Configuration["Font"]["Name"],
+                TargetText,
+                MaxAuthorWidth,
+                self.Configuration["Font"]["Size"],
+                self.Configuration.get("Author",{}).get("MinSize",BrandedFontCache.MIN_FONT_SIZE)
+                )
             #writesize = self.font.getsize()
             AuthorText = "Author - \n%s:"%TargetText.strip('"')
-            textwidth = self.Authorfont.getsize(AuthorText)[0]
             AlignX = self.ImageSize[0]-(self.ImageSize[0]*0.95)
-            AlignY = self.ImageSize[1] - (self.ImageSize[1]/8) - self.HeaderFont.getsize("test")[1]
+            AlignY = self.ImageSize[1] - (self.ImageSize[1]/8) - BrandedFontCache.SharedFontCache.Measure(
+                self.Fonts[self.Configuration["Header"]["Font"]],
+                round(self.Configuration["Header"]["Size"]),
+                "test"
+                )[1]
             testwrite = self.ActiveCanvas.text(
                 (AlignX, AlignY),
                 AuthorText,
@@ -458,6 +462,25 @@ class SloganMaker():
             traceback.print_exc()
             return False
     
+    def FitFont(
+            self,
+            FontName,
+            Text,
+            MaxWidth,
+            MaxSize,
+            MinSize = BrandedFontCache.MIN_FONT_SIZE,
+            MaxHeight = None
+            ):
+        '''
+        The cached font at the largest size up to MaxSize at which Text fits, see
+        BrandedFontCache.FitFontSize.
+        '''
+        FontPath = self.Fonts[FontName]
+        return BrandedFontCache.GetFont(
+            FontPath,
+            BrandedFontCache.FitFontSize(FontPath,Text,MaxWidth,MaxSize,MinSize,MaxHeight)
+            )
+        
     def DrawHeader(
             self,
             TargetText
@@ -467,14 +490,22 @@ class SloganMaker():
         "Header":{
             "Text":"Quote Of The Day",
             "Font":"gothamcondensed-bold",
-            "Size":180
+            "Size":180,
+            "MinSize":8
         },
-        Object in configuration file.
+        Object in configuration file. A header too wide for the image is shrunk to fit,
+        down to MinSize.
         '''
-        self.HeaderFont = ImageFont.truetype(self.Fonts[self.Configuration["Header"]["Font"]], round(self.Configuration["Header"]["Size"]))
         #writesize = self.font.getsize(TargetText)
         AlignX = (self.ImageSize[0]/8)
         AlignY = (self.ImageSize[1]/20)
+        self.HeaderFont = self.FitFont(
+            self.Configuration["Header"]["Font"],
+            TargetText,
+            self.ImageSize[0] - 2*AlignX,
+            round(self.Configuration["Header"]["Size"]),
+            self.Configuration["Header"].get("MinSize",BrandedFontCache.MIN_FONT_SIZE)
+            )
         testwrite = self.ActiveCanvas.text(
             (AlignX, AlignY),
             TargetText,
@@ -504,17 +535,16 @@ class SloganMaker():
         
     def CreateImageBase(self):
         '''
-        Create the base Image 
+        Create the base Image as a copy of the static layer, background, header and
+        resized logo, which is only rendered for the first image of a configuration.
         '''
         try:
-            self.Canvas = Image.new(
-                self.ImageType,
-                self.ImageSize,
-                self.StartingColour
-                )
+            StaticCanvas,self.ResizedLogo = self.StaticLayer()
+            self.LogoConfiguration = self.Configuration.get("logo")
+            self.Canvas = StaticCanvas.copy()
             self.DrawBackGround()
         except:
-            traceback.print_Exc()
+            traceback.print_exc()
             return False
         return True
     
@@ -529,12 +559,16 @@ class SloganMaker():
         return
     
     def WriteFile(self):
-        print("Writing File to %s"%os.path.join(currentDirectory,self.Filename))
+        '''
+        Save the canvas to Filename, returning False when it could not be written.
+        '''
         try:
-            self.Canvas.save(self.Filename)
+            with self.Tracer.Span("write"):
+                self.Canvas.save(self.Filename)
         except OSError:
             print(f"failed to save canvas {self.Filename}")
-        return
+            return False
+        return True
 
 
     
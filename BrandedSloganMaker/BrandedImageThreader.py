@@ -25,21 +25,16 @@ try:
     import json
     import csv
     import datetime
+    import signal
     import threading
-    import time
-    import copy
+    import concurrent.futures
 except:
     print("Failed to import python built in libraries")
     sys.exit(1)
-try:
-    from PIL import ImageFont
-    from PIL import Image
-    from PIL import ImageDraw
-except:
-    print("Failed to import pillow, please run 'pip install pillow' from command line.")
-    sys.exit(1)
 try:
     import BrandedImageMaker
+    import BrandedFontIndex
+    import StageTrace
 except:
     print("Failed to import BrandedImageMaker")
     traceback.print_exc()
@@ -52,13 +47,21 @@ except:
 Primary functionality, take an input string of undefined length and convert this sensibly into a 
 branded slogan image. Default image size of 2000x2000px ".png" extended bmp file.
 
+Quotes are rendered by a fixed pool of warm workers, processes by default as rendering
+holds the GIL, each keeping one SloganMaker for the whole run.
 '''
-THREAD_LIMIT = 8
+THREAD_LIMIT = 8 #Default number of workers, see --Workers.
+WORKER_MODES = [
+    "process",
+    "thread"
+    ]
+DEFAULT_WORKER_MODE = "process"
 DEFAULT_IMAGE_SIZE = (2000,2000) #2000x2000px
 DEFAULT_COLOUR = (255,125,255)
 DEFAULT_IMAGE_TYPE = "RGBA"
 DEFAULT_OUTPUT_FILENAME = "test.png"
 DEFAULT_FONT = "arialbd"
+DEFAULT_OUTPUT_FOLDER = "Images_MCP"
 
 if os.getenv("SO_AUTO_HOME") != None:
     currentDirectory = os.getenv("SO_AUTO_HOME")
@@ -81,118 +84,236 @@ DEFAULT_FONTS_FOLDER = os.path.join(
     "Fonts"
     )
 
-class ImageGeneratorThread(threading.Thread):
-    def __init__(
-            self,
-            QuoteAuthor,
-            Id,
-            Configuration=DEFAULT_CONFIGURATION_FILE,
-            QuoteFonts=None
-            ):
-        super().__init__()
-        self.ImageCompleted = False
-        self.Quote = QuoteAuthor[1]
-        self.Author = QuoteAuthor[0]
-        self.Filename = "Images_MCP\\%s_%s.png"%(Id,self.Author.strip('",.-?!'))
-        self.StartTimer =  datetime.datetime.now()
-        self.Configuration = Configuration
-        self.QuoteFonts = QuoteFonts
-        self.Id = Id
-        self.QuoteMaker = BrandedImageMaker.SloganMaker(
-            FileName=self.Filename,
-            FontFolder=self.QuoteFonts,
-            ConfigurationFile=Configuration
+#Populated in each worker by _InitialiseWorker, one SloganMaker per worker thread.
+WorkerConfiguration = None
+WorkerFonts = DEFAULT_FONTS_FOLDER
+WorkerTracer = StageTrace.NullTracer
+WorkerState = threading.local()
+
+def _InitialiseWorker(
+        Configuration,
+        QuoteFonts,
+        TraceSettings = None,
+        IgnoreInterrupt = True
+        ):
+    '''
+    Runs once in each worker process, or once for a thread pool. Ctrl+C is left to the
+    parent. With TraceSettings, records are handed back to the parent in the results.
+    '''
+    if IgnoreInterrupt:
+        signal.signal(signal.SIGINT,signal.SIG_IGN)
+    global WorkerConfiguration,WorkerFonts,WorkerTracer
+    WorkerConfiguration = Configuration
+    WorkerFonts = QuoteFonts
+    if TraceSettings is not None:
+        WorkerTracer = StageTrace.StageTracer(**TraceSettings)
+    return
+
+def _WorkerMaker():
+    Maker = getattr(WorkerState,"Maker",None)
+    if Maker is None:
+        Maker = WorkerState.Maker = BrandedImageMaker.SloganMaker(
+            FileName=DEFAULT_OUTPUT_FILENAME,
+            FontFolder=WorkerFonts,
+            ConfigurationFile=WorkerConfiguration,
+            Tracer=WorkerTracer
             )
-        FileLoaded = False
-        return
-        
-    def run(self):
-        print(f"Generating Image {self.Id}")
-        try:
-            #print(f"Start Run {self.Id}")
-            self.QuoteMaker.run(self.Quote,self.Author)
-            #print(f"Write File {self.Id}")
-            self.QuoteMaker.WriteFile()
-            #print(f"Write Compelte, Dumping time {self.Id}")
-            Duration = datetime.datetime.now() - self.StartTimer
-            #print("ImageCreation Completed in %s"%str(Duration))
-            #print (f"image Completed {self.Id}")
-            self.ImageCompleted = True
-        except:
-            traceback.print_exc()
-        return 
-    
-    def getImageComplete(self):
-        return self.ImageCompleted
+    return Maker
+
+def RenderQuote(
+        Id,
+        QuoteAuthor
+        ):
+    '''
+    Render and write one [Author,Quote] with this worker's SloganMaker, returning a result
+    dict with the "Id", output "Filename", "Error" (None on success) and "Duration", and
+    the "Trace" record when the worker traces for its parent.
+    '''
+    StartTimer = datetime.datetime.now()
+    Author,Quote = QuoteAuthor
+    Result = {
+        "Id":Id,
+        "Filename":None,
+        "Error":None
+        }
+    try:
+        Maker = _WorkerMaker()
+        Result["Filename"] = OutputFileName(Id,Author,Maker.OutputFolder)
+        Maker.SetFileName(Result["Filename"])
+        WorkerTracer.LastRecord = None
+        with WorkerTracer.Image(Maker.Filename):
+            if not Maker.run(Quote,Author):
+                Result["Error"] = f"failed to render {Maker.Filename}"
+            elif not Maker.WriteFile():
+                Result["Error"] = f"failed to save canvas {Maker.Filename}"
+    except:
+        Result["Error"] = traceback.format_exc()
+    if WorkerTracer.Enabled:
+        Result["Trace"] = WorkerTracer.LastRecord
+    Result["Duration"] = (datetime.datetime.now() - StartTimer).total_seconds()
+    return Result
+
+def OutputFileName(
+        Id,
+        Author,
+        OutputFolder = None
+        ):
+    '''
+    Output path in the configured "Output" folder, or DEFAULT_OUTPUT_FOLDER.
+    '''
+    return os.path.join(OutputFolder or DEFAULT_OUTPUT_FOLDER,"%s_%s.png"%(Id,Author.strip('",.-?!')))
+
+def IterateQuotes(QuoteFile):
+    '''
+    Yield [Author,Quote] from a CSV of Author,Quote rows or a JSON list of [Quote,Author].
+    '''
+    if os.path.splitext(QuoteFile)[1] == ".csv":
+        with open (QuoteFile,"r") as csvfile:
+            for row in csv.reader(csvfile, delimiter=',', quotechar='"'):
+                yield [row[0],row[1]]
+    elif os.path.splitext(QuoteFile)[1] == ".json":
+        with open (QuoteFile,"r") as j_file:
+            for i in json.loads(j_file.read()):
+                yield [i[1],i[0]]
+    return
 
 class ImageThreadMaker():
     def __init__(
             self,
             QuoteConfiguration=DEFAULT_CONFIGURATION_FILE,
             QuoteFile=DEFAULT_QUOTE_FILE,
-            QuoteFonts=DEFAULT_FONTS_FOLDER
+            QuoteFonts=DEFAULT_FONTS_FOLDER,
+            Tracer=StageTrace.NullTracer,
+            Workers=THREAD_LIMIT,
+            WorkerMode=DEFAULT_WORKER_MODE,
+            OnComplete=None
             ):
-        self.NumberExecuting = 0
-        self.TotalThreads = 0
-        self.Threads = []
-        self.Alive = True
+        '''
+        Render every quote in QuoteFile across Workers warm workers, "process" or "thread"
+        per WorkerMode, with at most two quotes per worker queued. OnComplete is called in
+        this thread with each RenderQuote result as it finishes. A run that stops early,
+        on a missing file or a broken pool, is left in Error and the quotes it had queued
+        are counted as failures.
+        '''
+        if WorkerMode not in WORKER_MODES:
+            raise ValueError(f"WorkerMode {WorkerMode} not in options {WORKER_MODES}")
         self.QuoteFile = QuoteFile
         self.QuoteConfiguration = QuoteConfiguration
         self.QuoteFonts = QuoteFonts
-        self.Quotes = []
-        print("threadmaster Created")
+        self.Tracer = Tracer
+        self.Workers = max(1,Workers)
+        self.WorkerMode = WorkerMode
+        self.OnComplete = OnComplete
+        self.TotalThreads = 0
+        self.Succeeded = 0
+        self.Failures = []
+        self.Error = None
+        self.Duration = None
+        
+    def CreatePool(self,Configuration):
+        #Read or build the stored font index once here, rather than in every worker at once.
+        BrandedFontIndex.GetFontIndex(self.QuoteFonts).Load()
+        if self.WorkerMode == "thread":
+            #Threads share the parent's tracer directly.
+            global WorkerTracer
+            _InitialiseWorker(Configuration,self.QuoteFonts,IgnoreInterrupt=False)
+            WorkerTracer = self.Tracer
+            return concurrent.futures.ThreadPoolExecutor(max_workers=self.Workers)
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.Workers,
+            initializer=_InitialiseWorker,
+            initargs=(
+                Configuration,
+                self.QuoteFonts,
+                self.Tracer.Settings() if self.Tracer.Enabled else None
+                )
+            )
+        
+    def Completed(self,Result):
+        if Result.get("Trace") is not None and self.WorkerMode == "process":
+            self.Tracer.Record(Result["Trace"])
+        if Result["Error"] is None:
+            self.Succeeded += 1
+        else:
+            print(f"Failed to create {Result['Filename'] or 'quote %s'%Result['Id']}")
+            print(Result["Error"])
+            self.Failures.append((Result["Filename"],Result["Error"]))
+        if self.OnComplete is not None:
+            self.OnComplete(Result)
+        return
+        
+    def Collect(
+            self,
+            Future,
+            Id
+            ):
+        '''
+        Report a finished or abandoned quote, a worker that died with it is a failure.
+        '''
+        if Future.done() and not Future.cancelled() and Future.exception() is None:
+            Result = Future.result()
+        elif Future.done() and not Future.cancelled():
+            Error = Future.exception()
+            Result = {
+                "Id":Id,
+                "Filename":None,
+                "Error":"".join(traceback.format_exception(type(Error),Error,Error.__traceback__))
+                }
+        else:
+            Result = {
+                "Id":Id,
+                "Filename":None,
+                "Error":"not rendered, the run stopped first"
+                }
+        self.Completed(Result)
+        return
         
     def run(self):
-        print("ThreadMakerRunning")
+        StartTimer = datetime.datetime.now()
+        print(f"Rendering with {self.Workers} {self.WorkerMode} workers.")
+        Pending = {} #Future to quote Id.
         try:
-            if os.path.splitext(self.QuoteFile)[1] == ".csv":
-                with open (self.QuoteFile,"r") as csvfile:
-                    # CSV : Author, Quote
-                    self.spamreader = csv.reader(csvfile, delimiter=',', quotechar='"')
-                    for row in self.spamreader:
-                        self.Quotes.append([row[0],row[1]])
-            elif os.path.splitext(self.QuoteFile)[1] == ".json":
-                with open (self.QuoteFile,"r") as j_file:
-                    j_raw = json.loads(j_file.read())
-                    for i in j_raw:
-                        self.Quotes.append([i[1],i[0]])
-            
             with open (self.QuoteConfiguration,"r") as r_file:
                 Configuration = json.loads(r_file.read())
-            while self.Alive:
-                if self.Quotes == []:
-                    self.Alive = False
-                else:
-                    if self.NumberExecuting >THREAD_LIMIT:
-                        time.sleep(0.1)
-                    else:
-                        for x in range(THREAD_LIMIT - self.NumberExecuting):
-                            #print("Creating New Thread")
-                            self.Threads.append(ImageGeneratorThread(
-                                self.Quotes.pop(0),
-                                copy.deepcopy(self.TotalThreads),
-                                Configuration=Configuration,
-                                QuoteFonts=DEFAULT_FONTS_FOLDER
-                                )
-                            )
-                            self.TotalThreads += 1
-                            self.NumberExecuting +=1
-                            self.Threads[self.NumberExecuting-1].start()
-                    killlist= []
-                    for i in range(len(self.Threads)):
-                        if self.Threads[i].getImageComplete():
-                            print(f"Starting Thread Delete {self.Threads[i].Id}")
-                            killlist.append(i)
-                            self.Threads[i].join(5)
-                            del_thread = self.Threads.pop(i)
-                            del (del_thread)
-                            self.NumberExecuting -= 1
-                            #print(f"Thread Delete Complete {self.Threads[i].Id}")
+            Quotes = IterateQuotes(self.QuoteFile)
+            with self.CreatePool(Configuration) as Pool:
+                Exhausted = False
+                while Pending or not Exhausted:
+                    while not Exhausted and len(Pending) < self.Workers*2:
+                        try:
+                            QuoteAuthor = next(Quotes)
+                        except StopIteration:
+                            Exhausted = True
                             break
-                        else:
-                            #print(f"Thread Incomplete {self.Threads[i].Id}")
-                            pass
-                    
+                        Pending[Pool.submit(RenderQuote,self.TotalThreads,QuoteAuthor)] = self.TotalThreads
+                        self.TotalThreads += 1
+                    if not Pending:
+                        break
+                    Done,_ = concurrent.futures.wait(
+                        Pending,
+                        return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                    for Future in Done:
+                        self.Collect(Future,Pending.pop(Future))
         except:
-            traceback.print_exc()
-        return
\ No newline at end of file
+            self.Error = traceback.format_exc()
+            print("Rendering stopped early.")
+            print(self.Error)
+            for Future,Id in Pending.items():
+                Future.cancel()
+                self.Collect(Future,Id)
+        self.Duration = datetime.datetime.now() - StartTimer
+        return
+    
+    def Report(self):
+        Seconds = self.Duration.total_seconds() if self.Duration else 0
+        print("%s images created, %s failed, in %s (%.2f images/s)"%(
+            self.Succeeded,
+            len(self.Failures),
+            str(self.Duration),
+            self.Succeeded/Seconds if Seconds else 0
+            )
+        )
+        if self.Error is not None:
+            print("The run stopped before every quote was rendered, see the error above.")
+        return
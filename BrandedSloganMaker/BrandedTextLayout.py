@@ -0,0 +1,178 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import BrandedFontCache
+except:
+    print("Failed to import BrandedFontCache")
+
+'''
+@date: 18/10/2026
+
+Word wrapping and fit-to-box layout for quote text. Each word is measured once per font
+size, plus the width of a space, and lines are filled greedily in a single pass over the
+words. FitText searches font sizes for the largest at which the text fits a box. The
+result is a TextLayout, which can be kept and rendered onto any canvas.
+'''
+
+DEFAULT_MAX_LINES = None #No limit beyond the height of the box.
+
+class TextLayout():
+    def __init__(
+            self,
+            FontPath,
+            Size,
+            Lines,
+            LineHeight,
+            Fits = True
+            ):
+        '''
+        Lines of text in the font at FontPath and Size, drawn LineHeight apart. Fits is
+        False where the text overflowed the box even at the smallest size allowed.
+        '''
+        self.FontPath = FontPath
+        self.Size = Size
+        self.Lines = Lines
+        self.LineHeight = LineHeight
+        self.Fits = Fits
+
+    def Height(self):
+        return self.LineHeight * len(self.Lines)
+
+    def Quoted(self):
+        '''
+        The layout with an opening quote mark on the first line and a closing one on the
+        last, as quotes have always been drawn.
+        '''
+        Lines = list(self.Lines)
+        for i in range(len(Lines)):
+            if i == 0:
+                Lines[i] = '"' + Lines[i]
+            elif i == len(Lines) - 1:
+                Lines[i] = Lines[i] + '"'
+        return TextLayout(self.FontPath,self.Size,Lines,self.LineHeight,self.Fits)
+
+    def Render(
+            self,
+            Drawable,
+            CentreX,
+            Top,
+            Colour
+            ):
+        '''
+        Draw each line centred on CentreX, the first at Top, onto an ImageDraw.
+        '''
+        Font = BrandedFontCache.GetFont(self.FontPath,self.Size)
+        for i,Line in enumerate(self.Lines):
+            Width = BrandedFontCache.SharedFontCache.Measure(self.FontPath,self.Size,Line)[0]
+            Drawable.text(
+                (CentreX - Width/2, Top + self.LineHeight*i),
+                Line,
+                Colour,
+                font=Font
+                )
+        return
+
+def WrapWords(
+        WordWidths,
+        SpaceWidth,
+        MaxWidth
+        ):
+    '''
+    Greedily fill lines, each word counting its width and a following space. Returns
+    [Start,End) word ranges, a word wider than MaxWidth on its own goes on its own line.
+    '''
+    Ranges = []
+    Start = 0
+    LineWidth = 0
+    for i,Width in enumerate(WordWidths):
+        if i > Start and LineWidth + Width + SpaceWidth > MaxWidth:
+            Ranges.append((Start,i))
+            Start = i
+            LineWidth = 0
+        LineWidth += Width + SpaceWidth
+    if WordWidths:
+        Ranges.append((Start,len(WordWidths)))
+    return Ranges
+
+def LayoutText(
+        FontPath,
+        Size,
+        Text,
+        MaxWidth,
+        MaxHeight = None,
+        MaxLines = DEFAULT_MAX_LINES,
+        Cache = None
+        ):
+    '''
+    Wrap Text to MaxWidth at one font size. The layout Fits when no line is wider than
+    MaxWidth, the lines fit within MaxHeight and, with MaxLines, there are at most that many.
+    '''
+    if Cache is None:
+        Cache = BrandedFontCache.SharedFontCache
+    Words = Text.split(" ")
+    SpaceWidth = Cache.Advance(FontPath,Size," ")
+    WordWidths = [Cache.Advance(FontPath,Size,Word) for Word in Words]
+    Lines = []
+    Fits = True
+    for Start,End in WrapWords(WordWidths,SpaceWidth,MaxWidth):
+        Lines.append(" ".join(Words[Start:End]) + " ")
+        if sum(WordWidths[Start:End]) + SpaceWidth*(End - Start) > MaxWidth:
+            Fits = False
+    LineHeight = Cache.Measure(FontPath,Size,"test")[1]
+    if MaxHeight is not None and LineHeight*len(Lines) > MaxHeight:
+        Fits = False
+    if MaxLines is not None and len(Lines) > MaxLines:
+        Fits = False
+    return TextLayout(FontPath,Size,Lines,LineHeight,Fits)
+
+def FitText(
+        FontPath,
+        Text,
+        MaxWidth,
+        MaxHeight,
+        MaxSize,
+        MinSize = BrandedFontCache.MIN_FONT_SIZE,
+        MaxLines = DEFAULT_MAX_LINES,
+        Cache = None
+        ):
+    '''
+    Layout of Text at the largest size from MinSize to MaxSize that fits the box, found by
+    binary search. Text that does not fit even at MinSize is laid out at MinSize with
+    Fits False, rather than dropped.
+    '''
+    def Layout(Size):
+        return LayoutText(FontPath,Size,Text,MaxWidth,MaxHeight,MaxLines,Cache)
+    Best = Layout(int(MaxSize))
+    if Best.Fits or int(MaxSize) <= int(MinSize):
+        return Best
+    Low,High = int(MinSize),int(MaxSize)
+    Best = Layout(Low)
+    if not Best.Fits:
+        return Best
+    #Invariant: Low fits, High does not.
+    while High - Low > 1:
+        Middle = (Low + High)//2
+        Candidate = Layout(Middle)
+        if Candidate.Fits:
+            Low,Best = Middle,Candidate
+        else:
+            High = Middle
+    return Best
@@ -0,0 +1,266 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import json
+    import time
+    import pstats
+    import cProfile
+    import threading
+    import tracemalloc
+except:
+    print("Failed to import Python Built in libraries")
+
+'''
+@date: 18/10/2026
+
+Per image, per stage timing. Each image is traced as a record of stage durations:
+
+with Tracer.Image(Name):
+    with Tracer.Span("probe"):
+        ...
+
+Records are written as JSON lines to Output and / or summarised as a histogram by
+Report. ProfileEvery and MemoryEvery sample one image in N for cProfile (a .prof file in
+ProfileFolder) and tracemalloc (peak and top allocations in the record). NullTracer hands
+out a shared do nothing span, so tracing costs nothing when it is off.
+
+The same module is kept in WaterMarker and BrandedSloganMaker, which are standalone. Patch
+both copies together, WaterMarker/tests/test_stagetrace.py fails if they differ.
+'''
+
+PERCENTILES = [50,90,99]
+MEMORY_TOP = 5 #Allocation sites kept per sampled image.
+
+class _NullSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class _NullTracer():
+    Enabled = False
+    LastRecord = None
+
+    def Image(self,Name):
+        return NULL_SPAN
+
+    def Span(self,Stage):
+        return NULL_SPAN
+
+    def Record(self,Record):
+        return
+
+    def Report(self):
+        return
+
+    def Close(self):
+        return
+
+NullTracer = _NullTracer()
+
+class _Span():
+    def __init__(
+            self,
+            Stages,
+            Stage
+            ):
+        self.Stages = Stages
+        self.Stage = Stage
+
+    def __enter__(self):
+        self.Start = time.perf_counter()
+        return self
+
+    def __exit__(self,*args):
+        self.Stages[self.Stage] = self.Stages.get(self.Stage,0.0) + time.perf_counter() - self.Start
+        return False
+
+class _ImageSpan():
+    def __init__(
+            self,
+            Tracer,
+            Name
+            ):
+        self.Tracer = Tracer
+        self.Name = Name
+
+    def __enter__(self):
+        self.Tracer._Begin(self.Name)
+        return self
+
+    def __exit__(self,ExceptionType,*args):
+        self.Tracer._End(ExceptionType is None)
+        return False
+
+class StageTracer():
+    def __init__(
+            self,
+            Output = None,
+            Histogram = False,
+            ProfileEvery = 0,
+            MemoryEvery = 0,
+            ProfileFolder = None
+            ):
+        '''
+        Output is a JSON lines path, Histogram keeps durations for Report. A tracer with
+        neither still times images, for a caller that forwards LastRecord elsewhere, such
+        as a worker process handing records back to its parent.
+        '''
+        self.Enabled = True
+        self.Output = open(Output,"a") if Output else None
+        self.Histogram = Histogram
+        self.ProfileEvery = ProfileEvery
+        self.MemoryEvery = MemoryEvery
+        self.ProfileFolder = ProfileFolder or os.getcwd()
+        self.Durations = {}
+        self.Images = 0
+        self.LastRecord = None
+        self.Lock = threading.Lock()
+        self.Local = threading.local()
+
+    def Settings(self):
+        '''
+        Arguments for an equivalent forwarding tracer in another process.
+        '''
+        return {
+            "ProfileEvery":self.ProfileEvery,
+            "MemoryEvery":self.MemoryEvery,
+            "ProfileFolder":self.ProfileFolder
+            }
+
+    def Image(
+            self,
+            Name
+            ):
+        return _ImageSpan(self,Name)
+
+    def Span(
+            self,
+            Stage
+            ):
+        Current = getattr(self.Local,"Current",None)
+        if Current is None:
+            return NULL_SPAN
+        return _Span(Current["Stages"],Stage)
+
+    def _Begin(
+            self,
+            Name
+            ):
+        with self.Lock:
+            self.Images += 1
+            Index = self.Images
+        Current = {
+            "Image":Name,
+            "Index":Index,
+            "Stages":{}
+            }
+        self.Local.Current = Current
+        self.Local.Profiler = None
+        self.Local.Memory = False
+        if self.ProfileEvery and Index % self.ProfileEvery == 1 % self.ProfileEvery:
+            self.Local.Profiler = cProfile.Profile()
+        if self.MemoryEvery and Index % self.MemoryEvery == 1 % self.MemoryEvery and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.Local.Memory = True
+        if self.Local.Profiler is not None:
+            self.Local.Profiler.enable()
+        self.Local.Start = time.perf_counter()
+
+    def _End(
+            self,
+            Succeeded
+            ):
+        Current = self.Local.Current
+        Current["Total"] = time.perf_counter() - self.Local.Start
+        Current["Succeeded"] = Succeeded
+        if self.Local.Profiler is not None:
+            self.Local.Profiler.disable()
+            ProfilePath = os.path.join(
+                self.ProfileFolder,
+                f"{os.getpid()}_{Current['Index']}_{os.path.basename(str(Current['Image']))}.prof"
+                )
+            pstats.Stats(self.Local.Profiler).dump_stats(ProfilePath)
+            Current["Profile"] = ProfilePath
+        if self.Local.Memory:
+            Snapshot = tracemalloc.take_snapshot()
+            Current["Memory"] = {
+                "Peak":tracemalloc.get_traced_memory()[1],
+                "Top":[str(Statistic) for Statistic in Snapshot.statistics("lineno")[:MEMORY_TOP]]
+                }
+            tracemalloc.stop()
+        self.Local.Current = None
+        self.Record(Current)
+
+    def Record(
+            self,
+            Record
+            ):
+        '''
+        Take a finished record, from this tracer or forwarded from another.
+        '''
+        with self.Lock:
+            self.LastRecord = Record
+            if self.Output is not None:
+                self.Output.write(json.dumps(Record) + "\n")
+            if self.Histogram:
+                for Stage,Duration in list(Record["Stages"].items()) + [("total",Record["Total"])]:
+                    self.Durations.setdefault(Stage,[]).append(Duration)
+        return
+
+    def Report(self):
+        '''
+        Print count, mean and percentiles per stage, in milliseconds.
+        '''
+        if not self.Durations:
+            return
+        print("%-12s %8s %10s"%("Stage","Count","Mean") + "".join("%10s"%f"p{Percent}" for Percent in PERCENTILES) + "%10s"%"Max")
+        for Stage,Durations in self.Durations.items():
+            Ordered = sorted(Durations)
+            Line = "%-12s %8d %10.2f"%(Stage,len(Ordered),1000*sum(Ordered)/len(Ordered))
+            for Percent in PERCENTILES:
+                Line += "%10.2f"%(1000*Ordered[max(0,-(-len(Ordered)*Percent//100) - 1)])
+            print(Line + "%10.2f"%(1000*Ordered[-1]))
+        return
+
+    def Close(self):
+        if self.Output is not None:
+            self.Output.close()
+            self.Output = None
+        return
+
+def CreateTracer(
+        Output = None,
+        Histogram = False,
+        ProfileEvery = 0,
+        MemoryEvery = 0,
+        ProfileFolder = None
+        ):
+    '''
+    A StageTracer when anything is asked for, otherwise NullTracer.
+    '''
+    if not (Output or Histogram or ProfileEvery or MemoryEvery):
+        return NullTracer
+    return StageTracer(Output,Histogram,ProfileEvery,MemoryEvery,ProfileFolder)
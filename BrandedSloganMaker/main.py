@@ -46,6 +46,8 @@ sys.path.append(currentDirectory)
 try:
     import BrandedImageMaker
     import BrandedImageThreader
+    import StageTrace
+    import BrandedFontCache
 except:
     print("Failed to import MCP Specific modules.")
     sys.exit(1)
@@ -75,12 +77,22 @@ def main(args):
 
     print("Starting Generation of Branded Images")
     TotalStartTimer =  datetime.datetime.now()
+    Tracer = StageTrace.CreateTracer(
+        Output=args.Trace,
+        Histogram=args.TraceSummary,
+        ProfileEvery=args.ProfileEvery,
+        MemoryEvery=args.MemoryEvery,
+        ProfileFolder=args.ProfileFolder
+        )
     if ThreadMode == "MULTITHREADED":
         print("Running as Multi threaded entity.")
         runner = BrandedImageThreader.ImageThreadMaker(
             QuoteConfiguration=DEFAULT_CONFIGURATION_FILE,
             QuoteFonts=DEFAULT_FONTS_FOLDER,
-            QuoteFile=DEFAULT_QUOTE_FILE
+            QuoteFile=inputfile,
+            Tracer=Tracer,
+            Workers=args.Workers,
+            WorkerMode=args.WorkerMode
             )
         runner.run()
         Duration = datetime.datetime.now() - TotalStartTimer
@@ -90,6 +102,12 @@ def main(args):
             )
         )
         numberOfFiles = runner.TotalThreads
+        runner.Report()
+        Tracer.Report()
+        if args.WorkerMode == "thread":
+            BrandedFontCache.SharedFontCache.Report()
+        Tracer.Close()
+        return 1 if runner.Failures or runner.Error is not None else 0
     else:
         print ("Running as Single Threaded entity.")
         TotalStartTimer =  datetime.datetime.now()
@@ -98,6 +116,7 @@ def main(args):
             FileName="Images\\%s.png"%numberOfFiles,
             ConfigurationFile=DEFAULT_CONFIGURATION_FILE,
             FontFolder=DEFAULT_FONTS_FOLDER,
+            Tracer=Tracer
             )#QuoteFile=DEFAULT_QUOTE_FILE)
         print("Loading from file %s"%inputfile)
         if os.path.splitext(inputfile)[1] == ".csv":
@@ -108,46 +127,43 @@ def main(args):
                     quotechar='"'
                     )
                 for row in spamreader:
-                    StartTimer =  datetime.datetime.now()
                     MakerBot.SetFileName(
                         FileName="Image\\%s_%s.png"%(
                             numberOfFiles,
                             row[0].strip('",.-')
                             )
                         )
-                    MakerBot.run(
-                        row[1],
-                        row[0]
-                        )
-                    MakerBot.WriteFile()
+                    with Tracer.Image(MakerBot.Filename):
+                        if MakerBot.run(
+                                row[1],
+                                row[0]
+                                ):
+                            MakerBot.WriteFile()
                     numberOfFiles += 1
-                    Duration = datetime.datetime.now() - StartTimer
-                    print("ImageCreation Completed in %s"%str(Duration))
-                    print(Duration)
                     
         elif os.path.splitext(inputfile)[1] == ".json":
             with open (inputfile,"r") as r_file:
                 catalogue = json.loads(r_file.read())
                 for row in catalogue:
-                    StartTimer =  datetime.datetime.now()
                     MakerBot.SetFileName(
                         FileName="Image\\%s_%s.png"%(
                             numberOfFiles,
                             row[0].strip('",.-')
                             )
                         )
-                    MakerBot.run(
-                        row[0],
-                        row[1]
-                        )
-                    MakerBot.WriteFile()
+                    with Tracer.Image(MakerBot.Filename):
+                        if MakerBot.run(
+                                row[0],
+                                row[1]
+                                ):
+                            MakerBot.WriteFile()
                     numberOfFiles += 1
-                    Duration = datetime.datetime.now() - StartTimer
-                    print("ImageCreation Completed in %s"%str(Duration))
-                    print(Duration)
         Duration = datetime.datetime.now() - TotalStartTimer
         print("Total Image creation of %s images complete in "%numberOfFiles)
         print(Duration)
+        Tracer.Report()
+        BrandedFontCache.SharedFontCache.Report()
+        Tracer.Close()
         return 0
 
 if __name__ == '__main__':
@@ -157,6 +173,13 @@ if __name__ == '__main__':
     
     parser.add_argument('--quotepath', nargs='?', default = DEFAULT_QUOTE_FILE, help = 'Path to the Quote File Path.')
     parser.add_argument('--MultiThread', nargs='?', default = 0, help = '0=Single Threaded, 1=MultiThread')
+    parser.add_argument('--Workers', type = int, default = BrandedImageThreader.THREAD_LIMIT, help = 'Workers rendering images for MultiThread.')
+    parser.add_argument('--WorkerMode', choices = BrandedImageThreader.WORKER_MODES, default = BrandedImageThreader.DEFAULT_WORKER_MODE, help = 'Render in worker processes, or threads sharing one font cache.')
+    parser.add_argument('--Trace', default = None, help = 'Append per image stage timings to this JSON lines file.')
+    parser.add_argument('--TraceSummary', action = 'store_true', help = 'Print a per stage latency histogram at the end of the run.')
+    parser.add_argument('--ProfileEvery', type = int, default = 0, help = 'cProfile one image in N, written to --ProfileFolder.')
+    parser.add_argument('--MemoryEvery', type = int, default = 0, help = 'Record tracemalloc peak and top allocations for one image in N.')
+    parser.add_argument('--ProfileFolder', default = None, help = 'Folder for sampled .prof files, defaults to the working directory.')
     
     args = parser.parse_args()
     sys.exit(main(args))
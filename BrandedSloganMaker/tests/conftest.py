@@ -0,0 +1,7 @@
+'''
+The BrandedSloganMaker modules are imported flat, as main.py does.
+'''
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
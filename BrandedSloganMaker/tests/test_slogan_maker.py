@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+import BrandedImageMaker
+import BrandedImageThreader
+
+ToolFolder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BodyFont = "alphabetized cassette tapes"
+
+def Configuration(OutputFolder):
+    return {
+        "Borders":[20,80,20,80],
+        "size":[2000,2000],
+        "logo":{"alignX":"Right","alignY":"Bottom","size":30,"path":os.path.join(ToolFolder,"Logos","TemplateLogo.png")},
+        "Background":{"Colour":[47,46,47],"Type":"Colour"},
+        "Font":{"Colour":[255,255,255],"Size":160,"Name":BodyFont},
+        "Header":{"Text":"Quote Of The Day","Font":"gothamcondensed-bold","Size":180},
+        "Output":{"path":str(OutputFolder)}
+        }
+
+@pytest.fixture
+def Maker(tmp_path):
+    return BrandedImageMaker.SloganMaker(
+        FileName="quote.png",
+        ConfigurationFile=Configuration(tmp_path / "out"),
+        FontFolder=os.path.join(ToolFolder,"Fonts")
+        )
+
+@pytest.fixture(params=["missing","corrupt"])
+def BadFont(request,tmp_path,Maker):
+    '''
+    Point the quote's font at a missing or unreadable file, the header keeps its own.
+    '''
+    Path = tmp_path / "bad.ttf"
+    if request.param == "corrupt":
+        Path.write_bytes(b"not a font")
+    Maker.Fonts = {
+        Maker.Configuration["Header"]["Font"]:Maker.Fonts[Maker.Configuration["Header"]["Font"]],
+        BodyFont:str(Path)
+        }
+    return Maker
+
+def test_run_draws_and_writes(Maker):
+    assert Maker.run("Simplicity is the ultimate sophistication.","Leonardo da Vinci")
+    assert Maker.WriteFile()
+    assert os.path.isfile(Maker.Filename)
+
+def test_run_fails_when_the_quote_font_cannot_be_loaded(BadFont):
+    assert BadFont.run("Simplicity is the ultimate sophistication.","Leonardo da Vinci") is False
+
+def test_failed_quote_is_not_written_by_a_warm_worker(BadFont):
+    BrandedImageThreader.WorkerState.Maker = BadFont
+    try:
+        Result = BrandedImageThreader.RenderQuote(0,["Leonardo da Vinci","Simplicity is the ultimate sophistication."])
+    finally:
+        BrandedImageThreader.WorkerState.Maker = None
+    assert Result["Error"] is not None
+    assert not os.path.exists(Result["Filename"])
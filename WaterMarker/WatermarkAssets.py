@@ -0,0 +1,482 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import threading
+    from collections import OrderedDict
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import Image
+    from PIL import ImageDraw
+    from PIL import ImageFont
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+try:
+    import WatermarkCompositor
+except:
+    print("Failed to import WatermarkCompositor.")
+
+'''
+@date: 18/10/2026
+
+Prepared watermark assets. A watermark file is decoded, scaled and thresholded, or a text
+watermark rasterised, once per configuration and then shared by every WatermarkMarker in
+the run, rather than being reopened or re-rendered for every input image.
+'''
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024 #256MB of prepared sprites and masks.
+PYRAMID_MIN_SIZE = 16 #Smallest pyramid level, in pixels along the shorter side.
+DEFAULT_PATTERN_ANGLE = 30 #Degrees anticlockwise.
+DEFAULT_PATTERN_SPACING = (100,100) #Pixels between repeats, across and down.
+DEFAULT_PATTERN_OPACITY = 0.3
+
+class WatermarkAsset():
+    def __init__(
+            self,
+            Sprite,
+            Mask,
+            SourceStamp = None
+            ):
+        '''
+        Sprite is RGBA and is pasted through its own alpha, for image watermarks that is
+        the threshold mask. Mask is the "L" 0/255 mask on its own (None where nothing is
+        drawn) for burning into mask outputs.
+        '''
+        self.Sprite = Sprite
+        self.Mask = Mask
+        self.Width,self.Height = Sprite.size
+        self.SourceStamp = SourceStamp
+
+    def Composite(
+            self,
+            Target,
+            DrawX,
+            DrawY
+            ):
+        if self.Mask is None:
+            return Target
+        return WatermarkCompositor.CompositeMark(Target,self.Sprite,self.Sprite,DrawX,DrawY)
+
+    def MaskPlacements(
+            self,
+            DrawX,
+            DrawY
+            ):
+        '''
+        (Mask,DrawX,DrawY) for each mask drawn by this asset, as WatermarkMask expects.
+        '''
+        if self.Mask is None:
+            return []
+        return [(self.Mask,DrawX,DrawY)]
+
+    def ByteSize(self):
+        Total = self.Width * self.Height * 4
+        if self.Mask is not None:
+            Total += self.Width * self.Height
+        return Total
+
+def _SourceStamp(Path):
+    '''
+    Modification time and size of the source, so an edited watermark is picked up.
+    '''
+    try:
+        Stat = os.stat(Path)
+    except OSError:
+        return None
+    return (Stat.st_mtime_ns, Stat.st_size)
+
+def _ThresholdAsset(
+        MarkInput,
+        Background,
+        Stamp
+        ):
+    Sprite,Mask = WatermarkCompositor.BuildThresholdMask(MarkInput,Background)
+    Sprite = Sprite.convert("RGBA")
+    if Mask is None:
+        Sprite.putalpha(0)
+    else:
+        Sprite.putalpha(Mask)
+    return WatermarkAsset(Sprite, Mask, Stamp)
+
+def PrepareImageAsset(
+        Path,
+        Scale = 1,
+        Background = "Transparent"
+        ):
+    '''
+    Decode, scale and threshold a watermark image file into a WatermarkAsset.
+    '''
+    Stamp = _SourceStamp(Path)
+    with Image.open(Path) as MarkInput:
+        MarkInput.load()
+        if Scale != 1:
+            MarkInput = MarkInput.resize(
+                (int(MarkInput.width*Scale),int(MarkInput.height*Scale))
+                )
+        return _ThresholdAsset(MarkInput, Background, Stamp)
+
+class WatermarkPyramid():
+    def __init__(
+            self,
+            Levels,
+            SourceStamp = None
+            ):
+        '''
+        The decoded watermark at full size followed by successive halvings, each resampled
+        with Lanczos from the level above. Thresholding happens after the final resize,
+        so the levels keep their original colours and alpha.
+        '''
+        self.Levels = Levels
+        self.Width,self.Height = Levels[0].size
+        self.SourceStamp = SourceStamp
+
+    def ByteSize(self):
+        return sum(Level.width * Level.height * len(Level.getbands()) for Level in self.Levels)
+
+    def Resample(
+            self,
+            Size
+            ):
+        '''
+        Start from the smallest level still at least Size, so the final resize is a
+        cheap bilinear step down rather than a full quality resize from the original.
+        '''
+        Level = self.Levels[0]
+        for Candidate in self.Levels[1:]:
+            if Candidate.width < Size[0] or Candidate.height < Size[1]:
+                break
+            Level = Candidate
+        if Level.size == tuple(Size):
+            return Level
+        return Level.resize(tuple(Size),Image.BILINEAR)
+
+def PreparePyramid(Path):
+    Stamp = _SourceStamp(Path)
+    with Image.open(Path) as Original:
+        Original.load()
+        if Original.mode in ["RGB","RGBA"]:
+            Level = Original.copy()
+        else:
+            Level = Original.convert("RGBA")
+    Levels = [Level]
+    while min(Level.size)//2 >= PYRAMID_MIN_SIZE:
+        Level = Level.resize((Level.width//2,Level.height//2),Image.LANCZOS)
+        Levels.append(Level)
+    return WatermarkPyramid(Levels, Stamp)
+
+def _TextSize(
+        Font,
+        Text
+        ):
+    if hasattr(Font,"getbbox"):
+        Left,Top,Right,Bottom = Font.getbbox(Text)
+        return Right,Bottom
+    return Font.getsize(Text)
+
+def PrepareTextAsset(
+        FontFile,
+        Size,
+        Text,
+        Colour = (255,255,255)
+        ):
+    '''
+    Rasterise a text watermark once into an anti-aliased RGBA sprite in the given colour,
+    with a binary mask rendered alongside it.
+    '''
+    Stamp = _SourceStamp(FontFile)
+    Font = ImageFont.truetype(FontFile,Size)
+    Width,Height = _TextSize(Font,Text)
+    Alpha = Image.new("L",(max(Width,1),max(Height,1)),color=0)
+    ImageDraw.Draw(Alpha).text((0,0),Text,fill=255,font=Font)
+    Mask = Image.new("L",Alpha.size,color=0)
+    Drawable = ImageDraw.Draw(Mask)
+    Drawable.fontmode = "1" #Masks stay binary.
+    Drawable.text((0,0),Text,fill=255,font=Font)
+    Sprite = Image.new("RGBA",Alpha.size,color=tuple(Colour[:3]) + (0,))
+    Sprite.putalpha(Alpha)
+    return WatermarkAsset(Sprite, Mask, Stamp)
+
+class PatternTile(WatermarkAsset):
+    def __init__(
+            self,
+            Sprite,
+            Mask,
+            StepX,
+            StepY,
+            SourceStamp = None
+            ):
+        '''
+        One tinted, faded and rotated repeat of a pattern, with the distance to the next
+        repeat across (StepX) and down (StepY). It does not depend on the image size, so a
+        single tile serves every resolution.
+        '''
+        WatermarkAsset.__init__(self, Sprite, Mask, SourceStamp)
+        self.StepX = StepX
+        self.StepY = StepY
+
+class PatternAsset():
+    def __init__(
+            self,
+            Tile,
+            Size
+            ):
+        '''
+        A PatternTile repeated over an image of Size, in rows staggered by half a step so
+        the repeats run diagonally. Nothing is drawn until Composite, which pastes only the
+        repeats landing on its target, so banded and regional compositing never hold more
+        than their band or region. Mask is the mask of one repeat, MaskPlacements gives
+        them across the image.
+        '''
+        self.Tile = Tile
+        self.Sprite = Tile.Sprite
+        self.Mask = Tile.Mask
+        self.Width,self.Height = Size
+        self.SourceStamp = Tile.SourceStamp
+
+    def _Positions(
+            self,
+            TargetSize,
+            OriginX,
+            OriginY
+            ):
+        '''
+        Target coordinates of the repeats overlapping a target of TargetSize, with the
+        pattern's top left at OriginX,OriginY on it.
+        '''
+        Tile = self.Tile
+        Bottom = min(self.Height,TargetSize[1] - OriginY)
+        for Row in range(max(0,(-OriginY - Tile.Height)//Tile.StepY + 1),-(-Bottom//Tile.StepY)):
+            Offset = -(Tile.StepX//2)*(Row % 2)
+            Right = min(self.Width,TargetSize[0] - OriginX) - Offset
+            for Column in range(max(0,(-OriginX - Tile.Width - Offset)//Tile.StepX + 1),-(-Right//Tile.StepX)):
+                yield OriginX + Offset + Column*Tile.StepX,OriginY + Row*Tile.StepY
+
+    def Composite(
+            self,
+            Target,
+            DrawX,
+            DrawY
+            ):
+        if self.Mask is None:
+            return Target
+        OriginX,OriginY = WatermarkCompositor.PastePosition(DrawX,DrawY)
+        for X,Y in self._Positions(Target.size,OriginX,OriginY):
+            WatermarkCompositor.CompositeMark(Target,self.Sprite,self.Sprite,X,Y)
+        return Target
+
+    def MaskPlacements(
+            self,
+            DrawX,
+            DrawY
+            ):
+        if self.Mask is None:
+            return []
+        OriginX,OriginY = WatermarkCompositor.PastePosition(DrawX,DrawY)
+        return [(self.Mask,X,Y) for X,Y in self._Positions((self.Width,self.Height),OriginX,OriginY)]
+
+    def ByteSize(self):
+        return self.Tile.ByteSize()
+
+def PreparePatternTile(
+        Tile,
+        Angle = DEFAULT_PATTERN_ANGLE,
+        Spacing = DEFAULT_PATTERN_SPACING,
+        Opacity = DEFAULT_PATTERN_OPACITY,
+        Colour = None
+        ):
+    '''
+    Turn a prepared tile asset into one repeat of a pattern. The tile is tinted with Colour
+    when given, its alpha scaled by Opacity and rotated by Angle once.
+    '''
+    if Colour is not None:
+        Sprite = Image.new("RGBA",Tile.Sprite.size,color=tuple(Colour[:3]) + (0,))
+        Sprite.putalpha(Tile.Sprite.getchannel("A"))
+    else:
+        Sprite = Tile.Sprite.copy()
+    Sprite.putalpha(Sprite.getchannel("A").point(lambda Value: int(Value*Opacity + 0.5)))
+    Fill = tuple(Colour[:3]) + (0,) if Colour is not None else (0,0,0,0)
+    Sprite = Sprite.rotate(Angle,resample=Image.BICUBIC,expand=True,fillcolor=Fill)
+    Mask = None
+    if Tile.Mask is not None:
+        Mask = Tile.Mask.rotate(Angle,resample=Image.NEAREST,expand=True)
+    StepX = Sprite.width + max(int(Spacing[0]),0)
+    StepY = Sprite.height + max(int(Spacing[1]),0)
+    return PatternTile(Sprite, Mask, StepX, StepY, Tile.SourceStamp)
+
+class WatermarkAssetCache():
+    def __init__(
+            self,
+            MaxBytes = DEFAULT_CACHE_BYTES
+            ):
+        '''
+        Least recently used cache of prepared assets, bounded by the bytes held in
+        sprites and masks. An asset over the whole budget on its own is handed back
+        without being stored.
+        '''
+        self.MaxBytes = MaxBytes
+        self.Entries = OrderedDict()
+        self.CurrentBytes = 0
+        self.Hits = 0
+        self.Misses = 0
+        self.Evictions = 0
+        self.Lock = threading.RLock()
+
+    def _Store(
+            self,
+            Key,
+            Asset
+            ):
+        if Key in self.Entries:
+            self.CurrentBytes -= self.Entries.pop(Key).ByteSize()
+        if Asset.ByteSize() > self.MaxBytes:
+            return
+        self.Entries[Key] = Asset
+        self.CurrentBytes += Asset.ByteSize()
+        while self.CurrentBytes > self.MaxBytes:
+            _,Evicted = self.Entries.popitem(last=False)
+            self.CurrentBytes -= Evicted.ByteSize()
+            self.Evictions += 1
+
+    def _Get(
+            self,
+            Key,
+            SourcePath,
+            Prepare
+            ):
+        '''
+        Return the cached asset for Key while SourcePath is unchanged, otherwise Prepare it.
+        '''
+        with self.Lock:
+            Asset = self.Entries.get(Key)
+            if Asset is not None and Asset.SourceStamp == _SourceStamp(SourcePath):
+                self.Entries.move_to_end(Key)
+                self.Hits += 1
+                return Asset
+            self.Misses += 1
+            Asset = Prepare()
+            self._Store(Key, Asset)
+            return Asset
+
+    def GetImageAsset(
+            self,
+            Path,
+            Scale = 1,
+            Background = "Transparent"
+            ):
+        '''
+        Return the prepared asset for (Path, Scale, Background), preparing it on a miss.
+        '''
+        Key = ("Image", os.path.abspath(Path), Scale, Background)
+        return self._Get(Key, Path, lambda: PrepareImageAsset(Path, Scale, Background))
+
+    def GetPyramid(
+            self,
+            Path
+            ):
+        '''
+        Return the resampling pyramid for a watermark file, built once per run.
+        '''
+        Key = ("Pyramid", os.path.abspath(Path))
+        return self._Get(Key, Path, lambda: PreparePyramid(Path))
+
+    def GetSizedImageAsset(
+            self,
+            Path,
+            Size,
+            Background = "Transparent"
+            ):
+        '''
+        Return the asset for a watermark at an exact pixel Size, resampled from the nearest
+        pyramid level. Inputs sharing a resolution share the asset.
+        '''
+        Size = tuple(Size)
+        Key = ("ImageSized", os.path.abspath(Path), Size, Background)
+        def Prepare():
+            Pyramid = self.GetPyramid(Path)
+            return _ThresholdAsset(Pyramid.Resample(Size), Background, Pyramid.SourceStamp)
+        return self._Get(Key, Path, Prepare)
+
+    def GetTextAsset(
+            self,
+            FontFile,
+            Size,
+            Text,
+            Colour = (255,255,255)
+            ):
+        '''
+        Return the rasterised sprite for (FontFile, Size, Text, Colour), rendering it on a miss.
+        '''
+        Colour = tuple(Colour)
+        Key = ("Text", os.path.abspath(FontFile), Size, Text, Colour)
+        return self._Get(Key, FontFile, lambda: PrepareTextAsset(FontFile, Size, Text, Colour))
+
+    def GetPatternAsset(
+            self,
+            Tile,
+            SourcePath,
+            Size,
+            ConfigKey,
+            Angle = DEFAULT_PATTERN_ANGLE,
+            Spacing = DEFAULT_PATTERN_SPACING,
+            Opacity = DEFAULT_PATTERN_OPACITY,
+            Colour = None
+            ):
+        '''
+        Return the pattern repeating Tile over an image of Size. Only the rotated repeat is
+        cached, once for the configuration ConfigKey whatever the resolution. SourcePath is
+        the tile's font or image.
+        '''
+        Key = ("Pattern", ConfigKey)
+        Repeat = self._Get(Key, SourcePath, lambda: PreparePatternTile(Tile, Angle, Spacing, Opacity, Colour))
+        return PatternAsset(Repeat, tuple(Size))
+
+    def Export(self):
+        '''
+        Snapshot of the cached entries, used to seed caches in worker processes.
+        '''
+        with self.Lock:
+            return list(self.Entries.items())
+
+    def Seed(
+            self,
+            Entries
+            ):
+        with self.Lock:
+            for Key,Asset in Entries:
+                self._Store(Key, Asset)
+
+    def Clear(self):
+        with self.Lock:
+            self.Entries.clear()
+            self.CurrentBytes = 0
+
+    def Stats(self):
+        return {
+            "Entries":len(self.Entries),
+            "Bytes":self.CurrentBytes,
+            "Hits":self.Hits,
+            "Misses":self.Misses,
+            "Evictions":self.Evictions
+            }
+
+#One cache per process, shared by every WatermarkMarker constructed in it.
+SharedAssetCache = WatermarkAssetCache()
@@ -0,0 +1,424 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import io
+    import sys
+    import json
+    import time
+    import random
+    import argparse
+    import tempfile
+    import contextlib
+    import concurrent.futures
+except:
+    print("Failed to import Python Built in libraries")
+    sys.exit(1)
+try:
+    import resource
+except:
+    resource = None
+try:
+    from PIL import Image
+    from PIL import ImageDraw
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+    sys.exit(1)
+
+'''
+@date: 18/10/2026
+
+Reproducible benchmark for WatermarkMarker. A synthetic corpus is generated from a seed
+across a spread of resolutions and RGB / RGBA / L inputs, then watermarked with each of the
+benchmark cases (text and the logos in WaterMarks/). Reports images per second, per stage
+latency percentiles and peak RSS, and compares against a stored baseline:
+
+python WatermarkBenchmark.py --SaveBaseline      Record this machine's baseline.
+python WatermarkBenchmark.py                     Compare, exit code 1 on a regression.
+
+Baselines are machine specific, record one before making the change being measured. A
+missing baseline is also exit code 1, unless --AllowMissingBaseline is given. No baseline
+is checked in, Benchmarks/ is ignored by git. CI records its own on the runner that compares:
+
+git checkout <base> && python WatermarkBenchmark.py --SaveBaseline --Baseline base.json
+git checkout <head> && python WatermarkBenchmark.py --Baseline base.json
+'''
+
+ScriptDirectory = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ScriptDirectory)
+
+try:
+    import WatermarkMarker
+    import WatermarkAssets
+    import WatermarkRegion
+except:
+    print("Failed to import WaterMarker.")
+    sys.exit(1)
+
+WATERMARKS = os.path.join(os.path.split(ScriptDirectory)[0],"WaterMarks")
+DEFAULT_SEED = 1234
+DEFAULT_RESOLUTIONS = [(640,480),(1920,1080),(4032,3024)]
+DEFAULT_MODES = ["RGB","RGBA","L"]
+DEFAULT_PER_COMBINATION = 2
+DEFAULT_TOLERANCE = 0.15 #Fractional slow down allowed before it counts as a regression.
+MINIMUM_REGRESSION_SECONDS = 0.002 #Ignore stage changes smaller than timer noise.
+DEFAULT_BASELINE = os.path.join(ScriptDirectory,"Benchmarks","WatermarkBaseline.json")
+STAGES = [
+    "InterpretImage",
+    "CalculateGeometry",
+    "GenerateMark",
+    "Save"
+    ]
+PERCENTILES = [50,90,99]
+ALIGNMENT = {
+    "PadX":0,
+    "PadY":0,
+    "Vertical":"BOTTOM",
+    "Horizontal":"RIGHT"
+    }
+CASES = {
+    "Text":{
+        "MarkType":"Text",
+        "Alignment":ALIGNMENT,
+        "Size":120,
+        "Font":"gothamcondensed-book",
+        "FontFile":"GothamCondensed-Book.otf",
+        "Text":"MagniControlProjects",
+        "Stamp":True
+        },
+    "ImageBGIsBlack":{
+        "MarkType":"Image",
+        "Alignment":ALIGNMENT,
+        "Scale":0.4,
+        "Path":os.path.join(WATERMARKS,"MCP Logo_RGB_BGIsBlack.jpg"),
+        "Background":"Black"
+        },
+    "ImageBGIsWhite":{
+        "MarkType":"Image",
+        "Alignment":ALIGNMENT,
+        "Scale":0.4,
+        "Path":os.path.join(WATERMARKS,"MCP Logo_RGB_BGIsWhite.jpg"),
+        "Background":"White"
+        },
+    "ImageTransparent":{
+        "MarkType":"Image",
+        "Alignment":ALIGNMENT,
+        "Scale":0.4,
+        "Path":os.path.join(WATERMARKS,"MCP Logo_RGBA.png"),
+        "Background":"Transparent"
+        },
+    "ImageRelative":{
+        "MarkType":"Image",
+        "Alignment":ALIGNMENT,
+        "Scale":1,
+        "RelativeSize":0.2,
+        "Path":os.path.join(WATERMARKS,"MCP Logo_RGBA.png"),
+        "Background":"Transparent"
+        }
+    }
+
+def _RandomColour(
+        Generator,
+        Mode
+        ):
+    if Mode == "L":
+        return Generator.randrange(256)
+    Colour = tuple(Generator.randrange(256) for _ in range(3))
+    if Mode == "RGBA":
+        Colour += (Generator.randrange(64,256),)
+    return Colour
+
+def SyntheticImage(
+        Generator,
+        Size,
+        Mode
+        ):
+    '''
+    A gradient overlaid with random shapes, enough structure that JPEG encoding behaves
+    like it does on a photo rather than a flat colour.
+    '''
+    Gradient = Image.linear_gradient("L").resize(Size).rotate(Generator.randrange(360),expand=False)
+    if Mode == "L":
+        Synthetic = Gradient
+    else:
+        Synthetic = Image.merge("RGB",[Gradient,Gradient.transpose(Image.FLIP_LEFT_RIGHT),Gradient.transpose(Image.FLIP_TOP_BOTTOM)])
+        if Mode == "RGBA":
+            Synthetic.putalpha(Gradient.point(lambda Value: 128 + Value // 2))
+    Draw = ImageDraw.Draw(Synthetic)
+    for _ in range(24):
+        X0,Y0 = Generator.randrange(Size[0]),Generator.randrange(Size[1])
+        Box = [X0,Y0,X0 + Generator.randrange(1,Size[0]//3),Y0 + Generator.randrange(1,Size[1]//3)]
+        if Generator.random() < 0.5:
+            Draw.ellipse(Box,fill=_RandomColour(Generator,Mode))
+        else:
+            Draw.rectangle(Box,fill=_RandomColour(Generator,Mode))
+    return Synthetic
+
+def GenerateCorpus(
+        Folder,
+        Seed = DEFAULT_SEED,
+        Resolutions = DEFAULT_RESOLUTIONS,
+        Modes = DEFAULT_MODES,
+        PerCombination = DEFAULT_PER_COMBINATION
+        ):
+    '''
+    Write the corpus to Folder, RGB and L as JPEG and RGBA as PNG, and return the paths.
+    A folder already holding the corpus for the same specification is reused.
+    '''
+    Specification = {
+        "Seed":Seed,
+        "Resolutions":[list(Size) for Size in Resolutions],
+        "Modes":list(Modes),
+        "PerCombination":PerCombination
+        }
+    SpecificationPath = os.path.join(Folder,"corpus.json")
+    Paths = []
+    for Width,Height in Resolutions:
+        for Mode in Modes:
+            Extension = ".png" if Mode == "RGBA" else ".jpg"
+            for Index in range(PerCombination):
+                Paths.append(os.path.join(Folder,f"{Width}x{Height}_{Mode}_{Index}{Extension}"))
+    if os.path.isfile(SpecificationPath):
+        with open(SpecificationPath,"r") as r_file:
+            if json.loads(r_file.read()) == Specification and all(os.path.isfile(Path) for Path in Paths):
+                return Paths
+    os.makedirs(Folder,exist_ok=True)
+    Generator = random.Random(Seed)
+    Iterator = iter(Paths)
+    for Size in Resolutions:
+        for Mode in Modes:
+            for _ in range(PerCombination):
+                Path = next(Iterator)
+                Synthetic = SyntheticImage(Generator,tuple(Size),Mode)
+                if Path.endswith(".jpg"):
+                    Synthetic.save(Path,quality=90)
+                else:
+                    Synthetic.save(Path)
+    with open(SpecificationPath,"w") as o_file:
+        o_file.write(json.dumps(Specification))
+    return Paths
+
+def Percentile(
+        Values,
+        Percent
+        ):
+    '''
+    Nearest rank percentile.
+    '''
+    if not Values:
+        return 0.0
+    Ordered = sorted(Values)
+    Rank = max(1,-(-len(Ordered) * Percent // 100))
+    return Ordered[int(Rank) - 1]
+
+def PeakRSSMegabytes():
+    if resource is None:
+        return None
+    Peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return Peak / (1024 * 1024)
+    return Peak / 1024
+
+def _Timed(
+        Function,
+        Timings,
+        Stage
+        ):
+    def Wrapper(*args,**kwargs):
+        Start = time.perf_counter()
+        try:
+            return Function(*args,**kwargs)
+        finally:
+            Timings[Stage] = Timings.get(Stage,0.0) + time.perf_counter() - Start
+    return Wrapper
+
+def RunCase(
+        Configuration,
+        Inputs,
+        OutputFolder,
+        Warmup = 1,
+        EncoderConfiguration = None
+        ):
+    '''
+    Watermark every input with one configuration, timing each stage of
+    WatermarkMarker.run. GenerateMark is reported without the time spent saving.
+    '''
+    WatermarkAssets.SharedAssetCache.Clear()
+    Marker = WatermarkMarker.WatermarkMarker(Configuration,None,EncoderConfiguration=EncoderConfiguration)
+    Timings = {}
+    for Stage in STAGES[:-1]:
+        setattr(Marker,Stage,_Timed(getattr(Marker,Stage),Timings,Stage))
+    Marker.Encoder.Save = _Timed(Marker.Encoder.Save,Timings,"Save")
+    Samples = {Stage:[] for Stage in STAGES}
+    Samples["Total"] = []
+    Quiet = io.StringIO()
+    for Index,Path in enumerate(Inputs[:Warmup] + Inputs):
+        Timings.clear()
+        Marker.ChangeInputImage(Path)
+        Start = time.perf_counter()
+        with contextlib.redirect_stdout(Quiet):
+            Marker.run(os.path.join(OutputFolder,os.path.basename(Path)))
+        Total = time.perf_counter() - Start
+        Quiet.seek(0)
+        Quiet.truncate()
+        if Index < Warmup:
+            continue
+        Timings["GenerateMark"] = Timings.get("GenerateMark",0.0) - Timings.get("Save",0.0)
+        for Stage in STAGES:
+            Samples[Stage].append(Timings.get(Stage,0.0))
+        Samples["Total"].append(Total)
+    Elapsed = sum(Samples["Total"])
+    return {
+        "Images":len(Inputs),
+        "Seconds":Elapsed,
+        "ImagesPerSecond":len(Inputs) / Elapsed if Elapsed else 0.0,
+        "Stages":{
+            Stage:{f"p{Percent}":Percentile(Values,Percent) for Percent in PERCENTILES}
+            for Stage,Values in Samples.items()
+            }
+        }
+
+def RunBenchmark(
+        CorpusFolder,
+        Seed = DEFAULT_SEED,
+        Cases = None,
+        PerCombination = DEFAULT_PER_COMBINATION,
+        Warmup = 1,
+        EncoderConfiguration = None
+        ):
+    if Cases is None:
+        Cases = list(CASES)
+    #Generated in a child process so it does not count towards the peak RSS.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as Generator:
+        Inputs = Generator.submit(GenerateCorpus,CorpusFolder,Seed,PerCombination=PerCombination).result()
+    Report = {
+        "Seed":Seed,
+        "Images":len(Inputs),
+        "Python":sys.version.split()[0],
+        "Cases":{}
+        }
+    with tempfile.TemporaryDirectory() as OutputFolder:
+        for Case in Cases:
+            Report["Cases"][Case] = RunCase(CASES[Case],Inputs,OutputFolder,Warmup,EncoderConfiguration)
+            PrintCase(Case,Report["Cases"][Case])
+    Report["PeakRSSMB"] = PeakRSSMegabytes()
+    if Report["PeakRSSMB"] is not None:
+        print(f"Peak RSS {Report['PeakRSSMB']:.1f}MB")
+    return Report
+
+def PrintCase(
+        Case,
+        Result
+        ):
+    print(f"{Case}: {Result['Images']} images, {Result['ImagesPerSecond']:.2f} images/sec")
+    for Stage,Values in Result["Stages"].items():
+        print("    %-18s"%Stage + "  ".join(f"{Name} {Value*1000:8.2f}ms" for Name,Value in Values.items()))
+    return
+
+def CompareReports(
+        Baseline,
+        Current,
+        Tolerance = DEFAULT_TOLERANCE
+        ):
+    '''
+    Return a description of every regression beyond Tolerance: throughput per case, the
+    median of each stage and peak RSS. Cases missing from either report are not compared.
+    '''
+    Regressions = []
+    if Baseline.get("Seed") != Current.get("Seed") or Baseline.get("Images") != Current.get("Images"):
+        Regressions.append("Corpus differs from the baseline's, re-record it with --SaveBaseline.")
+        return Regressions
+    for Case,Result in Current["Cases"].items():
+        Reference = Baseline["Cases"].get(Case)
+        if Reference is None:
+            continue
+        if Result["ImagesPerSecond"] < Reference["ImagesPerSecond"] * (1 - Tolerance):
+            Regressions.append(
+                f"{Case}: {Result['ImagesPerSecond']:.2f} images/sec against {Reference['ImagesPerSecond']:.2f} in the baseline"
+                )
+        for Stage,Values in Result["Stages"].items():
+            Was = Reference["Stages"].get(Stage,{}).get("p50")
+            Now = Values["p50"]
+            if Was is not None and Now > Was * (1 + Tolerance) and Now - Was > MINIMUM_REGRESSION_SECONDS:
+                Regressions.append(f"{Case} {Stage}: p50 {Now*1000:.2f}ms against {Was*1000:.2f}ms in the baseline")
+    if Baseline.get("PeakRSSMB") and Current.get("PeakRSSMB"):
+        if Current["PeakRSSMB"] > Baseline["PeakRSSMB"] * (1 + Tolerance):
+            Regressions.append(f"Peak RSS {Current['PeakRSSMB']:.1f}MB against {Baseline['PeakRSSMB']:.1f}MB in the baseline")
+    return Regressions
+
+def main(args):
+    #Fonts are looked up relative to the working directory.
+    os.chdir(ScriptDirectory)
+    CorpusFolder = args.Corpus or os.path.join(tempfile.gettempdir(),f"WatermarkBenchmark_{args.Seed}")
+    EncoderConfiguration = None
+    if args.Encoder:
+        with open(args.Encoder,"r") as r_file:
+            EncoderConfiguration = json.loads(r_file.read()).get("Encoder")
+        WatermarkRegion.WarnIfUnavailable(EncoderConfiguration)
+    Report = RunBenchmark(
+        CorpusFolder,
+        args.Seed,
+        args.Cases,
+        args.PerCombination,
+        args.Warmup,
+        EncoderConfiguration
+        )
+    if args.Output:
+        with open(args.Output,"w") as o_file:
+            o_file.write(json.dumps(Report,indent=4))
+    if args.SaveBaseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.Baseline)),exist_ok=True)
+        with open(args.Baseline,"w") as o_file:
+            o_file.write(json.dumps(Report,indent=4))
+        print(f"Baseline written to {args.Baseline}")
+        return 0
+    if not os.path.isfile(args.Baseline):
+        print(f"No baseline at {args.Baseline}, run with --SaveBaseline to record one.")
+        return 0 if args.AllowMissingBaseline else 1
+    with open(args.Baseline,"r") as r_file:
+        Baseline = json.loads(r_file.read())
+    Regressions = CompareReports(Baseline,Report,args.Tolerance)
+    for Regression in Regressions:
+        print(f"REGRESSION: {Regression}")
+    if Regressions:
+        print(f"{len(Regressions)} regressions against {args.Baseline}")
+        return 1
+    print("No regressions against the baseline.")
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark WatermarkMarker against a synthetic corpus."
+        )
+    parser.add_argument('--Seed', type = int, default = DEFAULT_SEED, help = 'Seed for the synthetic corpus.')
+    parser.add_argument('--Corpus', default = None, help = 'Folder to generate the corpus in, defaults to the temp folder.')
+    parser.add_argument('--PerCombination', type = int, default = DEFAULT_PER_COMBINATION, help = 'Images per resolution and mode.')
+    parser.add_argument('--Cases', nargs = '+', choices = list(CASES), default = None, help = 'Benchmark cases to run, all by default.')
+    parser.add_argument('--Warmup', type = int, default = 1, help = 'Untimed images run before each case.')
+    parser.add_argument('--Encoder', default = None, help = 'Configuration file whose "Encoder" section is used for saving.')
+    parser.add_argument('--Baseline', default = DEFAULT_BASELINE, help = 'Baseline report to compare against or save.')
+    parser.add_argument('--SaveBaseline', action = 'store_true', help = 'Record this run as the baseline.')
+    parser.add_argument('--AllowMissingBaseline', action = 'store_true', help = 'Exit 0 rather than 1 when there is no baseline to compare against.')
+    parser.add_argument('--Tolerance', type = float, default = DEFAULT_TOLERANCE, help = 'Fractional slow down allowed before failing.')
+    parser.add_argument('--Output', default = None, help = 'Also write this run\'s report as JSON.')
+    
+    args = parser.parse_args()
+    sys.exit(main(args))
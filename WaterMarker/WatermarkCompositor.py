@@ -0,0 +1,127 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    from PIL import Image
+    from PIL import ImageChops
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+
+'''
+@date: 18/10/2026
+
+Bulk compositing of image watermarks. The threshold for each background type is applied
+as a lookup table over whole bands rather than pixel by pixel, the resulting 0/255 mask
+is then used for a single paste into the output and a single fill into the mask image.
+'''
+
+#Channel values either side of which a watermark pixel is treated as background.
+THRESHOLD_BLACK = 35 #Any channel above this is drawn, allows for aliasing.
+THRESHOLD_WHITE = 220 #Any channel below this is drawn, allows for aliasing.
+THRESHOLD_ALPHA = 20 #Alpha above this is drawn.
+
+def _BandAbove(
+        Band,
+        Threshold
+        ):
+    return Band.point(lambda Value: 255 if Value > Threshold else 0)
+
+def _BandBelow(
+        Band,
+        Threshold
+        ):
+    return Band.point(lambda Value: 255 if Value < Threshold else 0)
+
+def _AnyBand(Bands):
+    '''
+    Combine per band masks so a pixel is set when any band is set.
+    '''
+    Mask = Bands[0]
+    for Band in Bands[1:]:
+        Mask = ImageChops.lighter(Mask, Band)
+    return Mask
+
+def BuildThresholdMask(
+        MarkImage,
+        Background = "Transparent"
+        ):
+    '''
+    Split a (pre scaled) watermark image into the colour sprite to paste and an "L" mode
+    mask where 255 marks the watermark pixels to draw.
+
+    - RGB with a "Black" background draws pixels where any channel is above THRESHOLD_BLACK.
+    - RGB with a "White" background draws pixels where any channel is below THRESHOLD_WHITE.
+    - Anything else is treated as transparent, drawing where alpha is above THRESHOLD_ALPHA.
+
+    Returns (Sprite, Mask), Mask is None when nothing would be drawn (RGB with an
+    unrecognised background).
+    '''
+    if MarkImage.mode == "RGB":
+        if Background == "Black":
+            Mask = _AnyBand([_BandAbove(Band, THRESHOLD_BLACK) for Band in MarkImage.split()])
+        elif Background == "White":
+            Mask = _AnyBand([_BandBelow(Band, THRESHOLD_WHITE) for Band in MarkImage.split()])
+        else:
+            return MarkImage, None
+        return MarkImage, Mask
+    if MarkImage.mode != "RGBA":
+        MarkImage = MarkImage.convert("RGBA")
+    Mask = _BandAbove(MarkImage.getchannel("A"), THRESHOLD_ALPHA)
+    return MarkImage.convert("RGB"), Mask
+
+def PastePosition(
+        DrawX,
+        DrawY
+        ):
+    '''
+    Geometry can land on half pixels, truncate the same way ImageDraw.point does.
+    '''
+    return int(DrawX), int(DrawY)
+
+def CompositeMark(
+        Target,
+        Sprite,
+        Mask,
+        DrawX,
+        DrawY
+        ):
+    '''
+    Paste the sprite into the target wherever the mask is set, in a single call.
+    '''
+    if Mask is None:
+        return Target
+    Target.paste(Sprite, PastePosition(DrawX, DrawY), Mask)
+    return Target
+
+def BurnMask(
+        MaskImage,
+        Mask,
+        DrawX = 0,
+        DrawY = 0,
+        Fill = 0
+        ):
+    '''
+    Fill the mask image with the given palette index wherever the watermark mask is set.
+    '''
+    if Mask is None:
+        return MaskImage
+    X, Y = PastePosition(DrawX, DrawY)
+    MaskImage.paste(Fill, (X, Y, X + Mask.width, Y + Mask.height), Mask)
+    return MaskImage
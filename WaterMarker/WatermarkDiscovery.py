@@ -0,0 +1,207 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import fnmatch
+    import queue
+    import threading
+except:
+    print("Failed to import Python Built in libraries")
+
+'''
+@date: 18/10/2026
+
+Streaming discovery of input images. Folders are walked with scandir and matching files
+are yielded one at a time, optionally through a bounded queue filled by a background
+thread, so memory stays flat however many images the folder holds.
+'''
+
+DEFAULT_EXTENSIONS = [".jpg",".jpeg"]
+DEFAULT_QUEUE_DEPTH = 1024
+
+def NormaliseExtensions(Extensions = None):
+    '''
+    Accept a single extension or a list, with or without the leading dot, in any case.
+    '''
+    if Extensions is None:
+        Extensions = DEFAULT_EXTENSIONS
+    if isinstance(Extensions,str):
+        Extensions = [Extensions]
+    Normalised = set()
+    for Extension in Extensions:
+        Extension = Extension.strip().lower()
+        if not Extension:
+            continue
+        if not Extension.startswith("."):
+            Extension = "." + Extension
+        Normalised.add(Extension)
+    return frozenset(Normalised)
+
+def _NormalisePatterns(Patterns):
+    if not Patterns:
+        return []
+    if isinstance(Patterns,str):
+        Patterns = [Patterns]
+    return [Pattern.replace("\\","/").lower() for Pattern in Patterns]
+
+def _Matches(
+        RelativePath,
+        Patterns
+        ):
+    '''
+    Glob match case insensitively on the "/" separated path relative to the root,
+    a pattern without a "/" is also tried against the name alone.
+    '''
+    RelativePath = RelativePath.replace("\\","/").lower()
+    Name = RelativePath.rsplit("/",1)[-1]
+    for Pattern in Patterns:
+        if fnmatch.fnmatchcase(RelativePath,Pattern):
+            return True
+        if "/" not in Pattern and fnmatch.fnmatchcase(Name,Pattern):
+            return True
+    return False
+
+class InputFilter():
+    def __init__(
+            self,
+            Extensions = None,
+            Include = None,
+            Exclude = None
+            ):
+        '''
+        Extension set and Include/Exclude globs, shared by folder walks and watchers.
+        Paths are relative to the watch folder.
+        '''
+        self.Extensions = NormaliseExtensions(Extensions)
+        self.Include = _NormalisePatterns(Include)
+        self.Exclude = _NormalisePatterns(Exclude)
+
+    def AcceptsDirectory(
+            self,
+            RelativePath
+            ):
+        return not (self.Exclude and _Matches(RelativePath,self.Exclude))
+
+    def AcceptsFile(
+            self,
+            RelativePath
+            ):
+        if os.path.splitext(RelativePath)[1].lower() not in self.Extensions:
+            return False
+        if self.Exclude and _Matches(RelativePath,self.Exclude):
+            return False
+        if self.Include and not _Matches(RelativePath,self.Include):
+            return False
+        return True
+
+def IterateImages(
+        Root,
+        Extensions = None,
+        Include = None,
+        Exclude = None,
+        Filter = None
+        ):
+    '''
+    Yield the absolute path of every file under Root with a matching extension.
+    Include globs, when given, must match the relative path. Exclude globs drop files and
+    prune whole directories. Unreadable directories are reported and skipped.
+    '''
+    if Filter is None:
+        Filter = InputFilter(Extensions,Include,Exclude)
+    Stack = [Root]
+    while Stack:
+        Directory = Stack.pop()
+        try:
+            with os.scandir(Directory) as Entries:
+                for Entry in Entries:
+                    RelativePath = os.path.relpath(Entry.path,Root)
+                    if Entry.is_dir(follow_symlinks=False):
+                        if Filter.AcceptsDirectory(RelativePath):
+                            Stack.append(Entry.path)
+                        continue
+                    if Filter.AcceptsFile(RelativePath) and Entry.is_file():
+                        yield Entry.path
+        except OSError as Error:
+            print(f"Unable to scan {Directory}: {Error}")
+    return
+
+class BoundedFeed():
+    def __init__(
+            self,
+            Items,
+            MaxSize = DEFAULT_QUEUE_DEPTH
+            ):
+        '''
+        Pull Items on a background thread into a queue of at most MaxSize entries and
+        hand them out by iteration, so discovery overlaps processing without running ahead.
+        '''
+        self.Items = Items
+        self.Queue = queue.Queue(maxsize=MaxSize)
+        self.Stop = threading.Event()
+        self.Error = None
+        self.Fed = 0
+        self.MaxDepth = 0
+        self.Starved = 0 #Times the consumer found the queue empty and had to wait.
+        self.Finished = object()
+        self.Thread = threading.Thread(target=self._Produce,daemon=True)
+        self.Thread.start()
+
+    def _Put(
+            self,
+            Item
+            ):
+        while not self.Stop.is_set():
+            try:
+                self.Queue.put(Item,timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _Produce(self):
+        try:
+            for Item in self.Items:
+                if not self._Put(Item):
+                    return
+                self.Fed += 1
+        except BaseException as Error:
+            self.Error = Error
+        finally:
+            self._Put(self.Finished)
+
+    def __iter__(self):
+        try:
+            while True:
+                Depth = self.Queue.qsize()
+                if Depth == 0:
+                    self.Starved += 1
+                self.MaxDepth = max(self.MaxDepth,Depth)
+                Item = self.Queue.get()
+                if Item is self.Finished:
+                    break
+                yield Item
+        finally:
+            self.Stop.set()
+        if self.Error is not None:
+            raise self.Error
+
+    def Depth(self):
+        return self.Queue.qsize()
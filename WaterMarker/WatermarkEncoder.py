@@ -0,0 +1,193 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import io
+    import os
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import Image
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+
+'''
+@date: 18/10/2026
+
+Output encoding for WaterMarker, driven by the optional "Encoder" section of the
+configuration file:
+
+"Encoder":{
+    "Preset":"default",       default, fast (no optimise passes) or small.
+    "Format":"source",        source keeps the input format, or JPEG / WEBP.
+    "Quality":"keep",         1-100, or keep to reuse the source JPEG's tables.
+    "Subsampling":"keep",     keep, 4:4:4, 4:2:2 or 4:2:0.
+    "Optimize":true,
+    "Progressive":false,
+    "KeepICC":true,           Pass the source ICC profile through.
+    "KeepEXIF":true,          Pass the source EXIF block through.
+    "WebPMethod":4,           0 (fastest) to 6 (smallest).
+    "Lossless":false,
+    "RegionOnly":false        Only re-encode the MCUs under the watermark, see WatermarkRegion.
+}
+
+Without the section images are saved with Pillow's defaults, as they always were. With it,
+ICC and EXIF are passed through unless turned off. Explicit keys override the preset.
+'''
+
+PRESETS = {
+    "default":{},
+    "fast":{
+        "Optimize":False,
+        "Progressive":False,
+        "WebPMethod":0
+        },
+    "small":{
+        "Optimize":True,
+        "Progressive":True,
+        "WebPMethod":6
+        }
+    }
+FORMATS = [
+    "SOURCE",
+    "JPEG",
+    "WEBP"
+    ]
+JPEG_EXTENSIONS = [".jpg",".jpeg",".jpe",".jfif"]
+
+class OutputEncoder():
+    def __init__(
+            self,
+            Configuration = None
+            ):
+        if Configuration is None:
+            Configuration = {}
+        Preset = Configuration.get("Preset","default")
+        if Preset not in PRESETS:
+            raise ValueError(f"Encoder Preset {Preset} not in options {list(PRESETS)}")
+        self.Settings = {"KeepICC":True,"KeepEXIF":True} if Configuration else {}
+        self.Settings.update(PRESETS[Preset])
+        self.Settings.update({Key:Value for Key,Value in Configuration.items() if Key != "Preset"})
+        self.Format = str(self.Settings.get("Format","source")).upper()
+        if self.Format not in FORMATS:
+            raise ValueError(f"Encoder Format {self.Format} not in options {FORMATS}")
+
+    def Extension(
+            self,
+            SourceExtension
+            ):
+        '''
+        Extension of the output file given the input's.
+        '''
+        if self.Format == "WEBP":
+            return ".webp"
+        if self.Format == "JPEG" and SourceExtension.lower() not in JPEG_EXTENSIONS:
+            return ".jpg"
+        return SourceExtension
+
+    def _Metadata(
+            self,
+            Source,
+            Arguments
+            ):
+        if self.Settings.get("KeepICC",False) and Source.info.get("icc_profile"):
+            Arguments["icc_profile"] = Source.info["icc_profile"]
+        if self.Settings.get("KeepEXIF",False) and Source.info.get("exif"):
+            Arguments["exif"] = Source.info["exif"]
+        return Arguments
+
+    def SaveArguments(
+            self,
+            Source,
+            OutputPath
+            ):
+        '''
+        Keyword arguments for Image.save. "keep" settings are dropped when the image did
+        not come from a JPEG, as there is nothing to keep.
+        '''
+        Arguments = {}
+        if self.Format == "WEBP":
+            Arguments["format"] = "WEBP"
+            Quality = self.Settings.get("Quality")
+            if isinstance(Quality,int):
+                Arguments["quality"] = Quality
+            if "WebPMethod" in self.Settings:
+                Arguments["method"] = self.Settings["WebPMethod"]
+            if "Lossless" in self.Settings:
+                Arguments["lossless"] = self.Settings["Lossless"]
+            return self._Metadata(Source,Arguments)
+        if self.Format == "SOURCE" and os.path.splitext(OutputPath)[1].lower() not in JPEG_EXTENSIONS:
+            return self._Metadata(Source,Arguments)
+        Arguments["format"] = "JPEG"
+        FromJpeg = Source.format == "JPEG"
+        for Key,Argument in [("Quality","quality"),("Subsampling","subsampling")]:
+            Value = self.Settings.get(Key)
+            if Value is None or (Value == "keep" and not FromJpeg):
+                continue
+            Arguments[Argument] = Value
+        for Key,Argument in [("Optimize","optimize"),("Progressive","progressive")]:
+            if Key in self.Settings:
+                Arguments[Argument] = self.Settings[Key]
+        return self._Metadata(Source,Arguments)
+
+    def RegionCopy(
+            self,
+            Source,
+            OutputPath
+            ):
+        '''
+        The jpegtran -copy option when region only recompression can honour these settings,
+        otherwise None. It needs a JPEG in and out with the source's tables and subsampling.
+        '''
+        if not self.Settings.get("RegionOnly",False) or Source.format != "JPEG":
+            return None
+        if self.Format == "WEBP" or os.path.splitext(OutputPath)[1].lower() not in JPEG_EXTENSIONS:
+            return None
+        if self.Settings.get("Quality","keep") != "keep" or self.Settings.get("Subsampling","keep") != "keep":
+            return None
+        KeepICC,KeepEXIF = self.Settings.get("KeepICC",False),self.Settings.get("KeepEXIF",False)
+        if KeepICC and KeepEXIF:
+            return "all"
+        if not KeepICC and not KeepEXIF:
+            return "none"
+        return None
+
+    def Save(
+            self,
+            Source,
+            OutputPath
+            ):
+        Source.save(OutputPath,**self.SaveArguments(Source,OutputPath))
+        return OutputPath
+
+    def Encode(
+            self,
+            Source,
+            OutputPath
+            ):
+        '''
+        Encode as Save would for OutputPath, returning the bytes instead of writing them.
+        '''
+        Arguments = self.SaveArguments(Source,OutputPath)
+        if "format" not in Arguments:
+            Arguments["format"] = Image.registered_extensions()[os.path.splitext(OutputPath)[1].lower()]
+        Buffer = io.BytesIO()
+        Source.save(Buffer,**Arguments)
+        return Buffer.getvalue()
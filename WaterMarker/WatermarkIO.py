@@ -0,0 +1,142 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import io
+    import os
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import Image
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+
+'''
+@date: 18/10/2026
+
+Input handling for WatermarkMarker. Each input is opened once, the header is probed and
+the pixels decoded through the same handle, with counters kept per stage so a run can
+show that no file is read twice.
+'''
+
+COUNTER_KEYS = [
+    "Opens",
+    "ProbeBytes",
+    "Decodes",
+    "DecodeBytes"
+    ]
+
+def NewCounters():
+    return dict.fromkeys(COUNTER_KEYS,0)
+
+def AddCounters(
+        Total,
+        Counters
+        ):
+    for Key in COUNTER_KEYS:
+        Total[Key] += Counters.get(Key,0)
+    return Total
+
+class CountingReader():
+    def __init__(
+            self,
+            Raw
+            ):
+        '''
+        Wrap a binary file object and count the bytes read through it.
+        Deliberately exposes no name or fileno so Pillow cannot reopen or memory map
+        the file behind our back.
+        '''
+        self.Raw = Raw
+        self.BytesRead = 0
+
+    def read(
+            self,
+            Size = -1
+            ):
+        Data = self.Raw.read(Size)
+        self.BytesRead += len(Data)
+        return Data
+
+    def readline(
+            self,
+            Size = -1
+            ):
+        Data = self.Raw.readline(Size)
+        self.BytesRead += len(Data)
+        return Data
+
+    def seek(
+            self,
+            Offset,
+            Whence = os.SEEK_SET
+            ):
+        return self.Raw.seek(Offset,Whence)
+
+    def tell(self):
+        return self.Raw.tell()
+
+    def close(self):
+        self.Raw.close()
+
+class ImageSource():
+    def __init__(
+            self,
+            Path,
+            Data = None
+            ):
+        '''
+        A single open input image. Probe reads the header, Decode loads the pixels from
+        the same handle and returns the image to be composited in place and encoded.
+        Data is the file's bytes when already read ahead, otherwise Path is opened.
+        '''
+        self.Path = Path
+        self.Data = Data
+        self.Counters = NewCounters()
+        self.Reader = None
+        self.Image = None
+
+    def Probe(self):
+        if self.Image is None:
+            if self.Data is not None:
+                self.Reader = CountingReader(io.BytesIO(self.Data))
+            else:
+                self.Reader = CountingReader(open(self.Path,"rb"))
+            self.Counters["Opens"] += 1
+            self.Image = Image.open(self.Reader)
+            self.Counters["ProbeBytes"] = self.Reader.BytesRead
+        return self.Image
+
+    def Decode(self):
+        Decoded = self.Probe()
+        if Decoded.tile:
+            Decoded.load()
+            self.Counters["Decodes"] += 1
+            self.Counters["DecodeBytes"] = self.Reader.BytesRead - self.Counters["ProbeBytes"]
+        return Decoded
+
+    def Close(self):
+        if self.Image is not None:
+            self.Image.close()
+        if self.Reader is not None:
+            self.Reader.close()
+        self.Image = None
+        self.Reader = None
+        self.Data = None
@@ -0,0 +1,350 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import json
+    import hashlib
+    import tempfile
+    import threading
+    import traceback
+except:
+    print("Failed to import Python Built in libraries")
+
+'''
+@date: 18/10/2026
+
+Persistent record of what has already been watermarked. Each processed input is stored
+with its size, modification time, optional content hash and header data, along with a
+hash of the watermark configuration. A re-run only processes new or changed inputs, or
+everything when the configuration has changed. Filter may run on the read ahead thread
+while results are recorded on the main one, so every change and save takes the lock.
+
+Changes during a run are appended to a journal beside the manifest as JSON lines, one
+per changed entry, so keeping progress costs the same however large the manifest grows.
+Save compacts the journal into the manifest once, at the end of the run.
+'''
+
+MANIFEST_VERSION = 1
+DEFAULT_SAVE_INTERVAL = 100 #Records between journal appends, so an interrupted run keeps its progress.
+JOURNAL_SUFFIX = ".journal"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def ConfigurationHash(
+        WatermarkConfiguration,
+        EncoderConfiguration = None
+        ):
+    '''
+    Hash the watermark (or list of watermark layers) and encoder configuration together
+    with the size and mtime of any watermark file they point at, so replacing the logo also
+    counts as a configuration change.
+    '''
+    Hasher = hashlib.sha256()
+    Hasher.update(json.dumps(WatermarkConfiguration,sort_keys=True).encode("utf-8"))
+    if EncoderConfiguration:
+        Hasher.update(json.dumps(EncoderConfiguration,sort_keys=True).encode("utf-8"))
+    Layers = WatermarkConfiguration if isinstance(WatermarkConfiguration,list) else [WatermarkConfiguration]
+    for Layer in Layers:
+        Path = Layer.get("Path") if isinstance(Layer,dict) else None
+        if Path:
+            try:
+                Stat = os.stat(Path)
+                Hasher.update(f"{Stat.st_size}:{Stat.st_mtime_ns}".encode("utf-8"))
+            except OSError:
+                pass
+    return Hasher.hexdigest()
+
+def ContentHash(Path):
+    Hasher = hashlib.sha1()
+    with open(Path,"rb") as r_file:
+        for Block in iter(lambda: r_file.read(HASH_BLOCK_SIZE),b""):
+            Hasher.update(Block)
+    return Hasher.hexdigest()
+
+def DefaultManifestPath(
+        OutputFolder,
+        Shard = None
+        ):
+    '''
+    The manifest sits next to the output folder rather than inside it. Each shard of a
+    sharded run keeps its own, Shard being its name.
+    '''
+    if Shard:
+        return os.path.normpath(OutputFolder) + f".{Shard}.manifest.json"
+    return os.path.normpath(OutputFolder) + ".manifest.json"
+
+class WatermarkManifest():
+    def __init__(
+            self,
+            ManifestPath,
+            Root,
+            ConfigHash,
+            HashContents = False,
+            SaveInterval = DEFAULT_SAVE_INTERVAL
+            ):
+        '''
+        Root is the watch folder, entries are keyed by "/" separated paths relative to it.
+        '''
+        self.ManifestPath = ManifestPath
+        self.Root = Root
+        self.ConfigHash = ConfigHash
+        self.HashContents = HashContents
+        self.SaveInterval = SaveInterval
+        self.Entries = {}
+        self.Pending = {}
+        self.Skipped = 0
+        self.Unsaved = 0
+        self.Dirty = {} #Key to changed entry, None once forgotten, not yet journalled.
+        self.JournalPath = ManifestPath + JOURNAL_SUFFIX
+        self.JournalStarted = False
+        self.ConfigChanged = False
+        self.Lock = threading.RLock()
+        self.Load()
+
+    def Key(
+            self,
+            Path
+            ):
+        return os.path.relpath(Path,self.Root).replace("\\","/")
+
+    def Load(self):
+        '''
+        Read the manifest, then replay any journal left by a run that did not finish. A run
+        interrupted after a configuration change leaves a manifest for the old configuration
+        and a journal for the new one, the journal is still replayed.
+        '''
+        if os.path.isfile(self.ManifestPath):
+            try:
+                with open(self.ManifestPath,"r") as r_file:
+                    Stored = json.loads(r_file.read())
+            except:
+                print(f"Unable to read manifest {self.ManifestPath}, processing everything.")
+                traceback.print_exc()
+                Stored = None
+            if Stored is not None and not self._Matches(Stored):
+                print("Watermark configuration changed since the last run, processing everything.")
+                self.ConfigChanged = True
+            elif Stored is not None:
+                self.Entries = Stored.get("Entries",{})
+        self._ReplayJournal()
+        return
+
+    def _Matches(
+            self,
+            Stored
+            ):
+        return Stored.get("Version") == MANIFEST_VERSION and Stored.get("ConfigHash") == self.ConfigHash
+
+    def _ReplayJournal(self):
+        if not os.path.isfile(self.JournalPath):
+            return
+        Torn = False
+        try:
+            with open(self.JournalPath,"r") as r_file:
+                try:
+                    Header = json.loads(r_file.readline())
+                except ValueError:
+                    Header = {}
+                if not self._Matches(Header):
+                    if not self.ConfigChanged:
+                        print("Watermark configuration changed since the last run, processing everything.")
+                    self.ConfigChanged = True
+                    self.Entries = {}
+                    r_file.close()
+                    self._RemoveJournal()
+                    return
+                for Line in r_file:
+                    try:
+                        Record = json.loads(Line)
+                    except ValueError:
+                        Torn = True #Cut short by the interruption, what follows is not trusted.
+                        break
+                    if Record["Entry"] is None:
+                        self.Entries.pop(Record["Key"],None)
+                    else:
+                        self.Entries[Record["Key"]] = Record["Entry"]
+        except OSError:
+            print(f"Unable to read manifest journal {self.JournalPath}, its progress is lost.")
+            traceback.print_exc()
+            return
+        self.JournalStarted = True
+        if Torn:
+            self.Save()
+        return
+
+    def _RemoveJournal(self):
+        try:
+            os.remove(self.JournalPath)
+        except FileNotFoundError:
+            pass
+        self.JournalStarted = False
+        return
+
+    def NeedsProcessing(
+            self,
+            Path
+            ):
+        '''
+        Compare the input against its entry. Unchanged size and mtime is enough to skip,
+        with HashContents a touched but identical file is also skipped.
+        '''
+        try:
+            Stat = os.stat(Path)
+        except OSError:
+            return True
+        Key = self.Key(Path)
+        Current = {
+            "Size":Stat.st_size,
+            "MTime":Stat.st_mtime_ns
+            }
+        with self.Lock:
+            Entry = self.Entries.get(Key)
+            if Entry is not None and Entry["Size"] == Current["Size"]:
+                if Entry["MTime"] == Current["MTime"]:
+                    return False
+                StoredHash = Entry.get("Hash") if self.HashContents else None
+            else:
+                StoredHash = None
+        if StoredHash:
+            Current["Hash"] = ContentHash(Path) #Hashed outside the lock, it reads the whole file.
+            if Current["Hash"] == StoredHash:
+                with self.Lock:
+                    Entry = self.Entries.get(Key)
+                    if Entry is not None:
+                        Entry["MTime"] = Current["MTime"]
+                        self._Touched(Key)
+                return False
+        with self.Lock:
+            self.Pending[Key] = Current
+        return True
+
+    def Filter(
+            self,
+            Inputs
+            ):
+        '''
+        Pass through the (input path, output path) pairs which need processing.
+        '''
+        for FileToProcess,OutputPath in Inputs:
+            if self.NeedsProcessing(FileToProcess):
+                yield FileToProcess,OutputPath
+            else:
+                with self.Lock:
+                    self.Skipped += 1
+
+    def Record(
+            self,
+            Path,
+            Header = None
+            ):
+        '''
+        Mark an input as successfully processed, using the stat taken before processing.
+        '''
+        Key = self.Key(Path)
+        with self.Lock:
+            Entry = self.Pending.pop(Key,None)
+        if Entry is None:
+            Stat = os.stat(Path)
+            Entry = {"Size":Stat.st_size,"MTime":Stat.st_mtime_ns}
+        if self.HashContents and "Hash" not in Entry:
+            Entry["Hash"] = ContentHash(Path)
+        if Header:
+            Entry["Header"] = Header
+        with self.Lock:
+            self.Entries[Key] = Entry
+            self._Touched(Key)
+        return
+
+    def Forget(
+            self,
+            Path
+            ):
+        '''
+        Drop a failed input so it is retried on the next run.
+        '''
+        Key = self.Key(Path)
+        with self.Lock:
+            self.Pending.pop(Key,None)
+            if self.Entries.pop(Key,None) is not None:
+                self._Touched(Key)
+        return
+
+    def _Touched(
+            self,
+            Key
+            ):
+        '''
+        Called with the lock held.
+        '''
+        self.Dirty[Key] = self.Entries.get(Key)
+        self.Unsaved += 1
+        if self.Unsaved >= self.SaveInterval:
+            self.Flush()
+
+    def Flush(self):
+        '''
+        Append the entries changed since the last flush to the journal.
+        '''
+        with self.Lock:
+            if not self.Dirty:
+                return
+            with open(self.JournalPath,"a") as o_file:
+                if not self.JournalStarted:
+                    o_file.write(json.dumps({
+                        "Version":MANIFEST_VERSION,
+                        "ConfigHash":self.ConfigHash
+                        },sort_keys=True) + "\n")
+                o_file.write("".join(
+                    json.dumps({"Key":Key,"Entry":Entry},sort_keys=True) + "\n"
+                    for Key,Entry in self.Dirty.items()
+                    ))
+            self.JournalStarted = True
+            self.Dirty.clear()
+            self.Unsaved = 0
+        return
+
+    def Save(self):
+        '''
+        Compact everything into the manifest and drop the journal. Written to a temporary
+        file and renamed over the manifest so it is never half written. Each save gets its
+        own temporary file, and the lock is held throughout so an older snapshot can never
+        be renamed over a newer one.
+        '''
+        Directory,Name = os.path.split(os.path.abspath(self.ManifestPath))
+        with self.Lock:
+            Handle,TempPath = tempfile.mkstemp(dir=Directory,prefix=f".{Name}.",suffix=".tmp")
+            try:
+                with os.fdopen(Handle,"w") as o_file:
+                    o_file.write(json.dumps({
+                        "Version":MANIFEST_VERSION,
+                        "ConfigHash":self.ConfigHash,
+                        "Entries":self.Entries
+                        },sort_keys=True))
+                os.replace(TempPath,self.ManifestPath)
+            except:
+                try:
+                    os.remove(TempPath)
+                except OSError:
+                    pass
+                raise
+            self._RemoveJournal()
+            self.Dirty.clear()
+            self.Unsaved = 0
+        return
@@ -1,33 +1,85 @@
 import os
 import sys
+import json
 try:
     from PIL import ImageFont
     from PIL import Image
     from PIL import ImageDraw
 except:
     print("Failed to import pillow, please run 'pip install pillow' from command line.")
+try:
+    import WatermarkCompositor
+    import WatermarkAssets
+    import WatermarkIO
+    import WatermarkMask
+    import WatermarkEncoder
+    import WatermarkRegion
+    import StageTrace
+    import WatermarkTiles
+except:
+    print("Failed to import WatermarkCompositor.")
     
 class WatermarkMarker():
     def __init__(
             self,
             Configuration,
-            InputImage
+            InputImage,
+            AssetCache = None,
+            EncoderConfiguration = None,
+            Tracer = None,
+            TileThreshold = WatermarkTiles.DEFAULT_TILE_THRESHOLD,
+            BandHeight = WatermarkTiles.DEFAULT_BAND_HEIGHT
             ):
         '''
-        Take JSON configuration and absolute input image path.
+        Take JSON configuration and absolute input image path. A list of configurations is
+        applied as layers, in order, in a single decode and encode of each image.
+        Prepared watermarks come from AssetCache, the process wide cache by default.
+        EncoderConfiguration is the optional "Encoder" section, see WatermarkEncoder.
+        Tracer times each stage of run, see StageTrace. Off by default.
+        With DeferWrite set, the encoded output is left in PendingWrite as (path, bytes)
+        for the caller to write, see WatermarkPipeline.
+        Images over TileThreshold pixels are composited BandHeight rows at a time where
+        their layout allows, see WatermarkTiles, and their masks are written as "BBox".
         '''
         self.Configuration = Configuration
         self.InputImage = InputImage
+        self.InputData = None
+        self.DeferWrite = False
+        self.PendingWrite = None
+        if AssetCache is None:
+            AssetCache = WatermarkAssets.SharedAssetCache
+        self.AssetCache = AssetCache
+        self.Encoder = WatermarkEncoder.OutputEncoder(EncoderConfiguration)
+        self.Source = None
+        self.Counters = WatermarkIO.NewCounters()
+        self.Header = None
+        if Tracer is None:
+            Tracer = StageTrace.NullTracer
+        self.Tracer = Tracer
+        self.TileThreshold = TileThreshold
+        self.BandHeight = BandHeight
+        if isinstance(Configuration,list):
+            self.Layers = [
+                WatermarkMarker(Layer,None,AssetCache=AssetCache,Tracer=Tracer,TileThreshold=TileThreshold,BandHeight=BandHeight)
+                for Layer in Configuration
+                ]
+        else:
+            self.Layers = [self]
         
     def ChangeInputImage(
             self,
-            NewInputImage
+            NewInputImage,
+            InputData = None
             ):
         '''
         After the object has been constructed, if the configuration remains the same, just the 
-        image path may be used and the process can be re-run.
+        image path may be used and the process can be re-run. InputData is the file's bytes
+        when they have already been read ahead.
         '''
+        self.CloseSource()
+        self.Header = None
         self.InputImage = NewInputImage
+        self.InputData = InputData
     
     def InterpretConfiguration(self):
         '''
@@ -35,33 +87,62 @@ class WatermarkMarker():
         - "Font": name of the font to be used"
         - "FontFile": relative path to the font file.
         - "Text": String of letters to place on the artwork.
+        - "Colour": [R,G,B] of the text, white by default.
         
         Where MarkType is "Image", we expect:
         - "Path": to point at the image file absolute path.
-        - "Scale": Currently scales the watermark by a factor. TODO: Make description of how to scale.
+        - "Scale": Scales the watermark by a fixed factor.
+        - "RelativeSize": Optional, replaces Scale. The watermark's longer side becomes this
+          fraction of the image's shorter side, resampled from a pyramid built once per run.
         - "Background": For non RGBa format files, describes the colour used for the background.
         
-        Both:
-        - "GenerateMask" 
+        Where MarkType is "Pattern", a tile is repeated diagonally over the whole image and
+        "Alignment" is not needed. The tile is a "Path" (with "Scale" and "Background") as
+        for Image, otherwise the "Text" (with "Font", "FontFile", "Size") as for Text, and:
+        - "Angle": Degrees anticlockwise, 30 by default.
+        - "Spacing": [X,Y] pixels between repeats, [100,100] by default.
+        - "Opacity": 0 to 1, 0.3 by default.
+        - "ColourMode": "Solid" draws the tile in "Colour", "Original" keeps an image tile's
+          own colours. Solid by default for text, Original for images.
+        
+        All:
+        - "HorizontalLimit", "VerticalLimit": Optional maximum watermark size in pixels.
+        - "GenerateMask": Write a mask of where the watermark landed, off by default.
+        - "MaskFormat": "G4", "BBox", "PNG" or "TIFF", see WatermarkMask.
+        - "Stamp": Composite the watermark onto the output image. On by default, except for
+          Text, which only reaches the mask unless Stamp is set.
         '''
-        self.AlignmentX = self.Configuration["Alignment"]["Horizontal"]
-        self.AlignmentY = self.Configuration["Alignment"]["Vertical"]
-        try:
-            self.PadX = self.Configuration["Alignment"]["PadX"]
-        except:
-            self.PadX = 0
-        try:
-            self.PadY = self.Configuration["Alignment"]["PadY"]
-        except:
-            self.PadY = 0
         self.MarkType = self.Configuration["MarkType"]
-        if self.MarkType == "Text":
+        self.TileType = None
+        if self.MarkType == "Pattern":
+            self.TileType = "Image" if "Path" in self.Configuration else "Text"
+            self.Angle = self.Configuration.get("Angle",WatermarkAssets.DEFAULT_PATTERN_ANGLE)
+            self.Spacing = tuple(self.Configuration.get("Spacing",WatermarkAssets.DEFAULT_PATTERN_SPACING))
+            self.Opacity = self.Configuration.get("Opacity",WatermarkAssets.DEFAULT_PATTERN_OPACITY)
+            self.ColourMode = self.Configuration.get("ColourMode","Original" if self.TileType == "Image" else "Solid")
+            self.ConfigKey = json.dumps(self.Configuration,sort_keys=True)
+        else:
+            self.AlignmentX = self.Configuration["Alignment"]["Horizontal"]
+            self.AlignmentY = self.Configuration["Alignment"]["Vertical"]
+            try:
+                self.PadX = self.Configuration["Alignment"]["PadX"]
+            except:
+                self.PadX = 0
+            try:
+                self.PadY = self.Configuration["Alignment"]["PadY"]
+            except:
+                self.PadY = 0
+        if self.MarkType == "Text" or self.TileType == "Text":
             #Size = Font Size
             self.FontName = os.path.join(os.getcwd(),"Fonts",self.Configuration["Font"])
             self.FontFile = os.path.join(os.getcwd(),"Fonts",self.Configuration["FontFile"])
             self.Size = self.Configuration["Size"]
             self.WatermarkText = self.Configuration["Text"]
-        if self.MarkType == "Image":
+            try:
+                self.Colour = tuple(self.Configuration["Colour"])
+            except:
+                self.Colour = (255,255,255)
+        if self.MarkType == "Image" or self.TileType == "Image":
             #Size = Percentage of total 
             self.ImageFile = self.Configuration["Path"]
             self.Scale = self.Configuration["Scale"]
@@ -69,12 +150,23 @@ class WatermarkMarker():
                 self.Background = self.Configuration["Background"]
             except:
                 self.Background = "Transparent"
+            try:
+                self.RelativeSize = self.Configuration["RelativeSize"]
+            except:
+                self.RelativeSize = None
             #self.PreserveColours = self.Configuration["PreserveColours"]
         try:
             self.GenerateMask = self.Configuration["GenerateMask"]
         except:
             self.GenerateMask = False
-        self.MaskFormat = "P" #Palette
+        try:
+            self.Stamp = self.Configuration["Stamp"]
+        except:
+            self.Stamp = self.MarkType != "Text"
+        try:
+            self.MaskFormat = self.Configuration["MaskFormat"]
+        except:
+            self.MaskFormat = WatermarkMask.DEFAULT_MASK_FORMAT
         try:
             self.LimitX = self.Configuration["HorizontalLimit"]
         except:
@@ -84,92 +176,231 @@ class WatermarkMarker():
         except:
             self.LimitY = 65535
         
+    def PrepareAssets(self):
+        '''
+        Interpret the configuration and make sure every layer's watermark is prepared in the
+        cache, without needing an input image. Used to warm worker processes.
+        '''
+        for Layer in self.Layers:
+            Layer.InterpretConfiguration()
+            Layer.LoadAsset(ForImage=False)
+        return
+    
+    def LoadAsset(
+            self,
+            ForImage = True
+            ):
+        '''
+        Fetch the prepared sprite and mask for this configuration from the cache.
+        A fixed Scale within the limits uses the directly scaled watermark. Relative sizes,
+        or a scaled watermark over the limits, are resampled from the pyramid for the
+        current image, or without an image (ForImage False) the pyramid is just warmed.
+        '''
+        if self.MarkType == "Pattern":
+            self.LoadPattern(ForImage)
+        elif self.MarkType == "Text":
+            self.Asset = self.AssetCache.GetTextAsset(self.FontFile,self.Size,self.WatermarkText,self.Colour)
+        elif self.MarkType == "Image":
+            if self.RelativeSize is None:
+                self.Asset = self.AssetCache.GetImageAsset(self.ImageFile,self.Scale,self.Background)
+                if self.Asset.Width <= self.LimitX and self.Asset.Height <= self.LimitY:
+                    return
+            Pyramid = self.AssetCache.GetPyramid(self.ImageFile)
+            if ForImage:
+                self.Asset = self.AssetCache.GetSizedImageAsset(
+                    self.ImageFile,
+                    self.MarkTargetSize(Pyramid.Width,Pyramid.Height),
+                    self.Background
+                    )
+        return
+    
+    def LoadPattern(
+            self,
+            ForImage = True
+            ):
+        '''
+        Fetch the tile, then the pattern covering the current image, painted as it is
+        composited. Without an image only the tile is warmed.
+        '''
+        if self.TileType == "Text":
+            Tile = self.AssetCache.GetTextAsset(self.FontFile,self.Size,self.WatermarkText,self.Colour)
+            SourcePath,Tint = self.FontFile,None
+        else:
+            Tile = self.AssetCache.GetImageAsset(self.ImageFile,self.Scale,self.Background)
+            SourcePath = self.ImageFile
+            Tint = self.Configuration.get("Colour",(255,255,255)) if self.ColourMode == "Solid" else None
+        self.Asset = Tile
+        if ForImage:
+            self.Asset = self.AssetCache.GetPatternAsset(
+                Tile,
+                SourcePath,
+                (self.ImageWidth,self.ImageHeight),
+                self.ConfigKey,
+                self.Angle,
+                self.Spacing,
+                self.Opacity,
+                Tint
+                )
+        return
+    
+    def MarkTargetSize(
+            self,
+            BaseWidth,
+            BaseHeight
+            ):
+        '''
+        Watermark size in pixels for the current image, from RelativeSize or Scale and
+        then shrunk to fit within LimitX and LimitY.
+        '''
+        if self.RelativeSize is not None:
+            Factor = self.RelativeSize * min(self.ImageWidth,self.ImageHeight) / max(BaseWidth,BaseHeight)
+        else:
+            Factor = self.Scale
+        Width,Height = BaseWidth*Factor,BaseHeight*Factor
+        Limit = min(1,self.LimitX/max(Width,1),self.LimitY/max(Height,1))
+        return max(1,int(Width*Limit)),max(1,int(Height*Limit))
+        
     def InterpretImage(self):
-        with Image.open(self.InputImage) as I_Image:
-            self.ImageWidth,self.ImageHeight = I_Image.width,I_Image.height
-            self.ImageType = I_Image.mode
-        print(f"Image is w:{self.ImageWidth}px h:{self.ImageHeight}px")
-        print(f"Image type is {self.ImageType}")
+        '''
+        Probe the header only, the handle is kept open for GenerateMark to decode from.
+        With TileThreshold set, images over Pillow's pixel limit may still be probed, as
+        they can be processed in bands, whole decodes are checked in GenerateMark.
+        '''
+        self.Source = WatermarkIO.ImageSource(self.InputImage,self.InputData)
+        self.InputData = None
+        if self.TileThreshold:
+            with WatermarkTiles.LargeImages():
+                I_Image = self.Source.Probe()
+        else:
+            I_Image = self.Source.Probe()
+        self.ImageWidth,self.ImageHeight = I_Image.width,I_Image.height
+        self.ImageType = I_Image.mode
+        self.Header = {
+            "Width":self.ImageWidth,
+            "Height":self.ImageHeight,
+            "Mode":self.ImageType
+            }
         return
         
     def CalculateGeometry(self):
         '''
         Workout where the text is going to land. Using Adobe definition for alignment.
         '''
-        if self.MarkType == "Text":
-            self.Font = ImageFont.truetype(self.FontFile,self.Size)
-            self.MarkWidth,self.MarkHeight = self.Font.getsize(self.WatermarkText)
-        elif self.MarkType == "Image":
-            with Image.open(self.ImageFile) as WM_Image:
-                WM_Image = WM_Image.resize((int(WM_Image.width*self.Scale),int(WM_Image.height*self.Scale)))
-                self.MarkWidth,self.MarkHeight = WM_Image.width,WM_Image.height
+        self.LoadAsset()
+        self.MarkWidth,self.MarkHeight = self.Asset.Width,self.Asset.Height
+        if self.MarkType == "Pattern":
+            self.DrawX,self.DrawY = 0,0
+            return
         
         #Determine X
         if self.AlignmentX.upper() == "Middle" or self.AlignmentX.upper() == "CENTER":
             self.DrawX = (self.ImageWidth/2) - (self.MarkWidth/2)
-            print ("Aligning X Middle")
         elif self.AlignmentX.upper() == "RIGHT":
-            print ("Aligning Y Right")
             self.DrawX = self.ImageWidth - self.MarkWidth - self.PadX
         elif self.AlignmentX.upper() == "LEFT":
-            print ("Aligning Y Left")
             self.DrawX = 0 + self.PadX
             
         #Determine Y Draw Position
         if self.AlignmentY.upper() == "MIDDLE" or self.AlignmentY.upper() == "CENTER":
-            print ("Aligning Y Centre")
             self.DrawY = (self.ImageHeight/2) - (self.MarkHeight/2)
         elif self.AlignmentY.upper() == "BOTTOM":
-            print ("Aligning Y Bottom")
             self.DrawY = self.ImageHeight - self.MarkHeight - self.PadY
         elif self.AlignmentY.upper() == "TOP":
-            print ("Aligning Y Bottom")
             self.DrawY = 0 + self.PadY
-        print (f"DrawX = {self.DrawX}, DrawY = {self.DrawY}")
         return
     
+    def Placements(self):
+        '''
+        (Asset,DrawX,DrawY) for each layer stamped onto the output, bottom layer first.
+        '''
+        return [(Layer.Asset,Layer.DrawX,Layer.DrawY) for Layer in self.Layers if Layer.Stamp]
+    
     def GenerateMark(self):
-        MaskOutput = Image.new("P",(self.ImageWidth,self.ImageHeight),color = 255)
-        Drawable = ImageDraw.Draw(MaskOutput)
-        ActualOutput =  Image.open(self.InputImage)
-        DrawOut = ImageDraw.Draw(ActualOutput)
-        if self.MarkType == "Text":
-            Drawable.text((self.DrawX,self.DrawY),self.WatermarkText,fill=0,font=self.Font)
-        
-        if self.MarkType == "Image":
-            MaskInput = Image.open(self.ImageFile)
-            if self.Scale != 1:
-                print("Doing Resize")
-                MaskInput = MaskInput.resize(
-                    (int(MaskInput.width*self.Scale),int(MaskInput.height*self.Scale))
-                     )
-            if MaskInput.mode == "RGB":
-                if self.Background == "Black":
-                    for px_X in range(MaskInput.width):
-                        for px_Y in range(MaskInput.height):
-                                Pixel = MaskInput.getpixel((px_X,px_Y))
-                                if Pixel[0] > 35 or Pixel[1] > 35 or Pixel[2] > 35: #Check > 50 for aliasing.
-                                    Drawable.point((px_X,px_Y),fill=0)
-                                    DrawOut.point((px_X+self.DrawX,px_Y+self.DrawY),Pixel)
-                elif self.Background == "White":
-                    for px_X in range(MaskInput.width):
-                        for px_Y in range(MaskInput.height):
-                                Pixel = MaskInput.getpixel((px_X,px_Y))
-                                if Pixel[0] < 220  or Pixel[1] < 220 or Pixel[2] < 220: #Check > 50 for aliasing.
-                                    Drawable.point((px_X,px_Y),fill=0)
-                                    DrawOut.point((px_X+self.DrawX,px_Y+self.DrawY),Pixel)
-            else:
-                #being lazy assuming catchall for transparent.
-                for px_X in range(MaskInput.width):
-                    for px_Y in range(MaskInput.height):
-                            Pixel = MaskInput.getpixel((px_X,px_Y))
-                            if Pixel[3] > 20:
-                                Drawable.point((px_X,px_Y),fill=0)
-                                DrawOut.point((px_X+self.DrawX,px_Y+self.DrawY),fill=(Pixel[0],Pixel[1],Pixel[2]))
-        MaskOutput.save(self.MaskPath)
-        ActualOutput.crop((0,0,self.ImageWidth,self.ImageHeight))
-        ActualOutput.save(self.OutputPath)
+        Placements = self.Placements()
+        Large = self.TileThreshold and self.ImageWidth * self.ImageHeight > self.TileThreshold
+        if not (self.RecompressRegion(Placements) or (Large and self.CompositeTiles(Placements))):
+            if Large:
+                WatermarkTiles.CheckDecodeSize((self.ImageWidth,self.ImageHeight),self.BandingReason)
+                print(f"{self.InputImage} is over the tile threshold but {self.BandingReason}, decoding it whole.")
+            elif self.TileThreshold:
+                WatermarkTiles.CheckDecodeSize((self.ImageWidth,self.ImageHeight))
+            with self.Tracer.Span("decode"):
+                ActualOutput = self.Source.Decode()
+            with self.Tracer.Span("composite"):
+                for Asset,DrawX,DrawY in Placements:
+                    Asset.Composite(ActualOutput,DrawX,DrawY)
+            with self.Tracer.Span("encode"):
+                if self.DeferWrite:
+                    self.PendingWrite = (self.OutputPath,self.Encoder.Encode(ActualOutput,self.OutputPath))
+                else:
+                    self.Encoder.Save(ActualOutput,self.OutputPath)
+        #Layers with GenerateMask set share one mask, in the first such layer's format.
+        MaskLayers = [Layer for Layer in self.Layers if Layer.GenerateMask and Layer.Asset.Mask is not None]
+        if MaskLayers:
+            with self.Tracer.Span("mask"):
+                self.MaskPath = WatermarkMask.WriteMask(
+                    [Placement for Layer in MaskLayers for Placement in Layer.Asset.MaskPlacements(Layer.DrawX,Layer.DrawY)],
+                    (self.ImageWidth,self.ImageHeight),
+                    self.MaskBase,
+                    "BBox" if Large else MaskLayers[0].MaskFormat
+                    )
         return 
+    
+    def RecompressRegion(
+            self,
+            Placements
+            ):
+        '''
+        With the encoder's RegionOnly set, mark only the MCUs under the watermarks and leave
+        the rest of the JPEG untouched. False when the full decode is needed instead.
+        '''
+        Copy = self.Encoder.RegionCopy(self.Source.Image,self.OutputPath)
+        if Copy is None:
+            return False
+        with self.Tracer.Span("region"):
+            return WatermarkRegion.RecompressRegion(
+                self.InputImage,
+                self.Source.Image,
+                Placements,
+                self.OutputPath,
+                Copy,
+                self.Encoder.Settings.get("Optimize",False),
+                self.Source.Data
+                )
+    
+    def CompositeTiles(
+            self,
+            Placements
+            ):
+        '''
+        Composite a large image in bands straight into a copy of the input. Only where the
+        output keeps the input's format, False when the full decode is needed instead, with
+        the reason left in BandingReason.
+        '''
+        if self.Encoder.Format != "SOURCE":
+            self.BandingReason = f"its output is re-encoded as {self.Encoder.Format}"
+            return False
+        if os.path.splitext(self.OutputPath)[1].lower() != os.path.splitext(self.InputImage)[1].lower():
+            self.BandingReason = "its output changes file type"
+            return False
+        self.BandingReason = WatermarkTiles.BandingUnsupported(self.Source.Image)
+        if self.BandingReason is not None:
+            return False
+        with self.Tracer.Span("tiles"):
+            return WatermarkTiles.CompositeInBands(
+                self.InputImage,
+                self.Source.Image,
+                Placements,
+                self.OutputPath,
+                self.BandHeight
+                )
+    
+    def CloseSource(self):
+        if self.Source is not None:
+            self.Counters = self.Source.Counters
+            self.Source.Close()
+            self.Source = None
+        return
         
     def run(
             self,
@@ -178,13 +409,25 @@ class WatermarkMarker():
         BaseName,ExtName = os.path.splitext(OutputPath)
         MaskName = f"{BaseName}_mask"
         OutName = f"{BaseName}_WaterMarked"
-        self.OutputPath = OutName + ExtName
-        self.MaskPath = MaskName + ".tif"
+        self.OutputPath = OutName + self.Encoder.Extension(ExtName)
+        self.MaskBase = MaskName
+        self.MaskPath = None
+        self.PendingWrite = None
         
-        self.InterpretConfiguration()
-        self.InterpretImage()
-        self.CalculateGeometry()
-        return self.GenerateMark()
+        with self.Tracer.Image(self.InputImage):
+            with self.Tracer.Span("config"):
+                for Layer in self.Layers:
+                    Layer.InterpretConfiguration()
+            try:
+                with self.Tracer.Span("probe"):
+                    self.InterpretImage()
+                with self.Tracer.Span("geometry"):
+                    for Layer in self.Layers:
+                        Layer.ImageWidth,Layer.ImageHeight = self.ImageWidth,self.ImageHeight
+                        Layer.CalculateGeometry()
+                return self.GenerateMark()
+            finally:
+                self.CloseSource()
     
 if __name__ == '__main__':
     File = "D:\\RepoRoot\\TechDevelopment\\BulkImageProcessor\\InputFolder\\608887.jpg"
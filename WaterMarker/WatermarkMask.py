@@ -0,0 +1,129 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import json
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import Image
+    from PIL import ImageOps
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+try:
+    import WatermarkCompositor
+except:
+    print("Failed to import WatermarkCompositor.")
+
+'''
+@date: 18/10/2026
+
+Mask outputs for WatermarkMarker. The watermark is black (0) on a white background, in
+image coordinates. Masks are only written when "GenerateMask" is set, "MaskFormat" picks
+the encoding:
+- "G4": full size 1 bit TIFF with CCITT Group 4 compression (default).
+- "BBox": only the watermark's bounding box as a 1 bit PNG, with a JSON sidecar holding
+  its offset and the full image size.
+- "PNG": full size 1 bit PNG.
+- "TIFF": full size uncompressed palette TIFF, as masks were originally written.
+'''
+
+MASK_FORMATS = [
+    "G4",
+    "BBox",
+    "PNG",
+    "TIFF"
+    ]
+DEFAULT_MASK_FORMAT = "G4"
+
+def _FullMask(
+        Placements,
+        ImageSize,
+        Mode = "1"
+        ):
+    Background = 1 if Mode == "1" else 255
+    Full = Image.new(Mode,ImageSize,color=Background)
+    for Mark,DrawX,DrawY in Placements:
+        WatermarkCompositor.BurnMask(Full,Mark,DrawX,DrawY,Fill=0)
+    return Full
+
+def MaskBounds(
+        Placements,
+        ImageSize
+        ):
+    '''
+    The (Left,Top,Right,Bottom) box covering every mark, clipped to the image. Empty
+    (Right == Left or Bottom == Top) when no mark lands on the image.
+    '''
+    Left,Top,Right,Bottom = ImageSize[0],ImageSize[1],0,0
+    for Mark,DrawX,DrawY in Placements:
+        X,Y = WatermarkCompositor.PastePosition(DrawX,DrawY)
+        Left,Top = min(Left,max(X,0)),min(Top,max(Y,0))
+        Right = max(Right,min(X + Mark.width,ImageSize[0]))
+        Bottom = max(Bottom,min(Y + Mark.height,ImageSize[1]))
+    Right,Bottom = max(Right,Left),max(Bottom,Top)
+    if Right == Left or Bottom == Top:
+        return 0,0,0,0
+    return Left,Top,Right,Bottom
+
+def WriteMask(
+        Placements,
+        ImageSize,
+        MaskBase,
+        MaskFormat = DEFAULT_MASK_FORMAT
+        ):
+    '''
+    Placements are (Mark,DrawX,DrawY), Mark being the "L" mask of a watermark (255 where
+    drawn) placed at DrawX,DrawY in an image of ImageSize. MaskBase is the output path
+    without extension. Returns the path written.
+    '''
+    if MaskFormat not in MASK_FORMATS:
+        raise ValueError(f"MaskFormat {MaskFormat} not in options {MASK_FORMATS}")
+    if MaskFormat == "BBox":
+        Left,Top,Right,Bottom = MaskBounds(Placements,ImageSize)
+        MaskPath = MaskBase + ".png"
+        if Right > Left and Bottom > Top:
+            Clipped = Image.new("L",(Right - Left,Bottom - Top),0)
+            for Mark,DrawX,DrawY in Placements:
+                WatermarkCompositor.BurnMask(Clipped,Mark,DrawX - Left,DrawY - Top,Fill=255)
+            #Marks are strictly 0/255 so the conversion to 1 bit is exact.
+            ImageOps.invert(Clipped).convert("1").save(MaskPath,optimize=True)
+        else:
+            MaskPath = MaskBase + ".json" #Watermarks entirely off the image, sidecar only.
+        with open(MaskBase + ".json","w") as o_file:
+            o_file.write(json.dumps({
+                "X":Left,
+                "Y":Top,
+                "Width":Right - Left,
+                "Height":Bottom - Top,
+                "ImageWidth":ImageSize[0],
+                "ImageHeight":ImageSize[1]
+                }))
+        return MaskPath
+    if MaskFormat == "G4":
+        MaskPath = MaskBase + ".tif"
+        _FullMask(Placements,ImageSize).save(MaskPath,compression="group4")
+    elif MaskFormat == "PNG":
+        MaskPath = MaskBase + ".png"
+        _FullMask(Placements,ImageSize).save(MaskPath,optimize=True)
+    else:
+        MaskPath = MaskBase + ".tif"
+        _FullMask(Placements,ImageSize,Mode="P").save(MaskPath)
+    return MaskPath
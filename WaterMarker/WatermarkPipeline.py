@@ -0,0 +1,202 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import queue
+    import tempfile
+    import threading
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    import WatermarkDiscovery
+except:
+    print("Failed to import WatermarkDiscovery.")
+
+'''
+@date: 18/10/2026
+
+Overlapped I/O for single process runs. Inputs are read into memory on a background
+thread ahead of compute, and encoded outputs are written behind it on another, through a
+temporary file renamed into place so a reader never sees a half written image.
+'''
+
+#Both stages are off unless asked for on the command line, these are the suggested depths.
+DEFAULT_READ_AHEAD = 4 #Inputs held in memory ahead of compute.
+DEFAULT_WRITE_BEHIND = 4 #Encoded outputs queued for writing.
+DEFAULT_MAX_PREFETCH_BYTES = 64 * 1024 * 1024 #Larger inputs are left to be read in place.
+
+def _ReadInputs(
+        Inputs,
+        MaxFileBytes
+        ):
+    for FileToProcess,OutputPath in Inputs:
+        Data = None
+        try:
+            if os.path.getsize(FileToProcess) <= MaxFileBytes:
+                with open(FileToProcess,"rb") as r_file:
+                    Data = r_file.read()
+        except OSError:
+            pass #Left for the marker to open and report.
+        yield FileToProcess,OutputPath,Data
+
+def ReadAhead(
+        Inputs,
+        Depth = DEFAULT_READ_AHEAD,
+        MaxFileBytes = DEFAULT_MAX_PREFETCH_BYTES
+        ):
+    '''
+    Turn (input path, output path) into (input path, output path, bytes or None), read on
+    a background thread at most Depth inputs ahead.
+    '''
+    return WatermarkDiscovery.BoundedFeed(_ReadInputs(Inputs,MaxFileBytes),Depth)
+
+def TemporaryPath(Path):
+    '''
+    An empty temporary file beside Path, for output written elsewhere to be renamed over
+    Path once it is complete, see Discard.
+    '''
+    Directory,Name = os.path.split(os.path.abspath(Path))
+    Handle,TempPath = tempfile.mkstemp(dir=Directory,prefix=f".{Name}.",suffix=".tmp")
+    os.close(Handle)
+    return TempPath
+
+def Discard(TempPath):
+    '''
+    Remove a temporary file left by an output that did not complete, if it is still there.
+    '''
+    try:
+        os.remove(TempPath)
+    except OSError:
+        pass
+    return
+
+def AtomicWrite(
+        Path,
+        Data
+        ):
+    '''
+    Write to a temporary file beside Path and rename it over Path.
+    '''
+    Directory,Name = os.path.split(os.path.abspath(Path))
+    Handle,TempPath = tempfile.mkstemp(dir=Directory,prefix=f".{Name}.",suffix=".tmp")
+    try:
+        with os.fdopen(Handle,"wb") as o_file:
+            o_file.write(Data)
+        os.replace(TempPath,Path)
+    except:
+        try:
+            os.remove(TempPath)
+        except OSError:
+            pass
+        raise
+    return
+
+class WriteBehind():
+    def __init__(
+            self,
+            Depth = DEFAULT_WRITE_BEHIND
+            ):
+        '''
+        Background writer fed through a queue of at most Depth outputs. Each output carries
+        its result dict, handed back by Completed once written, with "Error" set if the
+        write failed, so a result is only reported once its file exists. Should the thread
+        still die, Submit and Close fail the outputs rather than wait on it forever.
+        '''
+        self.Queue = queue.Queue(maxsize=Depth)
+        self.Done = queue.Queue()
+        self.Written = 0
+        self.Bytes = 0
+        self.MaxDepth = 0
+        self.Blocked = 0 #Times compute found the queue full and had to wait.
+        self.Writing = None #The output being written, failed by Close if the thread dies on it.
+        self.Thread = threading.Thread(target=self._Write,daemon=True)
+        self.Thread.start()
+
+    def _Write(self):
+        while True:
+            Item = self.Queue.get()
+            if Item is None:
+                return
+            self.Writing = Item
+            Path,Data,Result = Item
+            try:
+                AtomicWrite(Path,Data)
+                self.Written += 1
+                self.Bytes += len(Data)
+            except Exception as Error:
+                Result["Error"] = f"Failed to write {Path}: {Error}"
+            self.Done.put(Result)
+            self.Writing = None
+
+    def Submit(
+            self,
+            Path,
+            Data,
+            Result
+            ):
+        Depth = self.Queue.qsize()
+        if self.Queue.full():
+            self.Blocked += 1
+        self.MaxDepth = max(self.MaxDepth,Depth)
+        while self.Thread.is_alive():
+            try:
+                self.Queue.put((Path,Data,Result),timeout=1)
+                return
+            except queue.Full:
+                pass
+        Result["Error"] = f"Failed to write {Path}: writer thread stopped"
+        self.Done.put(Result)
+
+    def Completed(self):
+        '''
+        Results written since the last call.
+        '''
+        Results = []
+        while True:
+            try:
+                Results.append(self.Done.get_nowait())
+            except queue.Empty:
+                return Results
+
+    def Close(self):
+        '''
+        Wait for the queue to drain and return the remaining results, any still queued
+        behind a dead writer thread are returned failed.
+        '''
+        while self.Thread.is_alive():
+            try:
+                self.Queue.put(None,timeout=1)
+                break
+            except queue.Full:
+                pass
+        self.Thread.join()
+        Remaining = [self.Writing] if self.Writing is not None else []
+        while True:
+            try:
+                Remaining.append(self.Queue.get_nowait())
+            except queue.Empty:
+                break
+        for Item in Remaining:
+            if Item is not None:
+                Path,Data,Result = Item
+                Result["Error"] = f"Failed to write {Path}: writer thread stopped"
+                self.Done.put(Result)
+        return self.Completed()
@@ -0,0 +1,232 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import shutil
+    import tempfile
+    import subprocess
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import Image
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+try:
+    import WatermarkCompositor
+    import WatermarkPipeline
+except:
+    print("Failed to import WatermarkCompositor.")
+
+'''
+@date: 18/10/2026
+
+Region only recompression of JPEG inputs. Rather than decoding and re-encoding the whole
+photo, the MCU aligned rectangle under the watermark is losslessly cut out with jpegtran,
+decoded, marked, encoded with the source's own quantisation tables and dropped back in.
+Every block outside that rectangle keeps its original coefficients, bit for bit.
+
+Needs a jpegtran with -crop and -drop (libjpeg 9 or libjpeg-turbo 2.1 and later) on the
+PATH. When it is missing or fails, the caller falls back to the full decode, see
+WarnIfUnavailable. Inputs already read into memory are handed to jpegtran on stdin rather
+than opened again.
+'''
+
+JPEGTRAN = "jpegtran"
+_Executables = {}
+
+def FindJpegtran(Executable = JPEGTRAN):
+    '''
+    Path of a jpegtran supporting -crop and -drop, or None. Checked once per process.
+    '''
+    if Executable not in _Executables:
+        Found = shutil.which(Executable)
+        if Found:
+            try:
+                Help = subprocess.run([Found,"-help"],capture_output=True,timeout=10)
+                Usage = Help.stdout + Help.stderr
+                if b"-crop" not in Usage or b"-drop" not in Usage:
+                    Found = None
+            except (OSError,subprocess.SubprocessError):
+                Found = None
+        _Executables[Executable] = Found
+    return _Executables[Executable]
+
+def WarnIfUnavailable(EncoderConfiguration):
+    '''
+    Print once, before a run, when "RegionOnly" is set but cannot be honoured, as every
+    JPEG then falls back to a full re-encode without further notice.
+    '''
+    if not (EncoderConfiguration or {}).get("RegionOnly",False):
+        return True
+    if FindJpegtran() is None:
+        print(f"RegionOnly is set but no {JPEGTRAN} supporting -crop and -drop was found on the PATH, JPEGs will be re-encoded whole.")
+        return False
+    return True
+
+def McuSize(Source):
+    '''
+    MCU size in pixels from the JPEG's sampling factors. A single component scan is not
+    interleaved, so its blocks are always 8x8.
+    '''
+    Layers = getattr(Source,"layer",None) or []
+    if len(Layers) <= 1:
+        return 8,8
+    return 8*max(Layer[1] for Layer in Layers),8*max(Layer[2] for Layer in Layers)
+
+def MarkRegion(
+        Asset,
+        DrawX,
+        DrawY,
+        ImageSize,
+        Mcu
+        ):
+    '''
+    The (Left,Top,Right,Bottom) rectangle covering the watermark, grown out to MCU
+    boundaries and clipped to the image. None when the watermark is off the image.
+    '''
+    X,Y = WatermarkCompositor.PastePosition(DrawX,DrawY)
+    Left,Top = max(X,0),max(Y,0)
+    Right = min(X + Asset.Width,ImageSize[0])
+    Bottom = min(Y + Asset.Height,ImageSize[1])
+    if Right <= Left or Bottom <= Top:
+        return None
+    Left -= Left % Mcu[0]
+    Top -= Top % Mcu[1]
+    Right = min(-(-Right // Mcu[0]) * Mcu[0],ImageSize[0])
+    Bottom = min(-(-Bottom // Mcu[1]) * Mcu[1],ImageSize[1])
+    return Left,Top,Right,Bottom
+
+def MergeRegions(Regions):
+    '''
+    Merge overlapping rectangles into their bounding boxes until none overlap, so each
+    MCU is recompressed at most once.
+    '''
+    Merged = []
+    for Region in Regions:
+        while True:
+            for Index,Other in enumerate(Merged):
+                if Region[0] < Other[2] and Other[0] < Region[2] and Region[1] < Other[3] and Other[1] < Region[3]:
+                    Region = (
+                        min(Region[0],Other[0]),
+                        min(Region[1],Other[1]),
+                        max(Region[2],Other[2]),
+                        max(Region[3],Other[3])
+                        )
+                    del Merged[Index]
+                    break
+            else:
+                break
+        Merged.append(Region)
+    return Merged
+
+def _Jpegtran(
+        Executable,
+        Arguments,
+        Input = None
+        ):
+    '''
+    Input is the source's bytes, fed on stdin in place of a trailing input file.
+    '''
+    subprocess.run([Executable] + Arguments,input=Input,check=True,capture_output=True,timeout=60)
+
+def RecompressRegion(
+        SourcePath,
+        Source,
+        Placements,
+        OutputPath,
+        Copy = "all",
+        Optimize = False,
+        Data = None
+        ):
+    '''
+    Write the watermarked OutputPath from the JPEG at SourcePath, Source being its probed
+    (not decoded) image and Placements the (Asset,DrawX,DrawY) to composite in order.
+    Each region is cut from the source, so the layers are composited onto original pixels
+    and dropped back one after another. Copy is jpegtran's -copy option for markers such
+    as EXIF and ICC. Data is the source's bytes when already in memory, passed on stdin
+    instead of reading SourcePath again. Returns False, having written nothing, when the
+    caller should fall back. The result is written beside OutputPath and only renamed over
+    it once complete.
+    '''
+    Executable = FindJpegtran()
+    if Executable is None:
+        return False
+    Common = ["-copy",Copy]
+    if Optimize:
+        Common.append("-optimize")
+    if Source.info.get("progressive"):
+        Common.append("-progressive")
+    Mcu = McuSize(Source)
+    #jpegtran reads the source from stdin when no input file is given.
+    SourceArguments = [] if Data is not None else [SourcePath]
+    Regions = MergeRegions([
+        Region for Region in (
+            MarkRegion(Asset,DrawX,DrawY,Source.size,Mcu)
+            for Asset,DrawX,DrawY in Placements
+            if Asset.Mask is not None
+            )
+        if Region is not None
+        ])
+    TempPath = None
+    try:
+        TempPath = WatermarkPipeline.TemporaryPath(OutputPath)
+        if not Regions:
+            #Nothing lands on the image, a lossless copy is all that is needed.
+            _Jpegtran(Executable,Common + ["-outfile",TempPath] + SourceArguments,Data)
+            os.replace(TempPath,OutputPath)
+            return True
+        with tempfile.TemporaryDirectory() as Scratch:
+            Current = None #The source itself, from SourceArguments.
+            for Index,(Left,Top,Right,Bottom) in enumerate(Regions):
+                CropPath = os.path.join(Scratch,f"region{Index}.jpg")
+                PatchPath = os.path.join(Scratch,f"patch{Index}.jpg")
+                _Jpegtran(Executable,[
+                    "-copy","none",
+                    "-crop",f"{Right - Left}x{Bottom - Top}+{Left}+{Top}",
+                    "-outfile",CropPath
+                    ] + SourceArguments,Data)
+                with Image.open(CropPath) as Patch:
+                    Patch.load()
+                    if Patch.size != (Right - Left,Bottom - Top):
+                        print(f"jpegtran cropped {Patch.size} rather than the requested region, re-encoding whole image.")
+                        return False
+                    for Asset,DrawX,DrawY in Placements:
+                        X,Y = WatermarkCompositor.PastePosition(DrawX,DrawY)
+                        Asset.Composite(Patch,X - Left,Y - Top)
+                    Patch.save(PatchPath,format="JPEG",quality="keep",subsampling="keep")
+                Next = TempPath if Index == len(Regions) - 1 else os.path.join(Scratch,f"merged{Index}.jpg")
+                if Current is None:
+                    Input,CurrentArguments = Data,SourceArguments
+                else:
+                    Input,CurrentArguments = None,[Current]
+                _Jpegtran(Executable,Common + [
+                    "-drop",f"+{Left}+{Top}",PatchPath,
+                    "-outfile",Next
+                    ] + CurrentArguments,Input)
+                Current = Next
+        os.replace(TempPath,OutputPath)
+        return True
+    except (OSError,ValueError,subprocess.SubprocessError) as Error:
+        print(f"Region recompression of {SourcePath} failed ({Error}), re-encoding whole image.")
+        return False
+    finally:
+        if TempPath is not None:
+            WatermarkPipeline.Discard(TempPath)
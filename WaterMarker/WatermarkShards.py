@@ -0,0 +1,200 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import json
+    import time
+    import socket
+    import hashlib
+except:
+    print("Failed to import Python Built in libraries")
+
+'''
+@date: 18/10/2026
+
+Deterministic sharding of a run across machines sharing one filesystem. Each input
+belongs to shard sha1(relative path) mod N, so every node agrees on the split without
+talking to the others. A plan written up front lists each shard's inputs so nodes can
+start without walking the tree, and each node writes a report that can be merged.
+
+A plan folder holds plan.json and one "shard-<i>-of-<N>.txt" of "/" separated paths,
+relative to the watch folder, per shard.
+'''
+
+PLAN_FILE = "plan.json"
+REPORT_VERSION = 1
+
+def ParseShard(Text):
+    '''
+    "i/N" to (i,N), with shards numbered from 0.
+    '''
+    try:
+        Index,Count = (int(Part) for Part in Text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard {Text} is not of the form i/N")
+    if Count < 1 or not 0 <= Index < Count:
+        raise ValueError(f"Shard {Text} needs 0 <= i < N")
+    return Index,Count
+
+def ShardName(
+        Index,
+        Count
+        ):
+    return f"shard-{Index}-of-{Count}"
+
+def RelativeKey(
+        Path,
+        Root
+        ):
+    return os.path.relpath(Path,Root).replace("\\","/")
+
+def ShardOf(
+        RelativePath,
+        Count
+        ):
+    '''
+    Stable across machines, platforms and Python runs, unlike hash().
+    '''
+    Digest = hashlib.sha1(RelativePath.encode("utf-8")).digest()
+    return int.from_bytes(Digest[:8],"big") % Count
+
+def InShard(
+        Paths,
+        Root,
+        Index,
+        Count
+        ):
+    '''
+    Pass through the paths under Root belonging to shard Index of Count.
+    '''
+    for Path in Paths:
+        if ShardOf(RelativeKey(Path,Root),Count) == Index:
+            yield Path
+
+def WritePlan(
+        PlanFolder,
+        Root,
+        Paths,
+        Count
+        ):
+    '''
+    Stream Paths into one list per shard and return the number of inputs in each.
+    '''
+    os.makedirs(PlanFolder,exist_ok=True)
+    Counts = [0] * Count
+    Files = [open(os.path.join(PlanFolder,ShardName(Index,Count) + ".txt"),"w",encoding="utf-8") for Index in range(Count)]
+    try:
+        for Path in Paths:
+            Key = RelativeKey(Path,Root)
+            Index = ShardOf(Key,Count)
+            Files[Index].write(Key + "\n")
+            Counts[Index] += 1
+    finally:
+        for o_file in Files:
+            o_file.close()
+    with open(os.path.join(PlanFolder,PLAN_FILE),"w") as o_file:
+        o_file.write(json.dumps({
+            "Root":Root,
+            "Shards":Count,
+            "Counts":Counts,
+            "Created":time.strftime("%Y-%m-%dT%H:%M:%S")
+            },indent=4))
+    return Counts
+
+def ReadPlan(
+        PlanFolder,
+        Root,
+        Index,
+        Count
+        ):
+    '''
+    Yield the absolute input paths planned for shard Index of Count, resolved against
+    this node's Root, which may be mounted somewhere other than where the plan was made.
+    '''
+    with open(os.path.join(PlanFolder,PLAN_FILE),"r") as r_file:
+        Plan = json.loads(r_file.read())
+    if Plan["Shards"] != Count:
+        raise ValueError(f"Plan {PlanFolder} is for {Plan['Shards']} shards, not {Count}")
+    with open(os.path.join(PlanFolder,ShardName(Index,Count) + ".txt"),"r",encoding="utf-8") as r_file:
+        for Line in r_file:
+            Key = Line.rstrip("\n")
+            if Key:
+                yield os.path.join(Root,*Key.split("/"))
+
+def WriteReport(
+        ReportPath,
+        Results,
+        Shard = None,
+        Duration = None
+        ):
+    '''
+    Write a node's results, from RunSummary.Export, as JSON.
+    '''
+    Report = {
+        "Version":REPORT_VERSION,
+        "Shard":list(Shard) if Shard else None,
+        "Host":socket.gethostname(),
+        "Finished":time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "Duration":Duration
+        }
+    Report.update(Results)
+    TempPath = ReportPath + ".tmp"
+    with open(TempPath,"w") as o_file:
+        o_file.write(json.dumps(Report,indent=4))
+    os.replace(TempPath,ReportPath)
+    return Report
+
+def MergeReports(ReportPaths):
+    '''
+    Combine per shard reports: totals and counters summed, failures concatenated, and any
+    shard of the run with no report listed under "Missing".
+    '''
+    Merged = {
+        "Version":REPORT_VERSION,
+        "Reports":[],
+        "Processed":0,
+        "Skipped":0,
+        "Failures":[],
+        "Counters":{},
+        "Missing":[]
+        }
+    Seen = set()
+    Count = None
+    for ReportPath in ReportPaths:
+        with open(ReportPath,"r") as r_file:
+            Report = json.loads(r_file.read())
+        Merged["Reports"].append({
+            "Path":ReportPath,
+            "Shard":Report.get("Shard"),
+            "Host":Report.get("Host"),
+            "Duration":Report.get("Duration")
+            })
+        Merged["Processed"] += Report.get("Processed",0)
+        Merged["Skipped"] += Report.get("Skipped",0)
+        Merged["Failures"].extend(Report.get("Failures",[]))
+        for Key,Value in Report.get("Counters",{}).items():
+            Merged["Counters"][Key] = Merged["Counters"].get(Key,0) + Value
+        if Report.get("Shard"):
+            Seen.add(Report["Shard"][0])
+            Count = Report["Shard"][1]
+    if Count is not None:
+        Merged["Missing"] = [Index for Index in range(Count) if Index not in Seen]
+    return Merged
@@ -0,0 +1,218 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import mmap
+    import shutil
+    import threading
+    import contextlib
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    from PIL import Image
+except:
+    print("Failed to import pillow, please run 'pip install pillow' from command line.")
+try:
+    import WatermarkCompositor
+    import WatermarkPipeline
+except:
+    print("Failed to import WatermarkCompositor.")
+
+'''
+@date: 18/10/2026
+
+Banded processing for very large inputs. When an image above the pixel threshold stores
+its pixels as uncompressed full width strips (uncompressed TIFF, BMP, PPM), the input is
+copied beside the output unchanged and only the rows under the watermarks are read,
+composited and written back through a memory map of the copy, one band at a time, before
+the copy is renamed over the output. Peak memory
+is a band plus the watermark, whatever the size of the image.
+
+Compressed inputs cannot be read in bands through Pillow and are decoded whole, or for
+JPEG recompressed by region (see WatermarkRegion).
+'''
+
+DEFAULT_TILE_THRESHOLD = 64 * 1000 * 1000 #Pixels, 0 turns banded processing off.
+DEFAULT_BAND_HEIGHT = 256 #Rows composited at a time.
+LargeImageLock = threading.Lock()
+
+@contextlib.contextmanager
+def LargeImages():
+    '''
+    Lift Pillow's pixel limit for the duration, and only for it, so an input's header can be
+    probed before deciding how to process it. Everything else keeps Pillow's check.
+    '''
+    with LargeImageLock:
+        Limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            yield
+        finally:
+            Image.MAX_IMAGE_PIXELS = Limit
+
+def CheckDecodeSize(
+        Size,
+        Reason = None
+        ):
+    '''
+    Raise where Pillow would have refused to decode an image of Size whole. Inputs probed
+    under LargeImages skipped Pillow's own check. Reason says why it could not be banded.
+    '''
+    Limit = Image.MAX_IMAGE_PIXELS
+    if Limit and Size[0] * Size[1] > 2 * Limit:
+        raise Image.DecompressionBombError(
+            f"Image size ({Size[0] * Size[1]} pixels) is over twice Pillow's limit and cannot be "
+            f"processed in bands, as {Reason or 'it is not stored in uncompressed strips'}. "
+            "Convert it to an uncompressed TIFF to process it in bands, or raise "
+            "PIL.Image.MAX_IMAGE_PIXELS to decode it whole."
+            )
+    return
+
+def BandingUnsupported(Source):
+    '''
+    Why the probed Source cannot be processed in bands, None when it can.
+    '''
+    if RawStrips(Source) is not None:
+        return None
+    Compression = Source.info.get("compression")
+    if Compression and Compression != "raw":
+        return f"its {Source.format} pixels are {Compression} compressed"
+    return f"its {Source.format} pixels are not stored as uncompressed full width strips"
+
+def _RowBytes(
+        Mode,
+        RawMode,
+        Width
+        ):
+    return len(Image.new(Mode,(Width,1)).tobytes("raw",RawMode))
+
+def RawStrips(Source):
+    '''
+    (Top,Bottom,Offset,RawMode,Stride,Orientation) for each tile when every tile is an
+    uncompressed strip spanning the full width, otherwise None.
+    '''
+    Strips = []
+    for Tile in Source.tile:
+        Decoder,Extents,Offset,Arguments = Tile[:4]
+        if Decoder != "raw" or Extents[0] != 0 or Extents[2] != Source.width:
+            return None
+        if isinstance(Arguments,str):
+            Arguments = (Arguments,)
+        RawMode = Arguments[0]
+        Stride = Arguments[1] if len(Arguments) > 1 else 0
+        Orientation = Arguments[2] if len(Arguments) > 2 else 1
+        try:
+            if not Stride:
+                Stride = _RowBytes(Source.mode,RawMode,Source.width)
+        except (ValueError,OSError):
+            return None
+        Strips.append((Extents[1],Extents[3],Offset,RawMode,Stride,Orientation))
+    return Strips or None
+
+def _RowSpans(
+        Placements,
+        Height
+        ):
+    '''
+    Sorted, merged [Top,Bottom) row ranges covered by the watermarks.
+    '''
+    Spans = []
+    for Asset,DrawX,DrawY in Placements:
+        if Asset.Mask is None:
+            continue
+        _,Y = WatermarkCompositor.PastePosition(DrawX,DrawY)
+        Top,Bottom = max(Y,0),min(Y + Asset.Height,Height)
+        if Bottom > Top:
+            Spans.append([Top,Bottom])
+    Spans.sort()
+    Merged = []
+    for Span in Spans:
+        if Merged and Span[0] <= Merged[-1][1]:
+            Merged[-1][1] = max(Merged[-1][1],Span[1])
+        else:
+            Merged.append(Span)
+    return Merged
+
+def CompositeInBands(
+        SourcePath,
+        Source,
+        Placements,
+        OutputPath,
+        BandHeight = DEFAULT_BAND_HEIGHT
+        ):
+    '''
+    Write OutputPath as a copy of SourcePath with the (Asset,DrawX,DrawY) placements
+    composited in bands. Source is the probed image. Returns False, having written
+    nothing, when the layout cannot be processed in bands. The copy is only renamed over
+    OutputPath once complete, so an interrupted run never leaves a half marked output.
+    '''
+    Strips = RawStrips(Source)
+    if Strips is None:
+        return False
+    Spans = _RowSpans(Placements,Source.height)
+    TempPath = WatermarkPipeline.TemporaryPath(OutputPath)
+    try:
+        shutil.copyfile(SourcePath,TempPath)
+        if Spans:
+            _CompositeMapped(TempPath,Source,Strips,Spans,Placements,BandHeight)
+        os.replace(TempPath,OutputPath)
+    finally:
+        WatermarkPipeline.Discard(TempPath)
+    return True
+
+def _CompositeMapped(
+        Path,
+        Source,
+        Strips,
+        Spans,
+        Placements,
+        BandHeight
+        ):
+    with open(Path,"r+b") as o_file:
+        with mmap.mmap(o_file.fileno(),0) as Mapped:
+            for SpanTop,SpanBottom in Spans:
+                for BandTop in range(SpanTop,SpanBottom,BandHeight):
+                    BandBottom = min(BandTop + BandHeight,SpanBottom)
+                    for Top,Bottom,Offset,RawMode,Stride,Orientation in Strips:
+                        First,Last = max(BandTop,Top),min(BandBottom,Bottom)
+                        if Last <= First:
+                            continue
+                        if Orientation < 0:
+                            #Bottom up rows, the band's last row is stored first.
+                            Start = Offset + (Bottom - Last) * Stride
+                        else:
+                            Start = Offset + (First - Top) * Stride
+                        End = Start + (Last - First) * Stride
+                        Band = Image.frombytes(
+                            Source.mode,
+                            (Source.width,Last - First),
+                            Mapped[Start:End],
+                            "raw",
+                            RawMode,
+                            Stride,
+                            Orientation
+                            )
+                        for Asset,DrawX,DrawY in Placements:
+                            X,Y = WatermarkCompositor.PastePosition(DrawX,DrawY)
+                            Asset.Composite(Band,X,Y - First)
+                        Mapped[Start:End] = Band.tobytes("raw",RawMode,Stride,Orientation)
+            Mapped.flush()
+    return
@@ -0,0 +1,306 @@
+'''
+Copyright 2022 George Linsdell
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to the following
+conditions:
+
+The above copyright notice and this permission notice shall be included in all copies
+or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+OR OTHER DEALINGS IN THE SOFTWARE.
+'''
+try:
+    import os
+    import sys
+    import time
+    import select
+    import struct
+    import ctypes
+    import ctypes.util
+except:
+    print("Failed to import Python Built in libraries")
+try:
+    import WatermarkDiscovery
+except:
+    print("Failed to import WatermarkDiscovery.")
+
+'''
+@date: 18/10/2026
+
+Watch folder support for running WaterMarker as a long lived daemon. New or rewritten
+files are picked up with inotify where the platform has it, falling back to polling the
+folder, held back until their size and mtime stop changing, and handed out in batches.
+'''
+
+DEFAULT_POLL_INTERVAL = 5.0 #Seconds between scans when polling.
+DEFAULT_SETTLE_SECONDS = 2.0 #A file must be unchanged this long before it is processed.
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BATCH_WINDOW = 1.0 #Seconds to wait for more arrivals once a batch has started.
+
+#From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+class PollingWatcher():
+    def __init__(
+            self,
+            Root,
+            Filter,
+            Interval = DEFAULT_POLL_INTERVAL
+            ):
+        '''
+        Portable fallback, rescans the folder every Interval seconds and reports files
+        that are new or whose size or mtime changed since the previous scan. Files already
+        present when the watcher is created are not reported.
+        '''
+        self.Root = Root
+        self.Filter = Filter
+        self.Interval = Interval
+        self.Seen = {}
+        self.LastScan = None
+        self._Scan()
+
+    def _Scan(self):
+        Current = {}
+        Changed = []
+        for Path in WatermarkDiscovery.IterateImages(self.Root,Filter=self.Filter):
+            try:
+                Stat = os.stat(Path)
+            except OSError:
+                continue
+            Current[Path] = (Stat.st_size,Stat.st_mtime_ns)
+            if self.Seen.get(Path) != Current[Path]:
+                Changed.append(Path)
+        self.Seen = Current
+        self.LastScan = time.monotonic()
+        return Changed
+
+    def Poll(
+            self,
+            Timeout
+            ):
+        '''
+        Wait up to Timeout seconds and return candidate paths.
+        '''
+        if self.LastScan is not None:
+            Wait = self.Interval - (time.monotonic() - self.LastScan)
+            if Wait > 0:
+                time.sleep(min(Wait,Timeout))
+                if time.monotonic() - self.LastScan < self.Interval:
+                    return []
+        return self._Scan()
+
+    def Close(self):
+        return
+
+class InotifyWatcher():
+    def __init__(
+            self,
+            Root,
+            Filter
+            ):
+        '''
+        Linux only, watches every directory under Root through inotify via libc.
+        Raises OSError where inotify is unavailable so the caller can fall back to polling.
+        '''
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self.Root = Root
+        self.Filter = Filter
+        self.Libc = ctypes.CDLL(ctypes.util.find_library("c") or None,use_errno=True)
+        self.Fd = self.Libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.Fd < 0:
+            raise OSError(ctypes.get_errno(),"inotify_init1 failed")
+        self.Directories = {}
+        self.Backlog = []
+        self._WatchTree(Root,Report=False)
+
+    def _AddWatch(
+            self,
+            Directory
+            ):
+        Descriptor = self.Libc.inotify_add_watch(
+            self.Fd,
+            os.fsencode(Directory),
+            WATCH_MASK
+            )
+        if Descriptor < 0:
+            print(f"Unable to watch {Directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.Directories[Descriptor] = Directory
+
+    def _WatchTree(
+            self,
+            Directory,
+            Report = True
+            ):
+        '''
+        Watch a directory and everything below it. A directory created while we were not
+        yet watching it may already hold files, those are reported as candidates.
+        '''
+        Stack = [Directory]
+        while Stack:
+            Current = Stack.pop()
+            self._AddWatch(Current)
+            try:
+                with os.scandir(Current) as Entries:
+                    for Entry in Entries:
+                        RelativePath = os.path.relpath(Entry.path,self.Root)
+                        if Entry.is_dir(follow_symlinks=False):
+                            if self.Filter.AcceptsDirectory(RelativePath):
+                                Stack.append(Entry.path)
+                        elif Report and self.Filter.AcceptsFile(RelativePath):
+                            self.Backlog.append(Entry.path)
+            except OSError as Error:
+                print(f"Unable to scan {Current}: {Error}")
+
+    def _ReadEvents(self):
+        Candidates = []
+        while True:
+            try:
+                Buffer = os.read(self.Fd,64 * 1024)
+            except BlockingIOError:
+                break
+            if not Buffer:
+                break
+            Offset = 0
+            while Offset < len(Buffer):
+                Descriptor,Mask,_,Length = EVENT_HEADER.unpack_from(Buffer,Offset)
+                Offset += EVENT_HEADER.size
+                Name = os.fsdecode(Buffer[Offset:Offset+Length].rstrip(b"\0"))
+                Offset += Length
+                if Mask & IN_Q_OVERFLOW:
+                    print("Watch queue overflowed, rescanning the watch folder.")
+                    Candidates.extend(WatermarkDiscovery.IterateImages(self.Root,Filter=self.Filter))
+                    continue
+                if Mask & IN_IGNORED:
+                    self.Directories.pop(Descriptor,None)
+                    continue
+                Directory = self.Directories.get(Descriptor)
+                if Directory is None or not Name:
+                    continue
+                Path = os.path.join(Directory,Name)
+                RelativePath = os.path.relpath(Path,self.Root)
+                if Mask & IN_ISDIR:
+                    if Mask & (IN_CREATE | IN_MOVED_TO) and self.Filter.AcceptsDirectory(RelativePath):
+                        self._WatchTree(Path)
+                elif self.Filter.AcceptsFile(RelativePath):
+                    Candidates.append(Path)
+        return Candidates
+
+    def Poll(
+            self,
+            Timeout
+            ):
+        Candidates = self.Backlog
+        self.Backlog = []
+        if not Candidates:
+            Ready,_,_ = select.select([self.Fd],[],[],Timeout)
+            if not Ready:
+                return []
+        Candidates.extend(self._ReadEvents())
+        Candidates.extend(self.Backlog)
+        self.Backlog = []
+        return Candidates
+
+    def Close(self):
+        if self.Fd >= 0:
+            os.close(self.Fd)
+            self.Fd = -1
+
+def CreateWatcher(
+        Root,
+        Filter,
+        PollInterval = DEFAULT_POLL_INTERVAL,
+        ForcePolling = False
+        ):
+    if not ForcePolling:
+        try:
+            return InotifyWatcher(Root,Filter)
+        except (OSError,AttributeError):
+            pass
+    print(f"Polling {Root} every {PollInterval}s.")
+    return PollingWatcher(Root,Filter,PollInterval)
+
+class SettleTracker():
+    def __init__(
+            self,
+            SettleSeconds = DEFAULT_SETTLE_SECONDS
+            ):
+        '''
+        Holds candidates back until their size and mtime have been stable for
+        SettleSeconds, so files still being copied in are not read half written.
+        '''
+        self.SettleSeconds = SettleSeconds
+        self.Observed = {}
+
+    def Add(
+            self,
+            Paths
+            ):
+        for Path in Paths:
+            self.Observed.setdefault(Path,(None,0))
+
+    def Ready(self):
+        Now = time.monotonic()
+        Settled = []
+        for Path,(Last,Since) in list(self.Observed.items()):
+            try:
+                Stat = os.stat(Path)
+            except OSError:
+                del self.Observed[Path]
+                continue
+            Current = (Stat.st_size,Stat.st_mtime_ns)
+            if Current != Last:
+                self.Observed[Path] = (Current,Now)
+            elif Now - Since >= self.SettleSeconds:
+                del self.Observed[Path]
+                Settled.append(Path)
+        return Settled
+
+    def Waiting(self):
+        return len(self.Observed)
+
+def IterateBatches(
+        Watcher,
+        Settler,
+        BatchSize = DEFAULT_BATCH_SIZE,
+        BatchWindow = DEFAULT_BATCH_WINDOW,
+        Tick = 0.5
+        ):
+    '''
+    Yield lists of settled paths forever. A batch is handed out when it is full or when
+    BatchWindow has passed since its first file settled.
+    '''
+    Batch = []
+    BatchStarted = None
+    while True:
+        Settler.Add(Watcher.Poll(Tick))
+        for Path in Settler.Ready():
+            if Path not in Batch:
+                Batch.append(Path)
+        if Batch and BatchStarted is None:
+            BatchStarted = time.monotonic()
+        if Batch and (len(Batch) >= BatchSize or time.monotonic() - BatchStarted >= BatchWindow):
+            yield Batch[:BatchSize]
+            Batch = Batch[BatchSize:]
+            BatchStarted = time.monotonic() if Batch else None
@@ -26,6 +26,8 @@ try:
     import json
     import traceback
     import argparse
+    import signal
+    import concurrent.futures
 except:
     print("Failed to import Python Built in libraries")
     sys.exit(1)
@@ -45,6 +47,16 @@ sys.path.append(currentDirectory)
 
 try:
     import WatermarkMarker
+    import WatermarkAssets
+    import WatermarkIO
+    import WatermarkDiscovery
+    import WatermarkManifest
+    import WatermarkWatcher
+    import StageTrace
+    import WatermarkTiles
+    import WatermarkPipeline
+    import WatermarkShards
+    import WatermarkRegion
 except:
     print("Failed to import WaterMarker.")
     sys.exit(1)
@@ -62,29 +74,503 @@ OutputFolder = os.path.join(
     "OutputFolder"
     )
 
+DEFAULT_CHUNK_SIZE = 16
+
+#Populated in each worker process by _InitialiseWorker.
+WorkerConfiguration = None
+WorkerTracer = StageTrace.NullTracer
+
+def OutputPathFor(FileToProcess):
+    return os.path.join(OutputFolder,os.path.basename(FileToProcess))
+
+def CreateInputFilter(Configuration):
+    '''
+    The optional "Processing" section may set "Extentions" (one or a list), "Include"
+    and "Exclude" globs.
+    '''
+    Processing = Configuration.get("Processing",{})
+    return WatermarkDiscovery.InputFilter(
+        Extensions=Processing.get("Extentions"),
+        Include=Processing.get("Include"),
+        Exclude=Processing.get("Exclude")
+        )
+
+def IterateInputs(
+        Configuration,
+        QueueDepth = WatermarkDiscovery.DEFAULT_QUEUE_DEPTH,
+        Shard = None,
+        PlanFolder = None
+        ):
+    '''
+    Yield (input path, output path) for every image to be watermarked, streamed from the
+    watch folder through a bounded queue. With Shard (Index,Count) only that shard's images
+    are yielded, read from the shard plan in PlanFolder when given instead of walking.
+    '''
+    if PlanFolder is not None:
+        Discovered = WatermarkShards.ReadPlan(PlanFolder,WatchFolder,*Shard)
+    else:
+        Discovered = WatermarkDiscovery.IterateImages(
+            WatchFolder,
+            Filter=CreateInputFilter(Configuration)
+            )
+        if Shard is not None:
+            Discovered = WatermarkShards.InShard(Discovered,WatchFolder,*Shard)
+    for FileToProcess in WatermarkDiscovery.BoundedFeed(Discovered,QueueDepth):
+        yield FileToProcess,OutputPathFor(FileToProcess)
+
+def IterateChunks(
+        Items,
+        ChunkSize
+        ):
+    Chunk = []
+    for Item in Items:
+        Chunk.append(Item)
+        if len(Chunk) >= ChunkSize:
+            yield Chunk
+            Chunk = []
+    if Chunk:
+        yield Chunk
+
+def _InitialiseWorker(
+        Configuration,
+        PreparedAssets,
+        TraceSettings = None
+        ):
+    '''
+    Runs once in each worker process, keeps the parsed configuration and seeds the
+    watermark cache with the assets the parent already prepared. Ctrl+C is left to the
+    parent, which shuts the pool down. With TraceSettings, records are handed back to the
+    parent's tracer in the results.
+    '''
+    signal.signal(signal.SIGINT,signal.SIG_IGN)
+    global WorkerConfiguration,WorkerTracer
+    WorkerConfiguration = Configuration
+    if TraceSettings is not None:
+        WorkerTracer = StageTrace.StageTracer(**TraceSettings)
+    WatermarkAssets.SharedAssetCache.Seed(PreparedAssets)
+    return
+
+def WatermarkConfiguration(Configuration):
+    '''
+    A "Watermarks" list of layers applied in one pass, or the single "Watermark".
+    '''
+    if "Watermarks" in Configuration:
+        return Configuration["Watermarks"]
+    return Configuration["Watermark"]
+
+def CreateMarker(
+        Configuration,
+        Tracer = StageTrace.NullTracer
+        ):
+    '''
+    The "Processing" section may set "TileThreshold", in pixels (0 turns banded processing
+    of large images off), and "BandHeight", in rows.
+    '''
+    Processing = Configuration.get("Processing",{})
+    return WatermarkMarker.WatermarkMarker(
+        WatermarkConfiguration(Configuration),
+        None,
+        EncoderConfiguration=Configuration.get("Encoder"),
+        Tracer=Tracer,
+        TileThreshold=Processing.get("TileThreshold",WatermarkTiles.DEFAULT_TILE_THRESHOLD),
+        BandHeight=Processing.get("BandHeight",WatermarkTiles.DEFAULT_BAND_HEIGHT)
+        )
+
+def ProcessFile(
+        Marker,
+        FileToProcess,
+        OutputPath,
+        InputData = None
+        ):
+    '''
+    Watermark a single input with an existing marker, returning a result dict with the
+    "Input", "Error" (None on success), read "Counters" and probed "Header".
+    InputData is the input's bytes when read ahead.
+    '''
+    Marker.ChangeInputImage(FileToProcess,InputData)
+    Result = {
+        "Input":FileToProcess,
+        "Error":None
+        }
+    try:
+        Marker.run(OutputPath)
+    except:
+        Result["Error"] = traceback.format_exc()
+    Result["Counters"] = Marker.Counters
+    Result["Header"] = Marker.Header
+    return Result
+
+def ProcessChunk(
+        Chunk,
+        Configuration = None
+        ):
+    '''
+    Watermark a list of (input path, output path), returning a result per input, with
+    its "Trace" record when the worker is tracing.
+    '''
+    if Configuration is None:
+        Configuration = WorkerConfiguration
+    Marker = CreateMarker(Configuration,WorkerTracer)
+    Results = []
+    for FileToProcess,OutputPath in Chunk:
+        WorkerTracer.LastRecord = None
+        Result = ProcessFile(Marker,FileToProcess,OutputPath)
+        if WorkerTracer.Enabled:
+            Result["Trace"] = WorkerTracer.LastRecord
+        Results.append(Result)
+    return Results
+
+class RunSummary():
+    def __init__(
+            self,
+            Manifest = None,
+            Tracer = StageTrace.NullTracer
+            ):
+        '''
+        Collects results from either mode and keeps the manifest up to date. Trace records
+        forwarded from worker processes go to Tracer.
+        '''
+        self.Manifest = Manifest
+        self.Tracer = Tracer
+        self.numberOfFiles = 0
+        self.Failures = []
+        self.Counters = WatermarkIO.NewCounters()
+        self.Pipeline = {}
+
+    def Add(
+            self,
+            Result
+            ):
+        self.numberOfFiles += 1
+        WatermarkIO.AddCounters(self.Counters,Result["Counters"])
+        if Result.get("Trace") is not None:
+            self.Tracer.Record(Result["Trace"])
+        if Result["Error"] is not None:
+            print(f"Failed to process {Result['Input']}")
+            print(Result["Error"])
+            self.Failures.append((Result["Input"],Result["Error"]))
+            if self.Manifest is not None:
+                self.Manifest.Forget(Result["Input"])
+        elif self.Manifest is not None:
+            self.Manifest.Record(Result["Input"],Result["Header"])
+        return
+
+    def Report(
+            self,
+            Duration
+            ):
+        print("Total Image creation of %s images complete in "%self.numberOfFiles)
+        print(Duration)
+        if self.Manifest is not None:
+            print(f"{self.Manifest.Skipped} unchanged images skipped.")
+        PrintCounters(self.Counters)
+        if self.Pipeline:
+            print("Read ahead: %s prefetched, max depth %s, compute waited %s times"%(
+                self.Pipeline["Prefetched"],
+                self.Pipeline["ReadMaxDepth"],
+                self.Pipeline["Starved"]
+                )
+            )
+            print("Write behind: %s written, %s bytes, max depth %s, compute blocked %s times"%(
+                self.Pipeline["Written"],
+                self.Pipeline["WrittenBytes"],
+                self.Pipeline["WriteMaxDepth"],
+                self.Pipeline["Blocked"]
+                )
+            )
+        self.Tracer.Report()
+        print(f"{len(self.Failures)} images failed.")
+        return
+
+    def Export(self):
+        '''
+        Results as the JSON serialisable dict written to a shard report.
+        '''
+        return {
+            "Processed":self.numberOfFiles,
+            "Skipped":self.Manifest.Skipped if self.Manifest is not None else 0,
+            "Failures":[{"Input":Input,"Error":Error} for Input,Error in self.Failures],
+            "Counters":dict(self.Counters)
+            }
+
+def _AddPipelineStats(
+        Summary,
+        Reader,
+        Writer
+        ):
+    if Reader is None and Writer is None:
+        return
+    Stats = Summary.Pipeline
+    for Key in ["Prefetched","ReadMaxDepth","Starved","Written","WrittenBytes","WriteMaxDepth","Blocked"]:
+        Stats.setdefault(Key,0)
+    if Reader is not None:
+        Stats["Prefetched"] += Reader.Fed
+        Stats["ReadMaxDepth"] = max(Stats["ReadMaxDepth"],Reader.MaxDepth)
+        Stats["Starved"] += Reader.Starved
+    if Writer is not None:
+        Stats["Written"] += Writer.Written
+        Stats["WrittenBytes"] += Writer.Bytes
+        Stats["WriteMaxDepth"] = max(Stats["WriteMaxDepth"],Writer.MaxDepth)
+        Stats["Blocked"] += Writer.Blocked
+    return
+
+def RunSingleProcess(
+        Configuration,
+        Inputs,
+        Summary,
+        Marker = None,
+        ReadAheadDepth = 0,
+        WriteBehindDepth = 0
+        ):
+    '''
+    Watermark the inputs in this process. With ReadAheadDepth, inputs are read into memory
+    that many ahead on a background thread. With WriteBehindDepth, outputs are encoded here
+    and written atomically on a background thread, their results reported once written.
+    '''
+    if Marker is None:
+        Marker = CreateMarker(Configuration,Summary.Tracer)
+    Reader = None
+    Writer = None
+    if ReadAheadDepth:
+        Inputs = Reader = WatermarkPipeline.ReadAhead(Inputs,ReadAheadDepth)
+    else:
+        Inputs = ((FileToProcess,OutputPath,None) for FileToProcess,OutputPath in Inputs)
+    if WriteBehindDepth:
+        Writer = WatermarkPipeline.WriteBehind(WriteBehindDepth)
+    Marker.DeferWrite = Writer is not None
+    try:
+        for FileToProcess,OutputPath,InputData in Inputs:
+            Result = ProcessFile(Marker,FileToProcess,OutputPath,InputData)
+            if Writer is not None and Result["Error"] is None and Marker.PendingWrite is not None:
+                Writer.Submit(*Marker.PendingWrite,Result)
+                Marker.PendingWrite = None
+            else:
+                Summary.Add(Result)
+            if Writer is not None:
+                for Written in Writer.Completed():
+                    Summary.Add(Written)
+    finally:
+        if Writer is not None:
+            for Written in Writer.Close():
+                Summary.Add(Written)
+        _AddPipelineStats(Summary,Reader,Writer)
+    return
+
+def CreatePool(
+        Configuration,
+        Workers,
+        Tracer = StageTrace.NullTracer
+        ):
+    '''
+    Process pool whose workers start with the configuration and prepared watermark, and
+    trace with the same sampling as Tracer.
+    '''
+    CreateMarker(Configuration).PrepareAssets()
+    PreparedAssets = WatermarkAssets.SharedAssetCache.Export()
+    print(f"Running as Multi Process entity with {Workers} workers.")
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=Workers,
+        initializer=_InitialiseWorker,
+        initargs=(Configuration,PreparedAssets,Tracer.Settings() if Tracer.Enabled else None)
+        )
+
+def RunMultiProcess(
+        Configuration,
+        Inputs,
+        Summary,
+        Workers,
+        ChunkSize,
+        Pool = None
+        ):
+    '''
+    Watermark the inputs across a pool of worker processes, keeping at most two chunks
+    per worker in flight. A pool is created for the call unless one is given.
+    '''
+    if Pool is None:
+        with CreatePool(Configuration,Workers,Summary.Tracer) as Pool:
+            return RunMultiProcess(Configuration,Inputs,Summary,Workers,ChunkSize,Pool)
+    Chunks = IterateChunks(Inputs,ChunkSize)
+    Pending = set()
+    Exhausted = False
+    while Pending or not Exhausted:
+        while not Exhausted and len(Pending) < Workers*2:
+            try:
+                Pending.add(Pool.submit(ProcessChunk,next(Chunks)))
+            except StopIteration:
+                Exhausted = True
+        if not Pending:
+            break
+        Done,Pending = concurrent.futures.wait(
+            Pending,
+            return_when=concurrent.futures.FIRST_COMPLETED
+            )
+        for Future in Done:
+            for Result in Future.result():
+                Summary.Add(Result)
+    return
+
+def RunWatch(
+        Configuration,
+        args,
+        Manifest,
+        Summary
+        ):
+    '''
+    Daemon mode, process what is already in the watch folder then keep processing new
+    arrivals in batches with a warm marker or pool until interrupted.
+    '''
+    Filter = CreateInputFilter(Configuration)
+    Watcher = WatermarkWatcher.CreateWatcher(
+        WatchFolder,
+        Filter,
+        PollInterval=args.PollInterval,
+        ForcePolling=args.Poll
+        )
+    Settler = WatermarkWatcher.SettleTracker(args.SettleSeconds)
+    Pool = None
+    Marker = None
+    Workers = args.Workers or os.cpu_count() or 1
+    if THREAD_MODES[int(args.MultiThread)] == "MULTITHREADED":
+        Pool = CreatePool(Configuration,Workers,Summary.Tracer)
+    else:
+        Marker = CreateMarker(Configuration,Summary.Tracer)
+        Marker.PrepareAssets()
+
+    def Process(Inputs):
+        if Manifest is not None and not args.Full:
+            Inputs = Manifest.Filter(Inputs)
+        if Pool is not None:
+            RunMultiProcess(Configuration,Inputs,Summary,Workers,args.ChunkSize,Pool)
+        else:
+            RunSingleProcess(Configuration,Inputs,Summary,Marker,args.ReadAhead,args.WriteBehind)
+        if Manifest is not None:
+            Manifest.Flush()
+
+    try:
+        Process(IterateInputs(Configuration,args.QueueDepth,args.Shard,args.Plan))
+        print(f"Watching {WatchFolder} for new images.")
+        for Batch in WatermarkWatcher.IterateBatches(
+                Watcher,
+                Settler,
+                BatchSize=args.BatchSize,
+                BatchWindow=args.BatchWindow
+                ):
+            if args.Shard is not None:
+                Batch = list(WatermarkShards.InShard(Batch,WatchFolder,*args.Shard))
+                if not Batch:
+                    continue
+            BatchStartTimer = time.time()
+            Before = Summary.numberOfFiles
+            Process([(FileToProcess,OutputPathFor(FileToProcess)) for FileToProcess in Batch])
+            print(f"Batch of {Summary.numberOfFiles - Before} images processed in {time.time() - BatchStartTimer}")
+    except KeyboardInterrupt:
+        print("Stopping watch.")
+    finally:
+        Watcher.Close()
+        if Pool is not None:
+            Pool.shutdown()
+    return
+
+def PrintCounters(Counters):
+    print("Input reads: %s opens, %s decodes, %s header bytes, %s decode bytes"%(
+        Counters["Opens"],
+        Counters["Decodes"],
+        Counters["ProbeBytes"],
+        Counters["DecodeBytes"]
+        )
+    )
+    return
+
+def WritePlan(
+        Configuration,
+        PlanFolder,
+        Count
+        ):
+    '''
+    Walk the watch folder once and write the inputs of each of Count shards to PlanFolder.
+    '''
+    StartTimer = time.time()
+    Counts = WatermarkShards.WritePlan(
+        PlanFolder,
+        WatchFolder,
+        WatermarkDiscovery.IterateImages(WatchFolder,Filter=CreateInputFilter(Configuration)),
+        Count
+        )
+    print(f"Planned {sum(Counts)} images across {Count} shards in {time.time() - StartTimer}")
+    for Index,Planned in enumerate(Counts):
+        print(f"{WatermarkShards.ShardName(Index,Count)}: {Planned}")
+    return 0
+
+def MergeReports(
+        ReportPaths,
+        MergedPath = None
+        ):
+    '''
+    Combine per shard reports, printing the totals and writing the merged report to
+    MergedPath when given. Fails when any image failed or a shard has no report.
+    '''
+    Merged = WatermarkShards.MergeReports(ReportPaths)
+    if MergedPath:
+        with open(MergedPath,"w") as o_file:
+            o_file.write(json.dumps(Merged,indent=4))
+    print(f"{len(Merged['Reports'])} reports, {Merged['Processed']} images processed, {Merged['Skipped']} skipped.")
+    PrintCounters(Merged["Counters"])
+    for Failure in Merged["Failures"]:
+        print(f"Failed to process {Failure['Input']}")
+    print(f"{len(Merged['Failures'])} images failed.")
+    if Merged["Missing"]:
+        print(f"No report for shards {Merged['Missing']}")
+    return 1 if Merged["Failures"] or Merged["Missing"] else 0
+
 def main(args):
         TotalStartTimer = time.time()
+        if args.MergeReports:
+            return MergeReports(args.MergeReports,args.Report)
         with open(args.config,"r") as r_file:
             Configuration = json.loads(r_file.read())
-        numberOfFiles = 0
-        Executors = []
-        for root,dirs,files in os.walk(WatchFolder):
-            for i_file in files:
-                if os.path.splitext(i_file)[1].lower() in [".jpg","jpeg"]:
-                    FileToProcess = os.path.join(root,i_file)
-                    print(f"Processing {FileToProcess}")
-                    Executors.append(
-                        WatermarkMarker.WatermarkMarker(
-                            Configuration["Watermark"],
-                            FileToProcess)
-                        )
-                    OutputPath = os.path.join(OutputFolder,i_file)
-                    Executors[-1].run(OutputPath)
-                    numberOfFiles += 1
-        Duration = time.time() - TotalStartTimer
-        print("Total Image creation of %s images complete in "%numberOfFiles)
-        print(Duration)
-        return 0
+        if args.WritePlan:
+            return WritePlan(Configuration,args.WritePlan,args.Shards)
+        ThreadMode = THREAD_MODES[int(args.MultiThread)]
+        WatermarkRegion.WarnIfUnavailable(Configuration.get("Encoder"))
+        ShardName = WatermarkShards.ShardName(*args.Shard) if args.Shard else None
+        Inputs = IterateInputs(Configuration,args.QueueDepth,args.Shard,args.Plan)
+        ReportPath = args.Report
+        if ReportPath is None and ShardName:
+            ReportPath = os.path.normpath(OutputFolder) + f".{ShardName}.report.json"
+        Manifest = None
+        if not args.NoManifest:
+            Manifest = WatermarkManifest.WatermarkManifest(
+                args.Manifest or WatermarkManifest.DefaultManifestPath(OutputFolder,ShardName),
+                WatchFolder,
+                WatermarkManifest.ConfigurationHash(WatermarkConfiguration(Configuration),Configuration.get("Encoder")),
+                HashContents=args.HashContents
+                )
+            if not args.Full:
+                Inputs = Manifest.Filter(Inputs)
+        Tracer = StageTrace.CreateTracer(
+            Output=args.Trace,
+            Histogram=args.TraceSummary,
+            ProfileEvery=args.ProfileEvery,
+            MemoryEvery=args.MemoryEvery,
+            ProfileFolder=args.ProfileFolder
+            )
+        Summary = RunSummary(Manifest,Tracer)
+        try:
+            if args.Watch:
+                RunWatch(Configuration,args,Manifest,Summary)
+            elif ThreadMode == "MULTITHREADED":
+                Workers = args.Workers or os.cpu_count() or 1
+                RunMultiProcess(Configuration,Inputs,Summary,Workers,args.ChunkSize)
+            else:
+                RunSingleProcess(Configuration,Inputs,Summary,ReadAheadDepth=args.ReadAhead,WriteBehindDepth=args.WriteBehind)
+        finally:
+            if Manifest is not None:
+                Manifest.Save()
+            Tracer.Close()
+            if ReportPath:
+                WatermarkShards.WriteReport(ReportPath,Summary.Export(),args.Shard,time.time() - TotalStartTimer)
+        Summary.Report(time.time() - TotalStartTimer)
+        return 1 if Summary.Failures else 0
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -92,7 +578,36 @@ if __name__ == '__main__':
         )
     parser.add_argument('--config', nargs="?", default = "DEFAULT", help = "path to watermarking configuration file.")
     parser.add_argument('--MultiThread', nargs='?', default = 0, help = '0=Single Threaded, 1=MultiThread')
+    parser.add_argument('--Workers', type = int, default = None, help = 'Worker processes for MultiThread, defaults to the CPU count.')
+    parser.add_argument('--ChunkSize', type = int, default = DEFAULT_CHUNK_SIZE, help = 'Images handed to a worker at a time.')
+    parser.add_argument('--Manifest', default = None, help = 'Path of the re-run manifest, defaults to beside the output folder.')
+    parser.add_argument('--NoManifest', action = 'store_true', help = 'Do not read or write the re-run manifest.')
+    parser.add_argument('--Full', action = 'store_true', help = 'Process every input, still refreshing the manifest.')
+    parser.add_argument('--HashContents', action = 'store_true', help = 'Store content hashes so touched but unchanged inputs are skipped.')
+    parser.add_argument('--Watch', action = 'store_true', help = 'Keep running and process new images as they arrive.')
+    parser.add_argument('--Poll', action = 'store_true', help = 'Poll the watch folder even where inotify is available.')
+    parser.add_argument('--PollInterval', type = float, default = WatermarkWatcher.DEFAULT_POLL_INTERVAL, help = 'Seconds between scans when polling.')
+    parser.add_argument('--SettleSeconds', type = float, default = WatermarkWatcher.DEFAULT_SETTLE_SECONDS, help = 'Seconds a new file must be unchanged before processing.')
+    parser.add_argument('--BatchSize', type = int, default = WatermarkWatcher.DEFAULT_BATCH_SIZE, help = 'Most new images processed together in watch mode.')
+    parser.add_argument('--BatchWindow', type = float, default = WatermarkWatcher.DEFAULT_BATCH_WINDOW, help = 'Seconds to gather arrivals into a batch in watch mode.')
+    parser.add_argument('--ReadAhead', type = int, default = 0, help = 'Inputs read into memory on a background thread ahead of processing, off (0) by default. Holds up to this many input files, each up to %sMB, in memory; %s is a good start.'%(WatermarkPipeline.DEFAULT_MAX_PREFETCH_BYTES//(1024*1024),WatermarkPipeline.DEFAULT_READ_AHEAD))
+    parser.add_argument('--WriteBehind', type = int, default = 0, help = 'Outputs written atomically on a background thread, off (0) by default. Holds up to this many encoded outputs in memory; %s is a good start.'%WatermarkPipeline.DEFAULT_WRITE_BEHIND)
+    parser.add_argument('--Trace', default = None, help = 'Append per image stage timings to this JSON lines file.')
+    parser.add_argument('--TraceSummary', action = 'store_true', help = 'Print a per stage latency histogram at the end of the run.')
+    parser.add_argument('--ProfileEvery', type = int, default = 0, help = 'cProfile one image in N, written to --ProfileFolder.')
+    parser.add_argument('--MemoryEvery', type = int, default = 0, help = 'Record tracemalloc peak and top allocations for one image in N.')
+    parser.add_argument('--ProfileFolder', default = None, help = 'Folder for sampled .prof files, defaults to the working directory.')
+    parser.add_argument('--QueueDepth', type = int, default = WatermarkDiscovery.DEFAULT_QUEUE_DEPTH, help = 'Discovered images held ahead of processing.')
+    parser.add_argument('--Shard', type = WatermarkShards.ParseShard, default = None, help = 'i/N, process only shard i (from 0) of N, split by a hash of the relative path.')
+    parser.add_argument('--Plan', default = None, help = 'Shard plan folder from --WritePlan, read instead of walking the watch folder.')
+    parser.add_argument('--WritePlan', default = None, help = 'Write a plan of --Shards shards to this folder and exit.')
+    parser.add_argument('--Shards', type = int, default = 1, help = 'Number of shards for --WritePlan.')
+    parser.add_argument('--Report', default = None, help = 'Write results and failures to this JSON report, defaults to beside the output folder for a shard.')
+    parser.add_argument('--MergeReports', nargs = '+', default = None, help = 'Merge these shard reports, into --Report when given, and exit.')
     
     args = parser.parse_args()
+    if args.Plan and not args.Shard:
+        parser.error("--Plan needs --Shard.")
+    if args.WritePlan and args.Shards < 1:
+        parser.error("--Shards must be at least 1.")
     sys.exit(main(args))
-    
\ No newline at end of file
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+from PIL import Image
+from PIL import ImageDraw
+
+import WatermarkAssets
+import WatermarkCompositor
+
+def Noise(Mode,Size,Seed):
+    Bytes = random.Random(Seed).randbytes(Size[0] * Size[1] * len(Mode))
+    return Image.frombytes(Mode,Size,Bytes)
+
+def Mark(Mode,Size,Seed):
+    '''
+    Channel values either side of each threshold, so an off by one shows.
+    '''
+    Random = random.Random(Seed)
+    Values = [0,19,20,21,34,35,36,219,220,221,255]
+    Bytes = bytes(Random.choice(Values) for Index in range(Size[0] * Size[1] * len(Mode)))
+    return Image.frombytes(Mode,Size,Bytes)
+
+def PerPixel(
+        Target,
+        MaskOutput,
+        MarkInput,
+        Background,
+        DrawX,
+        DrawY
+        ):
+    '''
+    The per pixel loop WatermarkMarker.GenerateMark used before compositing in bulk.
+    '''
+    Drawable = ImageDraw.Draw(MaskOutput)
+    DrawOut = ImageDraw.Draw(Target)
+    for px_X in range(MarkInput.width):
+        for px_Y in range(MarkInput.height):
+            Pixel = MarkInput.getpixel((px_X,px_Y))
+            if MarkInput.mode == "RGB":
+                if Background == "Black":
+                    Drawn = Pixel[0] > 35 or Pixel[1] > 35 or Pixel[2] > 35
+                elif Background == "White":
+                    Drawn = Pixel[0] < 220 or Pixel[1] < 220 or Pixel[2] < 220
+                else:
+                    Drawn = False
+            else:
+                Drawn = Pixel[3] > 20
+            if Drawn:
+                Drawable.point((px_X,px_Y),fill=0)
+                DrawOut.point((px_X+DrawX,px_Y+DrawY),fill=(Pixel[0],Pixel[1],Pixel[2]))
+
+@pytest.mark.parametrize("Mode,Background",[
+    ("RGB","Black"),
+    ("RGB","White"),
+    ("RGB","Unknown"),
+    ("RGBA","Transparent")
+    ])
+@pytest.mark.parametrize("DrawX,DrawY",[(7,11),(12.5,3.75),(50,40)])
+def test_bulk_composite_matches_the_per_pixel_loop(Mode,Background,DrawX,DrawY):
+    MarkInput = Mark(Mode,(23,17),1)
+    Expected = Noise("RGB",(64,48),2)
+    ExpectedMask = Image.new("P",(64,48),color=255)
+    PerPixel(Expected,ExpectedMask,MarkInput,Background,DrawX,DrawY)
+
+    Actual = Noise("RGB",(64,48),2)
+    WatermarkAssets._ThresholdAsset(MarkInput,Background,None).Composite(Actual,DrawX,DrawY)
+    assert Actual.tobytes() == Expected.tobytes()
+
+    Sprite,Mask = WatermarkCompositor.BuildThresholdMask(MarkInput,Background)
+    Actual = Noise("RGB",(64,48),2)
+    WatermarkCompositor.CompositeMark(Actual,Sprite,Mask,DrawX,DrawY)
+    assert Actual.tobytes() == Expected.tobytes()
+
+    ActualMask = WatermarkCompositor.BurnMask(Image.new("P",(64,48),color=255),Mask)
+    assert ActualMask.tobytes() == ExpectedMask.tobytes()
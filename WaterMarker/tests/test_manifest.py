@@ -0,0 +1,93 @@
+import os
+import json
+
+import pytest
+
+import WatermarkManifest
+
+@pytest.fixture
+def Inputs(tmp_path):
+    Root = tmp_path / "in"
+    Root.mkdir()
+    Paths = []
+    for Index in range(5):
+        Path = Root / f"{Index}.jpg"
+        Path.write_bytes(b"image %d" % Index)
+        Paths.append(str(Path))
+    return str(Root),Paths
+
+def Manifest(
+        Folder,
+        Root,
+        ConfigHash = "config",
+        **kwargs
+        ):
+    return WatermarkManifest.WatermarkManifest(str(Folder / "out.manifest.json"),Root,ConfigHash,**kwargs)
+
+def test_unchanged_inputs_are_skipped(tmp_path,Inputs):
+    Root,Paths = Inputs
+    First = Manifest(tmp_path,Root)
+    for Path in First.Filter((Path,None) for Path in Paths):
+        First.Record(Path[0])
+    First.Save()
+    os.utime(Paths[0],ns=(0,0))
+    Second = Manifest(tmp_path,Root)
+    assert [Path for Path,_ in Second.Filter((Path,None) for Path in Paths)] == [Paths[0]]
+    assert Second.Skipped == 4
+
+def test_touched_but_identical_input_is_skipped_with_hashes(tmp_path,Inputs):
+    Root,Paths = Inputs
+    First = Manifest(tmp_path,Root,HashContents=True)
+    for Path in Paths:
+        First.NeedsProcessing(Path)
+        First.Record(Path)
+    First.Save()
+    os.utime(Paths[0],ns=(0,0))
+    assert not Manifest(tmp_path,Root,HashContents=True).NeedsProcessing(Paths[0])
+
+def test_interrupted_run_is_replayed_from_the_journal(tmp_path,Inputs):
+    Root,Paths = Inputs
+    Interrupted = Manifest(tmp_path,Root,SaveInterval=1)
+    for Path in Paths[:3]:
+        Interrupted.Record(Path)
+    Interrupted.Forget(Paths[1])
+    assert not os.path.exists(Interrupted.ManifestPath)
+    Restarted = Manifest(tmp_path,Root)
+    assert sorted(Restarted.Entries) == ["0.jpg","2.jpg"]
+    Restarted.Save()
+    assert not os.path.exists(Restarted.JournalPath)
+    with open(Restarted.ManifestPath) as r_file:
+        assert sorted(json.load(r_file)["Entries"]) == ["0.jpg","2.jpg"]
+
+def test_torn_journal_line_is_ignored_and_compacted(tmp_path,Inputs):
+    Root,Paths = Inputs
+    Interrupted = Manifest(tmp_path,Root,SaveInterval=1)
+    Interrupted.Record(Paths[0])
+    with open(Interrupted.JournalPath,"a") as o_file:
+        o_file.write('{"Key": "1.j')
+    Restarted = Manifest(tmp_path,Root)
+    assert list(Restarted.Entries) == ["0.jpg"]
+    assert os.path.exists(Restarted.ManifestPath)
+    assert not os.path.exists(Restarted.JournalPath)
+
+def test_journal_for_a_new_configuration_survives_an_old_manifest(tmp_path,Inputs):
+    Root,Paths = Inputs
+    Old = Manifest(tmp_path,Root,"old")
+    for Path in Paths:
+        Old.Record(Path)
+    Old.Save()
+    Interrupted = Manifest(tmp_path,Root,"new",SaveInterval=1)
+    assert Interrupted.ConfigChanged and not Interrupted.Entries
+    for Path in Paths[:2]:
+        Interrupted.Record(Path)
+    Restarted = Manifest(tmp_path,Root,"new")
+    assert sorted(Restarted.Entries) == ["0.jpg","1.jpg"]
+
+def test_journal_for_another_configuration_is_discarded(tmp_path,Inputs):
+    Root,Paths = Inputs
+    Interrupted = Manifest(tmp_path,Root,"old",SaveInterval=1)
+    Interrupted.Record(Paths[0])
+    Restarted = Manifest(tmp_path,Root,"new")
+    assert Restarted.ConfigChanged
+    assert not Restarted.Entries
+    assert not os.path.exists(Restarted.JournalPath)
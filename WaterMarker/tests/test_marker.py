@@ -0,0 +1,45 @@
+import os
+
+import pytest
+from PIL import Image
+
+import WatermarkMarker
+
+WATERMARKER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def TextLayer(**Settings):
+    Layer = {
+        "MarkType":"Text",
+        "Alignment":{"Vertical":"TOP","Horizontal":"LEFT"},
+        "Size":20,
+        "Font":"arialn",
+        "FontFile":"ARIALN.TTF",
+        "Text":"PROOF",
+        "GenerateMask":True,
+        "MaskFormat":"PNG"
+        }
+    Layer.update(Settings)
+    return Layer
+
+@pytest.fixture
+def Source(tmp_path,monkeypatch):
+    #FontFile is relative to the Fonts folder of the working directory.
+    monkeypatch.chdir(WATERMARKER)
+    Path = tmp_path / "in.png"
+    Image.new("RGB",(120,60),(0,0,0)).save(Path)
+    return str(Path)
+
+def Mark(Source,Layer):
+    Marker = WatermarkMarker.WatermarkMarker(Layer,Source)
+    Marker.run(Source)
+    with Image.open(Marker.OutputPath) as Output:
+        Stamped = Output.convert("RGB").getbbox() is not None
+    with Image.open(Marker.MaskPath) as Mask:
+        Masked = Mask.getbbox() is not None
+    return Stamped,Masked
+
+def test_text_only_reaches_the_mask_by_default(Source):
+    assert Mark(Source,TextLayer()) == (False,True)
+
+def test_text_is_stamped_when_asked(Source):
+    assert Mark(Source,TextLayer(Stamp=True)) == (True,True)
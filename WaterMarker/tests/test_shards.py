@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+import WatermarkShards
+
+def test_shard_of_is_pinned():
+    #Nodes on other machines and Python versions must agree, so the split never changes.
+    Paths = ["a.jpg","sub/b.jpg","sub/deeper/c.png","ü.jpg"]
+    assert [WatermarkShards.ShardOf(Path,4) for Path in Paths] == [0,1,2,2]
+    assert WatermarkShards.ShardOf("a.jpg",2**64) == 6255195937718481008
+
+def test_shard_of_uses_forward_slashes(tmp_path):
+    Root = str(tmp_path)
+    Key = WatermarkShards.RelativeKey(os.path.join(Root,"sub","b.jpg"),Root)
+    assert Key == "sub/b.jpg"
+    assert WatermarkShards.ShardOf(Key,4) == 1
+
+def test_shards_split_every_input_once(tmp_path):
+    Root = str(tmp_path)
+    Paths = [os.path.join(Root,f"{Index}.jpg") for Index in range(200)]
+    Shards = [list(WatermarkShards.InShard(Paths,Root,Index,3)) for Index in range(3)]
+    assert sorted(Path for Shard in Shards for Path in Shard) == sorted(Paths)
+    assert all(Shard for Shard in Shards)
+
+@pytest.mark.parametrize("Text",["1","a/2","2/2","-1/2","0/0"])
+def test_bad_shards_are_rejected(Text):
+    with pytest.raises(ValueError):
+        WatermarkShards.ParseShard(Text)
+
+def test_plan_round_trips_to_another_mount(tmp_path):
+    Root = os.path.join(str(tmp_path),"here")
+    Paths = [os.path.join(Root,"sub",f"{Index}.jpg") for Index in range(20)]
+    Plan = str(tmp_path / "plan")
+    Counts = WatermarkShards.WritePlan(Plan,Root,Paths,3)
+    assert sum(Counts) == 20
+    Mounted = os.path.join(str(tmp_path),"there")
+    for Index in range(3):
+        Planned = list(WatermarkShards.ReadPlan(Plan,Mounted,Index,3))
+        assert len(Planned) == Counts[Index]
+        assert Planned == [
+            os.path.join(Mounted,os.path.relpath(Path,Root))
+            for Path in WatermarkShards.InShard(Paths,Root,Index,3)
+            ]
+    with pytest.raises(ValueError):
+        list(WatermarkShards.ReadPlan(Plan,Mounted,0,4))
+
+def test_merge_reports_sums_and_lists_missing_shards(tmp_path):
+    Reports = []
+    for Index,Results in [
+            (0,{"Processed":3,"Skipped":1,"Failures":[{"Input":"a.jpg","Error":"truncated"}],"Counters":{"BytesRead":10}}),
+            (2,{"Processed":4,"Skipped":0,"Failures":[{"Input":"b.jpg","Error":"truncated"}],"Counters":{"BytesRead":5,"Decodes":4}})
+            ]:
+        Path = str(tmp_path / f"{WatermarkShards.ShardName(Index,3)}.json")
+        WatermarkShards.WriteReport(Path,Results,Shard=(Index,3),Duration=1.5)
+        Reports.append(Path)
+    Merged = WatermarkShards.MergeReports(Reports)
+    assert Merged["Processed"] == 7
+    assert Merged["Skipped"] == 1
+    assert [Failure["Input"] for Failure in Merged["Failures"]] == ["a.jpg","b.jpg"]
+    assert Merged["Counters"] == {"BytesRead":15,"Decodes":4}
+    assert Merged["Missing"] == [1]
+    assert [Report["Shard"] for Report in Merged["Reports"]] == [[0,3],[2,3]]
+    json.dumps(Merged)
@@ -0,0 +1,13 @@
+'''
+StageTrace is copied into both standalone tools, the copies must not drift.
+'''
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def test_StageTraceCopiesMatch():
+    Copies = []
+    for Tool in ["WaterMarker","BrandedSloganMaker"]:
+        with open(os.path.join(ROOT,Tool,"StageTrace.py"),"rb") as File:
+            Copies.append(File.read())
+    assert Copies[0] == Copies[1], "WaterMarker/StageTrace.py and BrandedSloganMaker/StageTrace.py differ, patch both"
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+from PIL import Image
+
+import WatermarkAssets
+import WatermarkMarker
+import WatermarkTiles
+
+def Mark():
+    Sprite = Image.new("RGBA",(40,30),(255,0,0,128))
+    return WatermarkAssets.WatermarkAsset(Sprite,Image.new("L",(40,30),255))
+
+@pytest.fixture
+def Source(tmp_path):
+    Path = tmp_path / "in.bmp"
+    Image.effect_noise((120,90),40).convert("RGB").save(Path)
+    return str(Path)
+
+def test_bands_match_a_whole_image_composite(tmp_path,Source):
+    Output = str(tmp_path / "out.bmp")
+    Placements = [(Mark(),10,25),(Mark(),70,50)]
+    with Image.open(Source) as Probed:
+        assert WatermarkTiles.CompositeInBands(Source,Probed,Placements,Output,BandHeight=7)
+    with Image.open(Source) as Whole:
+        Whole.load()
+        for Asset,DrawX,DrawY in Placements:
+            Asset.Composite(Whole,DrawX,DrawY)
+        with Image.open(Output) as Banded:
+            assert Banded.tobytes() == Whole.tobytes()
+
+def test_failed_band_leaves_no_output(tmp_path,Source):
+    class Failing(WatermarkAssets.WatermarkAsset):
+        def Composite(self,Target,DrawX,DrawY):
+            raise RuntimeError("interrupted")
+    Asset = Mark()
+    Output = str(tmp_path / "out.bmp")
+    with Image.open(Source) as Probed:
+        with pytest.raises(RuntimeError):
+            WatermarkTiles.CompositeInBands(Source,Probed,[(Failing(Asset.Sprite,Asset.Mask),0,40)],Output)
+    assert os.listdir(tmp_path) == ["in.bmp"]
+
+def test_compressed_input_reports_why_it_cannot_be_banded(tmp_path,monkeypatch):
+    Path = tmp_path / "in.tif"
+    Image.effect_noise((120,90),40).convert("RGB").save(Path,compression="tiff_lzw")
+    with Image.open(Path) as Probed:
+        Reason = WatermarkTiles.BandingUnsupported(Probed)
+    assert "tiff_lzw" in Reason
+    monkeypatch.setattr(Image,"MAX_IMAGE_PIXELS",1000)
+    with pytest.raises(Image.DecompressionBombError,match="cannot be processed in bands, as its TIFF pixels are tiff_lzw"):
+        WatermarkTiles.CheckDecodeSize((120,90),Reason)
+
+def test_raw_strips_can_be_banded(Source):
+    with Image.open(Source) as Probed:
+        assert WatermarkTiles.BandingUnsupported(Probed) is None
+
+def test_layers_share_the_band_height():
+    Layer = {"MarkType":"Text","Text":"A","FontFile":"missing.otf","Size":10}
+    Marker = WatermarkMarker.WatermarkMarker([Layer,Layer],None,BandHeight=33)
+    assert [Child.BandHeight for Child in Marker.Layers] == [33,33]